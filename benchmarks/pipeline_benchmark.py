@@ -0,0 +1,299 @@
+"""
+End-to-end benchmark of the acquisition pipeline with the device emulators.
+
+Runs SMAPOCWorker, ForceWorker and LaserWorker against the SMApoc and GSV3 emulators and the MEDAQLib
+simulation, through Communicator, DataHandler and one LivePlot on an offscreen Qt platform. For every request
+interval it measures per stage the throughput, latency, CPU time and dropped samples, and compares the result
+with a stored baseline. The baseline depends on the machine, so none is committed: the first run stores its
+results as benchmarks/baseline.json, and later runs are checked against it.
+
+Run from the repository root:
+    python -m benchmarks.pipeline_benchmark --intervals 5 10 20 --duration 5
+    python -m benchmarks.pipeline_benchmark --save-baseline   # after an intended change
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+os.environ.setdefault('MEDAQ_SIMULATION', '1')
+
+import numpy as np
+import PyQt5.QtCore as qtc
+import PyQt5.QtWidgets as qtw
+
+from drivers.smapoc.emulator import SMAPOCEmulator
+from drivers.me_messsysteme.emulator import GSV3Emulator
+from smapoc.model.clock import session_clock
+from smapoc.model.communicator import Communicator
+from smapoc.model.data_handler import DataHandler
+from smapoc.gui.live_plotter import LivePlot
+
+logging.getLogger(__name__)
+
+BASELINE = Path(__file__).parent / 'baseline.json'
+# metric -> True if higher is better
+DIRECTIONS = {'throughput': True, 'latency_p50': False, 'latency_p99': False, 'cpu': False, 'dropped': False}
+WORKER_THREADS = {'SMAPOCWorker': 'smapoc', 'ForceWorker': 'force', 'LaserWorker': 'laser'}
+
+
+class Stage:
+    """ Measurements of one pipeline stage """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.samples = 0
+        self.latencies = []  # s
+        self.cpu = 0.0  # s
+        self.dropped = 0
+
+    def result(self, duration):
+        latencies = np.asarray(self.latencies) * 1000
+        return {'throughput': self.samples / duration,  # samples per s
+                'latency_p50': float(np.percentile(latencies, 50)) if len(latencies) else None,  # ms
+                'latency_p99': float(np.percentile(latencies, 99)) if len(latencies) else None,  # ms
+                'cpu': self.cpu / duration * 1000,  # ms CPU per s
+                'dropped': self.dropped}
+
+
+def thread_cpu():
+    """ CPU seconds per thread name of this process (Linux only, empty elsewhere) """
+    times = {}
+    tick = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+    try:
+        tasks = os.listdir('/proc/self/task')
+    except OSError:
+        return times
+    for tid in tasks:
+        try:
+            with open(f'/proc/self/task/{tid}/comm') as file:
+                name = file.read().strip()
+            with open(f'/proc/self/task/{tid}/stat') as file:
+                fields = file.read().rsplit(')', 1)[1].split()
+        except OSError:
+            continue
+        times[(tid, name)] = (int(fields[11]) + int(fields[12])) / tick  # utime + stime
+    return times
+
+
+def timed(stage, function):
+    """ wraps a slot, so its CPU time is added to stage """
+    def wrapper(*args):
+        start = time.thread_time()
+        function(*args)
+        stage.cpu += time.thread_time() - start
+    return wrapper
+
+
+class PipelineBenchmark:
+
+    def __init__(self, interval, duration, smapoc_rate, force_rate):
+        self.interval = interval
+        self.duration = duration
+        self.smapoc_rate = smapoc_rate
+        self.force_rate = force_rate
+        self.stages = {name: Stage() for name in ['smapoc', 'force', 'laser', 'communicator', 'data_handler',
+                                                  'live_plot']}
+        self.thread_times = {}
+        self.start_cpu = {}
+        self.last_transfer = None
+        self.frames_sent = 0  # SMApoc emulator frames before the measurement
+        self.garbled = 0
+        self.dropped = {}
+
+    def run(self, app):
+        host = qtw.QMainWindow()
+        data_handler = DataHandler()
+        communicator = Communicator(data_handler)
+        smapoc_emulator = SMAPOCEmulator(rate=self.smapoc_rate, seed=0)
+        force_emulator = GSV3Emulator(rate=self.force_rate, seed=0)
+        smapoc_emulator.start()
+        force_emulator.start()
+        profile = next(iter(data_handler.config.c_data['force'].values()))
+
+        communicator.add_smapoc(smapoc_emulator.port)
+        communicator.add_force(force_emulator.port, profile)
+        communicator.add_laser('SIM', data_handler.config.c_data['laser']['IP_SerialNumbers']['1'])
+        self.instrument(communicator, data_handler)
+        plot = LivePlot(host, data_handler, list_x=['time'], list_y=['r1', 'force', 'laser'], title='benchmark')
+        host.show()  # hidden plots are skipped by the display clock
+        clock = data_handler.display_clock
+        clock.timer.timeout.disconnect()
+        clock.timer.timeout.connect(timed(self.stages['live_plot'], lambda: self.plotted(clock)))
+
+        data_handler.set_interval(self.interval)
+        communicator.set_device_interval('force', self.interval)
+        communicator.set_device_interval('laser', self.interval)
+        cpu_timer = qtc.QTimer()
+        cpu_timer.timeout.connect(self.sample_cpu)
+        cpu_timer.start(100)
+        # give the workers time to open their ports, the force worker waits one second for the amplifier
+        qtc.QTimer.singleShot(1500, lambda: self.start(communicator, plot, smapoc_emulator))
+        qtc.QTimer.singleShot(1500 + int(self.duration * 1000), lambda: self.finish(communicator, smapoc_emulator, app))
+        app.exec_()
+        cpu_timer.stop()
+        clock.unregister(plot)
+        for key in list(communicator.devices):
+            communicator.remove_device(key)
+        smapoc_emulator.close()
+        force_emulator.close()
+        for (tid, name), seconds in self.thread_times.items():
+            if name in WORKER_THREADS:
+                self.stages[WORKER_THREADS[name]].cpu += seconds
+        return {name: stage.result(self.duration) for name, stage in self.stages.items()}
+
+    def start(self, communicator, plot, smapoc_emulator):
+        for stage in self.stages.values():
+            stage.reset()
+        # samples queued while the devices were opened would count as latency
+        for key in ['force', 'laser']:
+            communicator.devices[key].drain()
+        self.frames_sent = smapoc_emulator.frames
+        self.garbled = communicator.devices['smapoc'].assembler.garbled
+        self.dropped = {key: communicator.devices[key].dropped for key in ['force', 'laser']}
+        self.start_cpu = thread_cpu()
+        self.thread_times = {}
+        communicator.start_requesting()
+        plot.data_handler.display_clock.set_interval(self.interval)
+        plot.data_handler.display_clock.register(plot)
+
+    def finish(self, communicator, smapoc_emulator, app):
+        self.sample_cpu()
+        communicator.stop_requesting()
+        # stop the emulator and give the frames on the way some time to arrive, they are no drops
+        smapoc_emulator.stall(60)
+        qtc.QTimer.singleShot(300, lambda: self.count_drops(communicator, smapoc_emulator, app))
+
+    def count_drops(self, communicator, smapoc_emulator, app):
+        smapoc = self.stages['smapoc']
+        smapoc.dropped = max(smapoc_emulator.frames - self.frames_sent - smapoc.samples, 0)
+        smapoc.dropped += (communicator.devices['smapoc'].assembler.garbled - self.garbled) // 16
+        for key in ['force', 'laser']:
+            self.stages[key].dropped = communicator.devices[key].dropped - self.dropped[key]
+        app.quit()
+
+    def sample_cpu(self):
+        # threads are sampled while they run, a stopped thread disappears from /proc
+        for key, seconds in thread_cpu().items():
+            self.thread_times[key] = seconds - self.start_cpu.get(key, 0.0)
+
+    def instrument(self, communicator, data_handler):
+        smapoc = communicator.devices['smapoc']
+        smapoc.frames_received.disconnect()
+        smapoc.frames_received.connect(self.on_frames(communicator))
+        for key in ['force', 'laser']:
+            communicator.devices[key].samples_received.disconnect()
+            communicator.devices[key].samples_received.connect(self.on_samples(communicator, key))
+        data_handler.timer.timeout.disconnect()
+        data_handler.timer.timeout.connect(timed(self.stages['data_handler'], lambda: self.transfer(data_handler)))
+
+    def arrived(self, stage, timestamps):
+        now = session_clock.now_ns()
+        self.stages[stage].samples += len(timestamps)
+        self.stages[stage].latencies.extend((now - np.asarray(timestamps)) / 1e9)
+        self.stages['communicator'].samples += len(timestamps)
+
+    def on_frames(self, communicator):
+        def slot(myid, timestamps, frames):
+            self.arrived('smapoc', timestamps)
+            timed(self.stages['communicator'], communicator.callback_frames)(myid, timestamps, frames)
+        return slot
+
+    def on_samples(self, communicator, stage):
+        def slot(myid, timestamps, values):
+            self.arrived(stage, timestamps)
+            timed(self.stages['communicator'], communicator.callback_samples)(myid, timestamps, values)
+        return slot
+
+    def transfer(self, data_handler):
+        count = data_handler.buffer.count
+        data_handler.transfer_collected()
+        rows = data_handler.buffer.count - count
+        if rows:
+            stage = self.stages['data_handler']
+            stage.samples += rows
+            # age of the newest aligned row, includes the alignment latency
+            stage.latencies.append(session_clock.now() - data_handler.last_value('time'))
+            self.last_transfer = time.perf_counter()
+
+    def plotted(self, clock):
+        clock.tick()
+        if self.last_transfer is not None:
+            stage = self.stages['live_plot']
+            stage.samples += 1
+            stage.latencies.append(time.perf_counter() - self.last_transfer)
+            self.last_transfer = None
+
+
+def compare(results, baseline, tolerance):
+    """ :return: list of regressions (text) of results against baseline """
+    regressions = []
+    for interval, stages in results.items():
+        for stage, metrics in stages.items():
+            for metric, higher_is_better in DIRECTIONS.items():
+                value = metrics.get(metric)
+                reference = baseline.get(interval, {}).get(stage, {}).get(metric)
+                if value is None or reference is None:
+                    continue
+                if higher_is_better:
+                    worse = value < reference * (1 - tolerance)
+                else:
+                    # the absolute margin keeps timer resolution and frames in flight from counting
+                    worse = value > reference * (1 + tolerance) and value - reference > 1.0
+                if worse:
+                    regressions.append(f'interval {interval} ms, {stage} {metric}: {value:.2f} (baseline {reference:.2f})')
+    return regressions
+
+
+def print_table(results):
+    print(f'{"interval":>8} {"stage":>13} {"samples/s":>10} {"p50 ms":>8} {"p99 ms":>8} {"cpu ms/s":>9} {"dropped":>8}')
+    for interval, stages in results.items():
+        for stage, m in stages.items():
+            p50 = '-' if m['latency_p50'] is None else f'{m["latency_p50"]:.2f}'
+            p99 = '-' if m['latency_p99'] is None else f'{m["latency_p99"]:.2f}'
+            print(f'{interval:>8} {stage:>13} {m["throughput"]:>10.1f} {p50:>8} {p99:>8} {m["cpu"]:>9.2f} '
+                  f'{m["dropped"]:>8}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='acquisition pipeline benchmark with device emulators')
+    parser.add_argument('--intervals', type=int, nargs='+', default=[5, 10, 20], help='request intervals in ms')
+    parser.add_argument('--duration', type=float, default=5.0, help='s per interval')
+    parser.add_argument('--smapoc-rate', type=float, default=1000, help='frames per second of the SMApoc emulator')
+    parser.add_argument('--force-rate', type=int, default=200, help='initial GSV3 data rate, the worker sets 200 Hz')
+    parser.add_argument('--baseline', type=Path, default=BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help='store the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed relative change before a regression')
+    parser.add_argument('--output', type=Path, help='write the results as json')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    app = qtw.QApplication(sys.argv)
+    results = {}
+    for interval in args.intervals:
+        benchmark = PipelineBenchmark(interval, args.duration, args.smapoc_rate, args.force_rate)
+        results[str(interval)] = benchmark.run(app)
+    print_table(results)
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+    if args.save_baseline or not args.baseline.exists():
+        # the first run on a machine is the baseline of the later ones
+        args.baseline.write_text(json.dumps(results, indent=2))
+        print(f'baseline saved to {args.baseline}')
+        return 0
+    regressions = compare(results, json.loads(args.baseline.read_text()), args.tolerance)
+    for text in regressions:
+        print('REGRESSION', text)
+    if not regressions:
+        print('no regressions against the baseline')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,173 @@
+import argparse
+import logging
+import os
+import select
+import threading
+import time
+import tty
+import numpy as np
+
+from drivers.me_messsysteme.gsv3_usb import FRAME_START
+
+logging.getLogger(__name__)
+
+# data rate code of the 0x8A command -> samples per second, see GSV3USB.set_50hz ... set_800hz
+RATES = {0x07: 50, 0x06: 100, 0x05: 200, 0x04: 500, 0x03: 800}
+# commands without answer and the number of parameter bytes that follow them
+SILENT_COMMANDS = {0x0C: 0, 0x0E: 0, 0x14: 0, 0x15: 0, 0x25: 0, 0x3C: 0, 0x09: 1, 0x0A: 1, 0x26: 1}
+
+
+class GSV3Emulator:
+    """ Emulates a GSV3USB amplifier on a pseudo terminal (see port).
+
+    While the transmission is on (0x24, off with 0x23) it sends '0xA5 hi lo' frames at the selected data rate.
+    The signal is a sine around offset in units of the full scale (-1..1), with optional noise, spikes and lost
+    bytes, so the parser and the spike filter can be soak-tested. The serial number (0x1F), mode (0x27) and
+    special mode (0x89) queries are answered."""
+
+    def __init__(self, rate=200, serial_number=b'17154059', seed=None):
+        self.rate = rate
+        self.serial_number = serial_number
+        self.transmitting = False
+        self.offset = 0.0  # full scale units
+        self.amplitude = 0.1
+        self.frequency = 1.0  # Hz
+        self.noise = 0.0  # standard deviation, full scale units
+        self.spike_rate = 0.0  # probability of a spike per sample
+        self.spike_height = 0.5  # full scale units
+        self.byte_loss = 0.0  # probability that a byte is lost on the line
+        self.mode = 0
+        self.special_mode = 0
+        self.samples = 0  # samples sent
+        self.rng = np.random.default_rng(seed)
+        self.buffer = bytearray()
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        os.set_blocking(self.master, False)
+        self.port = os.ttyname(self.slave)
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name='GSV3Emulator', daemon=True)
+        self.thread.start()
+        logging.info(f'GSV3 emulator on {self.port}')
+        return self.port
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def close(self):
+        self.stop()
+        os.close(self.master)
+        os.close(self.slave)
+
+    def run(self):
+        clock_start = time.perf_counter()
+        clock_rate = self.rate
+        sent = 0
+        while self.running:
+            readable, _, _ = select.select([self.master], [], [], 0.001)
+            if readable:
+                self.buffer += os.read(self.master, 4096)
+                self.parse()
+            if self.rate != clock_rate or not self.transmitting:
+                # restart the sample clock, so a new rate or a restarted transmission does not send a burst
+                clock_start, clock_rate, sent = time.perf_counter(), self.rate, 0
+                continue
+            due = int((time.perf_counter() - clock_start) * self.rate) - sent
+            if due > 0:
+                self.send_samples(due, (clock_start + sent / self.rate))
+                sent += due
+
+    def parse(self):
+        while self.buffer:
+            command = self.buffer[0]
+            if command == 0x24:
+                self.transmitting = True
+            elif command == 0x23:
+                self.transmitting = False
+            elif command == 0x1F:
+                self.answer(self.serial_number[:8].ljust(8, b'0'))
+            elif command == 0x27:
+                self.answer(bytes([self.mode, 0]))
+            elif command == 0x89:
+                self.answer(bytes([self.special_mode, 0]))
+            elif command == 0x8A:
+                if len(self.buffer) < 4:
+                    return
+                code = self.buffer[1]
+                if code in RATES and self.buffer[2:4] == b'\xFC\xF3':
+                    self.rate = RATES[code]
+                    logging.info(f'GSV3 emulator rate {self.rate} Hz')
+                del self.buffer[:4]
+                continue
+            elif command in SILENT_COMMANDS:
+                size = 1 + SILENT_COMMANDS[command]
+                if len(self.buffer) < size:
+                    return
+                if command == 0x26:
+                    self.mode = self.buffer[1]
+                del self.buffer[:size]
+                continue
+            else:
+                logging.debug(f'GSV3 emulator: unknown command {command:#04x}')
+            del self.buffer[:1]
+
+    def signal(self, times):
+        values = self.offset + self.amplitude * np.sin(2 * np.pi * self.frequency * times)
+        if self.noise:
+            values = values + self.rng.normal(0, self.noise, len(times))
+        if self.spike_rate:
+            spikes = self.rng.random(len(times)) < self.spike_rate
+            values = values + spikes * self.rng.choice([-1, 1], len(times)) * self.spike_height
+        return values
+
+    def send_samples(self, n, first_time):
+        times = first_time + np.arange(n) / self.rate
+        raw = np.clip(np.round(0x8000 + self.signal(times) * 0x8000), 0, 0xFFFF).astype('>u2')
+        frames = np.empty((n, 3), dtype=np.uint8)
+        frames[:, 0] = FRAME_START
+        frames[:, 1:] = raw.view(np.uint8).reshape(n, 2)
+        data = frames.reshape(-1)
+        if self.byte_loss:
+            data = data[self.rng.random(len(data)) >= self.byte_loss]
+        self.answer(data.tobytes())
+        self.samples += n
+
+    def answer(self, data):
+        try:
+            written = os.write(self.master, data)
+        except BlockingIOError:
+            written = 0
+        if written < len(data):
+            logging.debug('emulator output full, bytes lost')  # the host does not read fast enough
+
+
+def main():
+    parser = argparse.ArgumentParser(description='GSV3USB amplifier emulator on a pseudo terminal')
+    parser.add_argument('--rate', type=int, default=200, choices=sorted(RATES.values()))
+    parser.add_argument('--noise', type=float, default=0.0, help='noise (std, full scale units)')
+    parser.add_argument('--spikes', type=float, default=0.0, help='probability of a spike per sample')
+    parser.add_argument('--byte-loss', type=float, default=0.0, help='probability of a lost byte')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    emulator = GSV3Emulator(rate=args.rate)
+    emulator.noise = args.noise
+    emulator.spike_rate = args.spikes
+    emulator.byte_loss = args.byte_loss
+    print(emulator.start(), flush=True)
+    try:
+        while True:
+            time.sleep(1)
+            logging.info(f'{emulator.samples} samples sent at {emulator.rate} Hz')
+    except KeyboardInterrupt:
+        emulator.close()
+
+
+if __name__ == '__main__':
+    main()
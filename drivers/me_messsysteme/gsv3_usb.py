@@ -3,6 +3,7 @@ import struct
 import numpy as np
 import platform
 import json
+import time
 from pathlib import Path
 import logging
 logging.getLogger(__name__)
@@ -30,12 +31,78 @@ class ForceMeasurementConverterN:
         # return (A - 0x8000) * (self.F_n / self.S_n) * (self.u_e / 0x8000)
         return self.F_n / self.S_n * ((A - 0x8000) / 0x8000) * self.u_e  # Scale 16bit number from -1 to 1
 
+    def convert_array(self, raw):
+        """ same as convertValue for an array of already unpacked big endian uint16 values """
+        return self.F_n / self.S_n * ((raw.astype(np.float64) - 0x8000) / 0x8000) * self.u_e
+
+
+FRAME_START = 0xA5
+FRAME_SIZE = 3  # 0xA5 + high byte + low byte
+
+
+def find_frames(buffer):
+    """ Finds all '0xA5 hi lo' frames in a byte buffer.
+
+    A frame is only taken if the next frame starts with 0xA5 right after it, this is checked in one
+    vectorized pass. A frame that lost a byte takes the start byte of the next frame as its value and is
+    dropped, the stream is then searched for the next start byte that is confirmed by the start byte one
+    frame later. The first start byte of the buffer needs the same confirmation, so value bytes equal to
+    0xA5 are never taken as a frame start. The last frame waits in the buffer until the next start byte
+    arrived.
+
+    :return: (raw uint16 values, number of consumed bytes, number of dropped bytes)
+    """
+    buf = np.frombuffer(bytes(buffer), dtype=np.uint8)
+    n = len(buf)
+    chunks = []
+    dropped = 0
+    pos = 0
+    while True:
+        candidates = pos + np.flatnonzero(buf[pos:] == FRAME_START)
+        follow = candidates + FRAME_SIZE
+        confirmed = candidates[(follow < n) & (buf[np.minimum(follow, n - 1)] == FRAME_START)]
+        if len(confirmed) == 0:
+            # a start byte without the next frame yet is kept for the next read
+            waiting = candidates[follow >= n]
+            keep = waiting[0] if len(waiting) else n
+            dropped += keep - pos
+            pos = keep
+            break
+        start = confirmed[0]
+        dropped += start - pos
+        m = (n - start) // FRAME_SIZE
+        frames = buf[start:start + m * FRAME_SIZE].reshape(m, FRAME_SIZE)
+        # frame i is complete if frame i + 1 starts with 0xA5, the last one is checked with the next read
+        complete = frames[1:, 0] == FRAME_START
+        bad = np.flatnonzero(~complete)
+        if len(bad) == 0:
+            chunks.append(frames[:m - 1])
+            pos = start + (m - 1) * FRAME_SIZE
+            break
+        # a byte got lost in frame k: keep the frames before it and resync after its start byte
+        k = bad[0]
+        chunks.append(frames[:k])
+        pos = start + k * FRAME_SIZE + 1
+        dropped += 1
+    if chunks:
+        frames = np.concatenate(chunks)
+        raw = (frames[:, 1].astype(np.uint16) << 8) | frames[:, 2]
+    else:
+        raw = np.empty(0, dtype=np.uint16)
+    return raw, int(pos), int(dropped)
+
 
 class GSV3USB:
-    def __init__(self, com_port, baudrate=38400):
+    def __init__(self, com_port, baudrate=38400, timeout=0.5):
+        # timeout keeps a silent amplifier from blocking the reading thread forever
         self.sensor = serial.Serial(com_port,
-                                    baudrate)
+                                    baudrate,
+                                    timeout=timeout)
         self.converter = ForceMeasurementConverterN()
+        self.sample_rate = None  # Hz, known after one of the set_xxhz calls
+        self.stream_buffer = bytearray()
+        self.last_timestamp = 0
+        self.dropped = 0  # bytes dropped by the stream parser
 
 
 
@@ -90,18 +157,23 @@ class GSV3USB:
         return self.converter.F_n, self.converter.S_n, self.converter.u_e
 
     def set_50hz(self):
+        self.sample_rate = 50
         self.sensor.write(b'\x8A\x07\xFC\xF3')
 
     def set_100hz(self):
+        self.sample_rate = 100
         self.sensor.write(b'\x8A\x06\xFC\xF3')
 
     def set_200hz(self):
+        self.sample_rate = 200
         self.sensor.write(b'\x8A\x05\xFC\xF3')
 
     def set_500hz(self):
+        self.sample_rate = 500
         self.sensor.write(b'\x8A\x04\xFC\xF3')
 
     def set_800hz(self):
+        self.sample_rate = 800
         self.sensor.write(b'\x8A\x03\xFC\xF3')
 
 
@@ -142,6 +214,32 @@ class GSV3USB:
         else:
             return -1
 
+    def read_stream(self, now=time.perf_counter_ns):
+        """ Reads everything the amplifier sent since the last call and keeps every sample.
+
+        Blocks until at least one byte arrived (or the port timeout passed). The samples get timestamps in
+        ns, the newest received frame is stamped with the time of reception and the older ones are spaced
+        by the configured sample rate.
+
+        :return: tuple (timestamps, forces) as numpy arrays
+        """
+        data = self.sensor.read(max(1, self.sensor.in_waiting))
+        t_rx = now()
+        self.stream_buffer += data
+        if len(self.stream_buffer) < FRAME_SIZE:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        raw, consumed, dropped = find_frames(self.stream_buffer)
+        # the last frame and an incomplete one stay in the buffer for the next read
+        del self.stream_buffer[:consumed]
+        self.dropped += dropped
+        waiting = len(self.stream_buffer) // FRAME_SIZE  # the last frame waits for the next start byte
+        period = int(1e9 / self.sample_rate) if self.sample_rate else 0
+        timestamps = t_rx - period * (np.arange(len(raw) - 1, -1, -1, dtype=np.int64) + waiting)
+        timestamps = np.maximum(timestamps, self.last_timestamp + 1)
+        if len(timestamps):
+            self.last_timestamp = timestamps[-1]
+        return timestamps, self.converter.convert_array(raw)
+
     def clear_maximum(self):
         self.sensor.write(b'\x3C')
 
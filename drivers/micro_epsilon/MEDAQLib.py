@@ -4,6 +4,8 @@ import locale
 from ctypes import CDLL, c_uint8, c_int32, c_uint32, c_double, byref, create_string_buffer, \
     POINTER, pointer, cast, c_char, c_char_p
 from pathlib import Path
+import logging
+import numpy as np
 if os.name == 'nt':
 	from ctypes import WinDLL
 
@@ -136,12 +138,22 @@ class MEDAQLib:
 
     """
     current_path = current_dir = Path(__file__).parent
-    if os.name == 'nt':
-        medaq_lib = WinDLL(str(current_path / Path("MEDAQLib.dll")))
-        medaq_lib_cdecl = CDLL(str(current_path / Path("MEDAQLib.dll")))
-    else:
-        medaq_lib = CDLL((str(os.getcwd() + "/libMEDAQLib.so")))
-        medaq_lib_cdecl = CDLL((str(os.getcwd() + "/libMEDAQLib.so")))
+    try:
+        if os.name == 'nt':
+            medaq_lib = WinDLL(str(current_path / Path("MEDAQLib.dll")))
+            medaq_lib_cdecl = CDLL(str(current_path / Path("MEDAQLib.dll")))
+        else:
+            medaq_lib = CDLL((str(os.getcwd() + "/libMEDAQLib.so")))
+            medaq_lib_cdecl = CDLL((str(os.getcwd() + "/libMEDAQLib.so")))
+    except OSError as e:
+        # the vendor library is not installed, the enums still work, sensor_library() reports the missing library
+        logging.warning(f'MEDAQLib not loaded: {e}')
+        medaq_lib = medaq_lib_cdecl = None
+
+    @staticmethod
+    def is_available():
+        """ True if the vendor library could be loaded """
+        return MEDAQLib.medaq_lib is not None
 
     @staticmethod
     def CreateSensorInstance(Sensor):
@@ -406,14 +418,60 @@ class MEDAQLib:
         :param maxValues: Length of rawData and scaledData.
         :return: a tupel with rawData and scaledData
         """
-        iValue = (c_int32 * maxValues)()
-        dValue = (c_double * maxValues)()
-        self._last_error = self._poll_org(self.iSensor, cast(iValue, POINTER(c_int32)), cast(dValue, POINTER(c_double)),
-                                          maxValues)
+        raw_data, scaled_data = self._numpy_buffers(maxValues)
+        _, raw_data, scaled_data = self.PollInto(raw_data, scaled_data)
+        return (raw_data.tolist(), scaled_data.tolist())
 
-        raw_data = [i for i in iValue]
-        scaled_data = [i for i in dValue]
-        return (raw_data, scaled_data)
+    def PollInto(self, rawData, scaledData, maxValues=None):
+        """Same as Poll, but fills preallocated numpy buffers instead of creating lists.
+
+        :param rawData: numpy int32 array, C-contiguous
+        :param scaledData: numpy float64 array, C-contiguous
+        :param maxValues: number of values to poll, default is the length of the buffers
+        :return: a tupel with the number of values and views of rawData and scaledData
+        """
+        maxValues = self._check_buffers(rawData, scaledData, maxValues)
+        self._last_error = self._poll_org(self.iSensor,
+                                          rawData.ctypes.data_as(POINTER(c_int32)),
+                                          scaledData.ctypes.data_as(POINTER(c_double)),
+                                          maxValues)
+        return (maxValues, rawData[:maxValues], scaledData[:maxValues])
+
+    def TransferDataInto(self, rawData, scaledData, maxValues=None):
+        """Same as TransferData, but fills preallocated numpy buffers instead of creating lists.
+
+        :param rawData: numpy int32 array, C-contiguous
+        :param scaledData: numpy float64 array, C-contiguous
+        :param maxValues: maximal number of values, default is the length of the buffers
+        :return: a tupel with the real number of transfered values and views of rawData and scaledData
+        """
+        maxValues = self._check_buffers(rawData, scaledData, maxValues)
+        read = c_int32()
+        self._last_error = self._transfer_data_org(self.iSensor,
+                                                   rawData.ctypes.data_as(POINTER(c_int32)),
+                                                   scaledData.ctypes.data_as(POINTER(c_double)),
+                                                   maxValues,
+                                                   byref(read))
+        return (read.value, rawData[:read.value], scaledData[:read.value])
+
+    def TransferDataTsInto(self, rawData, scaledData, maxValues=None):
+        """Same as TransferDataTs, but fills preallocated numpy buffers instead of creating lists.
+
+        :param rawData: numpy int32 array, C-contiguous
+        :param scaledData: numpy float64 array, C-contiguous
+        :param maxValues: maximal number of values, default is the length of the buffers
+        :return: a tupel with the real number of transfered values, views of rawData and scaledData
+                 and the timestamp
+        """
+        maxValues = self._check_buffers(rawData, scaledData, maxValues)
+        read = c_int32()
+        timeStamp = c_double()
+        self._last_error = self._transfer_data_ts_org(self.iSensor,
+                                                      rawData.ctypes.data_as(POINTER(c_int32)),
+                                                      scaledData.ctypes.data_as(POINTER(c_double)),
+                                                      maxValues,
+                                                      byref(read), byref(timeStamp))
+        return (read.value, rawData[:read.value], scaledData[:read.value], timeStamp.value)
 
     def GetLastError(self):
         """Returns the return code of the function which was called last
@@ -602,32 +660,38 @@ class MEDAQLib:
                 if transfer_data_ts is called the timestamp is appended
         """
         if maxValues >= 0:
-            raw_data_buffer = (c_int32 * maxValues)()
-            scaled_data_buffer = (c_double * maxValues)()
-            maxValues = c_int32(maxValues)
-            read = c_int32()
-            timeStamp = c_double()
+            raw_data_buffer, scaled_data_buffer = self._numpy_buffers(maxValues)
             if timeStampEnable is False:
-                self._last_error = self._transfer_data_org(self.iSensor, cast(raw_data_buffer, POINTER(c_int32)),
-                                                           cast(scaled_data_buffer, POINTER(c_double)),
-                                                           maxValues,
-                                                           byref(read))
+                read, raw_data, scaled_data = self.TransferDataInto(raw_data_buffer, scaled_data_buffer)
+                return (raw_data.tolist(), scaled_data.tolist(), read)
             else:
-                self._last_error = self._transfer_data_ts_org(self.iSensor, cast(raw_data_buffer, POINTER(c_int32)),
-                                                              cast(scaled_data_buffer, POINTER(c_double)),
-                                                              maxValues,
-                                                              byref(read), byref(timeStamp))
-            raw_data = list()
-            scaled_data = list()
-            for i in range(read.value):
-                raw_data.append(raw_data_buffer[i])
-                scaled_data.append(scaled_data_buffer[i])
-            if timeStampEnable is False:
-                return (raw_data, scaled_data, read.value)
-            else:
-                return (raw_data, scaled_data, read.value, timeStamp.value)
+                read, raw_data, scaled_data, timeStamp = self.TransferDataTsInto(raw_data_buffer, scaled_data_buffer)
+                return (raw_data.tolist(), scaled_data.tolist(), read, timeStamp)
         return c_int32(0)
 
+    @staticmethod
+    def _numpy_buffers(maxValues):
+        """allocates a raw (int32) and a scaled (float64) buffer that can be passed to the *Into functions
+        """
+        return np.zeros(maxValues, dtype=np.int32), np.zeros(maxValues, dtype=np.float64)
+
+    @staticmethod
+    def _check_buffers(rawData, scaledData, maxValues):
+        """checks that the numpy buffers can be handed to the dll and returns the number of values to transfer
+        """
+        if rawData.dtype != np.int32 or scaledData.dtype != np.float64:
+            raise TypeError('rawData has to be int32 and scaledData float64')
+        if not (rawData.flags.c_contiguous and scaledData.flags.c_contiguous):
+            raise ValueError('rawData and scaledData have to be C-contiguous')
+        if not (rawData.flags.writeable and scaledData.flags.writeable):
+            raise ValueError('rawData and scaledData have to be writeable')
+        size = min(len(rawData), len(scaledData))
+        if maxValues is None:
+            return size
+        if maxValues > size:
+            raise ValueError(f'maxValues {maxValues} exceeds the buffer size {size}')
+        return maxValues
+
     def __init__(self, handle):
         """Constructor sets the sensor handle and inits the MEDAQLib function
 
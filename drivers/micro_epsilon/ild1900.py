@@ -6,17 +6,44 @@
 #
 
 from drivers.micro_epsilon.MEDAQLib import MEDAQLib, ME_SENSOR, ERR_CODE
+from drivers.micro_epsilon.medaq_sim import MEDAQLibSim
 import json
+import logging
+import os
+import numpy as np
 from pathlib import Path
+logging.getLogger(__name__)
+
+
+SIMULATION_PORT = 'SIM'
+
+
+def sensor_library(comport=None):
+    """ MEDAQLib, or the simulation if MEDAQ_SIMULATION is set or the port is 'SIM'.
+    The simulation is never used in place of a missing library, that raises an OSError """
+    if os.environ.get('MEDAQ_SIMULATION') or comport == SIMULATION_PORT:
+        logging.warning('laser uses the MEDAQLib simulation, the displacement is synthetic')
+        return MEDAQLibSim
+    if not MEDAQLib.is_available():
+        raise OSError('MEDAQLib could not be loaded, set MEDAQ_SIMULATION=1 to simulate the laser')
+    return MEDAQLib
 
 
 class ILD_1900:
     def __init__(self, comport, config_laser, serial_number):
         self.comport = comport
-        self.sensor = MEDAQLib.CreateSensorInstance(ME_SENSOR.SENSOR_ILD1900)
+        self.sensor = sensor_library(comport).CreateSensorInstance(ME_SENSOR.SENSOR_ILD1900)
         self.logging = False
         self.config_laser = config_laser
         self.serial_number = serial_number
+        # values per frame as delivered by Poll/TransferData, the displacement is the last one
+        self.values_per_frame = config_laser.get('values_per_frame', 2)
+        self.sample_period = 1 / config_laser.get('sample_rate', 1000)  # s, refined from the driver timestamps
+        self.raw_buffer = None
+        self.scaled_buffer = None
+        self.last_timestamp = None
+        self.last_count = 0
+        self.errors = 0  # transfers stopped by a driver error, e.g. a buffer overflow
         self.set_config()
         self.sensor.OpenSensor()
 
@@ -30,6 +57,9 @@ class ILD_1900:
         # setting all string parameters from the json file onto the sensor
         for item, value in self.config_laser['str_params'].items():
             self.sensor.SetParameterString(item, str(value))
+        # double parameters are optional, e.g. the SIM_ parameters of the simulation
+        for item, value in self.config_laser.get('double_params', {}).items():
+            self.sensor.SetParameterDouble(item, value)
         # write serial number from gui input
         self.sensor.SetParameterString('IP_SerialNumber', self.serial_number)
 
@@ -60,6 +90,51 @@ class ILD_1900:
             print(self.sensor.GetError())
 
 
+    def start_continuous(self, buffer_size=65536):
+        """ Prepares the buffers for read_available, every value of the sensor is kept from now on """
+        buffer_size -= buffer_size % self.values_per_frame
+        self.raw_buffer = np.zeros(buffer_size, dtype=np.int32)
+        self.scaled_buffer = np.zeros(buffer_size, dtype=np.float64)
+        self.last_timestamp = None
+        self.last_count = 0
+
+    def read_available(self):
+        """ Drains everything MEDAQLib buffered since the last call with TransferDataTs.
+
+        The driver only stamps the first value of a transfer (ms), the other frames are spaced by the sample
+        period, which is estimated from two consecutive transfers.
+
+        :return: tuple (timestamps in ns of the driver clock, displacements) as numpy arrays
+        """
+        if self.raw_buffer is None:
+            self.start_continuous()
+        times = []
+        values = []
+        available = self.sensor.DataAvail()
+        while available >= self.values_per_frame:
+            if self.sensor.GetLastError() != ERR_CODE.ERR_NOERROR:
+                self.errors += 1
+                logging.warning(self.sensor.GetError())
+                break
+            n = min(available, len(self.raw_buffer))
+            n -= n % self.values_per_frame
+            read, raw, scaled, timestamp = self.sensor.TransferDataTsInto(self.raw_buffer, self.scaled_buffer, n)
+            frames = read // self.values_per_frame
+            if frames == 0:
+                break
+            if self.last_timestamp is not None and timestamp > self.last_timestamp and self.last_count:
+                self.sample_period = (timestamp - self.last_timestamp) / 1000 / self.last_count
+            self.last_timestamp = timestamp
+            self.last_count = frames
+            offsets = np.arange(frames) * self.sample_period
+            times.append(((timestamp / 1000 + offsets) * 1e9).astype(np.int64))
+            # copy, the buffer is reused by the next transfer
+            values.append(scaled[:frames * self.values_per_frame].reshape(frames, self.values_per_frame)[:, -1].copy())
+            available -= read
+        if not values:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        return np.concatenate(times), np.concatenate(values)
+
     def get_info(self):
         return self.sensor.GetParameterString("IP_SerialNumber")
 
@@ -70,5 +145,5 @@ class ILD_1900:
 
     def shut_down(self):
         # Release sensor instance when sensor is closed
-        self.self.sensor.CloseSensor()
+        self.sensor.CloseSensor()
         self.sensor.ReleaseSensorInstance()
@@ -0,0 +1,263 @@
+#
+# Pure python stand-in for the MEDAQLib library with the same API as the MEDAQLib class.
+# It simulates a sensor that streams synthetic displacement frames, so the laser path can be run
+# and benchmarked without the vendor DLL. It is only used on request, with the MEDAQ_SIMULATION environment
+# variable or the port 'SIM' (see sensor_library in ild1900).
+#
+
+import time
+import numpy as np
+
+from drivers.micro_epsilon.MEDAQLib import ERR_CODE
+
+
+class MEDAQLibSim:
+    """Simulated sensor instance.
+
+    The sensor produces sample_rate frames per second from OpenSensor on, the frames are generated when
+    they are asked for. Every frame has values_per_frame values, the leading ones are a frame counter and
+    the last one is the displacement (offset + amplitude * sin(2 pi frequency t) + noise, in mm).
+    The simulation is configured with SetParameterInt/Double and the SIM_ parameters below, everything else
+    is only stored, so GetParameter* returns what was set.
+    """
+    defaults = {'SIM_SampleRate': 2000.0,  # frames per second
+                'SIM_ValuesPerFrame': 2,
+                'SIM_Offset': 5.0,  # mm
+                'SIM_Amplitude': 1.0,  # mm
+                'SIM_Frequency': 1.0,  # Hz
+                'SIM_Noise': 0.001,  # mm, standard deviation
+                'SIM_BufferSize': 1 << 20,  # values the driver keeps before the oldest ones are lost
+                'SIM_Seed': 0}
+    raw_scale = 1000  # raw value per mm
+    next_handle = 1
+
+    @staticmethod
+    def CreateSensorInstance(Sensor):
+        """Creates a simulated sensor instance, the sensor constant is only stored.
+
+        :param Sensor: sensor constant
+        :return: sensor instance
+        """
+        handle = MEDAQLibSim.next_handle
+        MEDAQLibSim.next_handle += 1
+        sim = MEDAQLibSim(handle)
+        sim.sensor_type = Sensor
+        return sim
+
+    def __init__(self, handle):
+        self.iSensor = handle
+        self.sensor_type = None
+        self.parameters = dict(self.defaults)
+        self._last_error = ERR_CODE.ERR_NOERROR
+        self.is_open = False
+        self.rng = None
+        self.start = None
+        self.generated = 0  # frames generated since OpenSensor
+        self.raw = np.empty(0, dtype=np.int32)  # values in the simulated driver buffer
+        self.scaled = np.empty(0, dtype=np.float64)
+        self.first_frame = 0  # number of the first frame in the driver buffer
+
+    # --- parameters
+
+    def GetDLLVersion(self):
+        return 'simulation'
+
+    def _set(self, paramName, paramValue):
+        self.parameters[paramName] = paramValue
+        self._last_error = ERR_CODE.ERR_NOERROR
+
+    def SetParameterInt(self, paramName, paramValue):
+        self._set(paramName, int(paramValue))
+
+    def SetParameterDWORD_PTR(self, paramName, paramValue):
+        self._set(paramName, paramValue)
+
+    def SetParameterDouble(self, paramName, paramValue):
+        self._set(paramName, float(paramValue))
+
+    def SetParameterString(self, paramName, paramValue):
+        self._set(paramName, str(paramValue))
+
+    def SetParameterBinary(self, paramName, paramValue):
+        self._set(paramName, bytes(paramValue))
+
+    def SetParameters(self, parameter_list):
+        for item in parameter_list.split(';'):
+            if '=' in item:
+                name, value = item.split('=', 1)
+                self._set(name.strip(), value.strip())
+
+    def _get(self, paramName, default):
+        if paramName not in self.parameters:
+            self._last_error = ERR_CODE.ERR_WRONG_PARAMETER
+            return default
+        self._last_error = ERR_CODE.ERR_NOERROR
+        return self.parameters[paramName]
+
+    def GetParameterInt(self, paramName):
+        return int(self._get(paramName, 0))
+
+    def GetParameterDouble(self, paramName):
+        return float(self._get(paramName, 0.0))
+
+    def GetParameterString(self, paramName, max_len=0, sensor_encoding='cp1252'):
+        value = str(self._get(paramName, ''))
+        return value[:max_len] if max_len else value
+
+    def GetParameterBinary(self, paramName, max_len):
+        return bytearray(self._get(paramName, b''))[:max_len]
+
+    def GetParameters(self, max_len=0, sensor_encoding='cp1252'):
+        text = ';'.join(f'{name}={value}' for name, value in self.parameters.items())
+        return text[:max_len] if max_len else text
+
+    def ClearAllParameters(self):
+        self.parameters = dict(self.defaults)
+        self._last_error = ERR_CODE.ERR_NOERROR
+
+    # --- connection
+
+    def OpenSensor(self):
+        if self.is_open:
+            self._last_error = ERR_CODE.ERR_ALREADY_OPEN
+            return
+        self.is_open = True
+        self.rng = np.random.default_rng(int(self.parameters['SIM_Seed']))
+        self.start = time.perf_counter()
+        self.generated = 0
+        self.first_frame = 0
+        self.raw = np.empty(0, dtype=np.int32)
+        self.scaled = np.empty(0, dtype=np.float64)
+        self._last_error = ERR_CODE.ERR_NOERROR
+
+    def OpenSensorRS232(self, port):
+        self.SetParameterString('IP_Port', port)
+        self.OpenSensor()
+
+    def OpenSensorIF2004_USB(self, deviceInstance, serialNumber, port, channelNumber):
+        self.SetParameterString('IP_SerialNumber', serialNumber)
+        self.SetParameterString('IP_Port', port)
+        self.OpenSensor()
+
+    def CloseSensor(self):
+        self.is_open = False
+        self._last_error = ERR_CODE.ERR_NOERROR
+
+    def ReleaseSensorInstance(self):
+        self.CloseSensor()
+
+    def SensorCommand(self):
+        self._last_error = ERR_CODE.ERR_NOERROR
+
+    # --- data
+
+    @property
+    def values_per_frame(self):
+        return int(self.parameters['SIM_ValuesPerFrame'])
+
+    def _generate(self):
+        """ appends all frames that are due since the last call to the driver buffer """
+        rate = float(self.parameters['SIM_SampleRate'])
+        due = int((time.perf_counter() - self.start) * rate) - self.generated
+        if due <= 0:
+            return
+        frames = self.generated + np.arange(due)
+        t = frames / rate
+        displacement = (float(self.parameters['SIM_Offset'])
+                        + float(self.parameters['SIM_Amplitude']) * np.sin(2 * np.pi * float(self.parameters['SIM_Frequency']) * t)
+                        + self.rng.normal(0, float(self.parameters['SIM_Noise']), due))
+        scaled = np.empty((due, self.values_per_frame))
+        scaled[:, :-1] = (frames % 0x10000)[:, None]  # 16 bit frame counter
+        scaled[:, -1] = displacement
+        scaled = scaled.reshape(-1)
+        self.scaled = np.concatenate([self.scaled, scaled])
+        self.raw = np.concatenate([self.raw, np.round(scaled * self.raw_scale).astype(np.int32)])
+        self.generated += due
+        overflow = len(self.scaled) - int(self.parameters['SIM_BufferSize'])
+        if overflow > 0:
+            overflow += -overflow % self.values_per_frame  # drop whole frames only
+            self.raw = self.raw[overflow:]
+            self.scaled = self.scaled[overflow:]
+            self.first_frame += overflow // self.values_per_frame
+            self._last_error = ERR_CODE.ERR_OVERFLOW
+
+    def _check_open(self):
+        if not self.is_open:
+            self._last_error = ERR_CODE.ERR_NOT_OPEN
+            return False
+        self._last_error = ERR_CODE.ERR_NOERROR
+        self._generate()  # reports ERR_OVERFLOW if frames were lost since the last call
+        return True
+
+    def DataAvail(self):
+        if not self._check_open():
+            return 0
+        return len(self.scaled)
+
+    def _timestamp(self):
+        """ driver time of the first value in the buffer in ms """
+        return (self.start + self.first_frame / float(self.parameters['SIM_SampleRate'])) * 1000
+
+    def _take(self, rawData, scaledData, maxValues):
+        n = min(maxValues, len(self.scaled))
+        timestamp = self._timestamp()
+        rawData[:n] = self.raw[:n]
+        scaledData[:n] = self.scaled[:n]
+        self.raw = self.raw[n:]
+        self.scaled = self.scaled[n:]
+        self.first_frame += n // self.values_per_frame
+        return n, timestamp
+
+    def TransferDataInto(self, rawData, scaledData, maxValues=None):
+        maxValues = min(len(rawData), len(scaledData)) if maxValues is None else maxValues
+        if not self._check_open():
+            return (0, rawData[:0], scaledData[:0])
+        n, _ = self._take(rawData, scaledData, maxValues)
+        return (n, rawData[:n], scaledData[:n])
+
+    def TransferDataTsInto(self, rawData, scaledData, maxValues=None):
+        maxValues = min(len(rawData), len(scaledData)) if maxValues is None else maxValues
+        if not self._check_open():
+            return (0, rawData[:0], scaledData[:0], 0.0)
+        n, timestamp = self._take(rawData, scaledData, maxValues)
+        return (n, rawData[:n], scaledData[:n], timestamp)
+
+    def PollInto(self, rawData, scaledData, maxValues=None):
+        """ the newest maxValues values, they stay in the driver buffer like with the real Poll """
+        maxValues = min(len(rawData), len(scaledData)) if maxValues is None else maxValues
+        if not self._check_open():
+            return (maxValues, rawData[:maxValues], scaledData[:maxValues])
+        n = min(maxValues, len(self.scaled))
+        rawData[:n] = self.raw[len(self.raw) - n:]
+        scaledData[:n] = self.scaled[len(self.scaled) - n:]
+        self._last_error = ERR_CODE.ERR_NOERROR if n else ERR_CODE.ERR_NO_SENSORDATA_AVAILABLE
+        return (maxValues, rawData[:maxValues], scaledData[:maxValues])
+
+    def TransferData(self, maxValues):
+        read, raw, scaled = self.TransferDataInto(*self._numpy_buffers(maxValues))
+        return (raw.tolist(), scaled.tolist(), read)
+
+    def TransferDataTs(self, maxValues):
+        read, raw, scaled, timestamp = self.TransferDataTsInto(*self._numpy_buffers(maxValues))
+        return (raw.tolist(), scaled.tolist(), read, timestamp)
+
+    def Poll(self, maxValues):
+        _, raw, scaled = self.PollInto(*self._numpy_buffers(maxValues))
+        return (raw.tolist(), scaled.tolist())
+
+    @staticmethod
+    def _numpy_buffers(maxValues):
+        return np.zeros(maxValues, dtype=np.int32), np.zeros(maxValues, dtype=np.float64)
+
+    # --- errors
+
+    def GetLastError(self):
+        return int(self._last_error)
+
+    def GetError(self, maxLen=1024):
+        if self._last_error == ERR_CODE.ERR_NOERROR:
+            return ''
+        return f'{ERR_CODE(self._last_error).name} (simulation)'[:maxLen]
+
+    def EnableLogging(self, enableLogging, logType, logLevel, logFile, logAppend, logFlush, logSplitSize):
+        self._last_error = ERR_CODE.ERR_NOERROR
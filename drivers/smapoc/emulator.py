@@ -0,0 +1,222 @@
+import argparse
+import logging
+import os
+import select
+import struct
+import threading
+import time
+import tty
+import numpy as np
+
+from drivers.smapoc.smapoc_driver import FRAME_SIZE, MODE_POWER, MODE_CURRENT
+
+logging.getLogger(__name__)
+
+COMMAND_SIZE = 16  # b'uz' + mode + 0 + 6 x uint16 power
+READ_SIZE = 8  # b'uz' + 6 x 0, sent by SMAPOCWorker.read()
+HANDSHAKE = b'uz\n'
+FULL_SCALE = 32767  # frame value of an open channel
+
+
+class ThermalModel:
+    """ Lumped thermal model of six SMA wires.
+
+    Every wire heats with the electrical power and cools towards ambient. The resistance rises linearly with
+    the temperature and drops by transformation_drop when the wire transforms to austenite. The
+    transformation has a hysteresis: heating follows a_mid, cooling follows m_mid."""
+    ambient = 25.0  # °C
+    capacity = 1.6e-3  # J/K
+    cooling = 5e-3  # W/K, tau = capacity / cooling ~ 0.3 s
+    r_cold = 12000  # frame units (mOhm) at ambient
+    alpha = 1e-3  # 1/K
+    transformation_drop = 0.15  # relative resistance drop of full austenite
+    a_mid = 80.0  # °C, middle of the austenite transformation
+    m_mid = 60.0  # °C, middle of the martensite transformation
+    width = 5.0  # K
+
+    def __init__(self, channels=6):
+        self.temperature = np.full(channels, self.ambient)
+        self.austenite = np.zeros(channels)  # transformed fraction 0..1
+
+    def resistance(self):
+        linear = self.r_cold * (1 + self.alpha * (self.temperature - self.ambient))
+        return linear * (1 - self.transformation_drop * self.austenite)
+
+    def step(self, power_vec, mode, dt):
+        """ advances the model by dt s, power_vec as sent by the host """
+        value = np.asarray(power_vec, dtype=np.float64)
+        substeps = max(1, int(np.ceil(dt / (0.1 * self.capacity / self.cooling))))
+        h = dt / substeps
+        for _ in range(substeps):
+            if mode == MODE_CURRENT:
+                watts = (value / 1000) ** 2 * self.resistance() / 1000
+            else:
+                watts = value / 1000
+            self.temperature += h * (watts - self.cooling * (self.temperature - self.ambient)) / self.capacity
+            heating = 1 / (1 + np.exp(-(self.temperature - self.a_mid) / self.width))
+            cooling = 1 / (1 + np.exp(-(self.temperature - self.m_mid) / self.width))
+            self.austenite = np.clip(np.maximum(np.minimum(self.austenite, cooling), heating), 0, 1)
+
+
+class SMAPOCEmulator:
+    """ Emulates the SMApoc board on a pseudo terminal, so SMAPOC and SMAPOCWorker can open it like the
+    real port (see port).
+
+    Like the board, every power command and every read is answered with one '<8h' frame: mode, 0 and the
+    six resistances. With rate > 0 the emulator streams frames at that rate instead, which allows load tests
+    far above the rate of the board. Faults can be injected with the attributes below or with stall()."""
+
+    def __init__(self, rate=0, seed=None):
+        self.rate = rate  # frames per second, 0 answers every command with one frame
+        self.model = ThermalModel()
+        self.power_vec = np.zeros(6)
+        self.mode = MODE_CURRENT
+        self.noise = 0.0  # standard deviation of the resistance noise, frame units
+        self.drop_rate = 0.0  # probability that a frame is not sent
+        self.garble_rate = 0.0  # probability that a frame is cut short
+        self.open_channels = set()  # channels (0..5) that report an open wire
+        self.stalled_until = 0.0
+        self.frames = 0
+        self.commands = 0
+        self.rng = np.random.default_rng(seed)
+        self.buffer = bytearray()
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        os.set_blocking(self.master, False)
+        self.port = os.ttyname(self.slave)
+        self.running = False
+        self.thread = None
+        self.last_step = None
+
+    def start(self):
+        self.running = True
+        self.last_step = time.perf_counter()
+        self.thread = threading.Thread(target=self.run, name='SMAPOCEmulator', daemon=True)
+        self.thread.start()
+        logging.info(f'SMApoc emulator on {self.port}')
+        return self.port
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def close(self):
+        self.stop()
+        os.close(self.master)
+        os.close(self.slave)
+
+    def stall(self, seconds):
+        """ the board stops answering for some time, like during a brown-out """
+        self.stalled_until = time.perf_counter() + seconds
+
+    def run(self):
+        start = time.perf_counter()
+        streamed = 0
+        while self.running:
+            timeout = 0.001 if self.rate else 0.05
+            readable, _, _ = select.select([self.master], [], [], timeout)
+            if readable:
+                self.buffer += os.read(self.master, 4096)
+                for answer in self.parse():
+                    if not self.rate or not answer:
+                        self.send_frames(1)
+            if self.rate:
+                due = int((time.perf_counter() - start) * self.rate) - streamed
+                if due > 0:
+                    self.send_frames(due)
+                    streamed += due
+
+    def parse(self):
+        """ handles all complete commands in the buffer, yields True for power commands, False otherwise """
+        while True:
+            start = self.buffer.find(b'uz')
+            if start < 0:
+                del self.buffer[:-1]  # keep a trailing b'u'
+                return
+            del self.buffer[:start]
+            if len(self.buffer) < 3:
+                return
+            if self.buffer.startswith(HANDSHAKE):
+                del self.buffer[:len(HANDSHAKE)]
+                yield False
+            elif self.buffer[2] == 0:
+                if len(self.buffer) < READ_SIZE:
+                    return
+                del self.buffer[:READ_SIZE]
+                yield False
+            else:
+                if len(self.buffer) < COMMAND_SIZE:
+                    return
+                mode = self.buffer[2]
+                self.power_vec = np.array(struct.unpack('<6H', bytes(self.buffer[4:COMMAND_SIZE])), dtype=np.float64)
+                del self.buffer[:COMMAND_SIZE]
+                if mode in (MODE_POWER, MODE_CURRENT):
+                    self.mode = mode
+                self.commands += 1
+                yield True
+
+    def make_frames(self, n):
+        now = time.perf_counter()
+        self.model.step(self.power_vec, self.mode, now - self.last_step)
+        self.last_step = now
+        frames = np.zeros((n, 8), dtype='<i2')
+        frames[:, 0] = self.mode
+        resistance = np.broadcast_to(self.model.resistance(), (n, 6))
+        if self.noise:
+            resistance = resistance + self.rng.normal(0, self.noise, (n, 6))
+        frames[:, 2:8] = np.clip(np.round(resistance), 0, FULL_SCALE)
+        for channel in self.open_channels:
+            frames[:, 2 + channel] = FULL_SCALE
+        return frames
+
+    def send_frames(self, n):
+        if time.perf_counter() < self.stalled_until:
+            return
+        frames = self.make_frames(n)
+        if self.drop_rate:
+            frames = frames[self.rng.random(n) >= self.drop_rate]
+        data = frames.tobytes()
+        if self.garble_rate:
+            cut = np.flatnonzero(self.rng.random(len(frames)) < self.garble_rate)
+            if len(cut):
+                # garbled frames lose their tail, the rest of the stream stays intact
+                chunks = np.split(np.frombuffer(data, dtype=np.uint8).reshape(-1, FRAME_SIZE), cut + 1)
+                data = b''.join(chunk.tobytes()[:-FRAME_SIZE // 2] if i < len(cut) else chunk.tobytes()
+                                for i, chunk in enumerate(chunks))
+        try:
+            written = os.write(self.master, data)
+        except BlockingIOError:
+            written = 0
+        if written < len(data):
+            logging.debug('emulator output full, frames lost')  # the host does not read fast enough
+        self.frames += written // FRAME_SIZE
+
+
+def main():
+    parser = argparse.ArgumentParser(description='SMApoc board emulator on a pseudo terminal')
+    parser.add_argument('--rate', type=float, default=0, help='streamed frames per second, 0 answers commands')
+    parser.add_argument('--noise', type=float, default=0.0, help='resistance noise (std, frame units)')
+    parser.add_argument('--drop', type=float, default=0.0, help='probability of a dropped frame')
+    parser.add_argument('--garble', type=float, default=0.0, help='probability of a truncated frame')
+    parser.add_argument('--open', type=int, nargs='*', default=[], help='channels 0..5 with an open wire')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    emulator = SMAPOCEmulator(rate=args.rate)
+    emulator.noise = args.noise
+    emulator.drop_rate = args.drop
+    emulator.garble_rate = args.garble
+    emulator.open_channels = set(args.open)
+    print(emulator.start(), flush=True)
+    try:
+        while True:
+            time.sleep(1)
+            logging.info(f'{emulator.frames} frames sent, {emulator.commands} commands, '
+                         f'temperatures {np.round(emulator.model.temperature, 1)}')
+    except KeyboardInterrupt:
+        emulator.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,15 @@
 import serial
+import numpy as np
 from serial.serialutil import SerialException
 import logging
+import time
 logging.getLogger(__name__)
 
+FRAME_SIZE = 16  # 8 x int16, little endian: mode, 0, six resistances
+MODE_POWER = 2  # closed loop, power in mW
+MODE_CURRENT = 3  # open loop, current in mA
+MODES = (MODE_POWER, MODE_CURRENT)
+
 
 class SMAPOC:
     """ This version uses the SMApoc generation 2 with 6 channels and the firmware version XXX from 2025/04/11
@@ -44,3 +51,110 @@ class SMAPOC:
             self.serial.write(data)  # Send raw bytes
             logging.debug(f'data:{data}')
 
+
+
+class FrameAssembler:
+    """ Cuts the serial byte stream of the SMApoc into complete 16 byte frames.
+
+    The frames carry no sync byte, but every frame starts with a plausible header: a known mode in the first
+    byte and 0 in the second. A frame is only taken if its header and the header of the next frame are
+    plausible, a frame that lost bytes runs into the next one and breaks the header after it. On a
+    mismatch the stream is searched byte by byte for the next header that is confirmed by the header one
+    frame later, the bytes in between are dropped and counted as garbled. A pause on the line longer than
+    frame_gap is only a hint: the rest of a partial frame is dropped if the bytes after the pause start with
+    a header, otherwise the frame was split by the USB latency and is kept.
+
+    The board answers every request with one frame, so the bytes since the last pause (a burst) end on a
+    frame boundary when the answer is complete. The last frame of a read is emitted right away after a
+    pause or if the burst is a whole number of frames, so it gets the reception time of its own last byte.
+    Otherwise the stream goes on and the last frame waits for the next header. flush() ends the stream on an idle line."""
+    frame_gap = 0.005  # s, a frame takes < 1 ms on the line
+
+    def __init__(self, frame_size=FRAME_SIZE, modes=MODES):
+        self.frame_size = frame_size
+        self.is_mode = np.zeros(256, dtype=bool)  # lookup table of the first header byte
+        self.is_mode[list(modes)] = True
+        self.buffer = bytearray()
+        self.last_rx = 0.0
+        self.burst = 0  # bytes received since the last pause, modulo frame_size
+        self.frames = 0  # number of complete frames
+        self.garbled = 0  # number of dropped bytes
+        self.partial = 0  # number of places where bytes were dropped
+
+    def plausible(self, first, second):
+        """ header check of the byte pairs first, second (arrays or single bytes) """
+        return self.is_mode[first] & (np.asarray(second) == 0)
+
+    def feed(self, data: bytes, now=None) -> bytes:
+        """ Adds received bytes, returns all complete frames as one bytes object (multiple of frame_size) """
+        now = time.perf_counter() if now is None else now
+        streaming = now - self.last_rx <= self.frame_gap
+        frames = b''
+        if self.buffer and not streaming and len(data) >= 2 and self.plausible(data[0], data[1]):
+            frames = self.flush()  # a new frame starts after the pause, a partial frame before it was truncated
+        self.last_rx = now
+        self.burst = ((self.burst if streaming else 0) + len(data)) % self.frame_size
+        self.buffer += data
+        return frames + self.cut(hold=streaming and self.burst != 0)
+
+    def flush(self) -> bytes:
+        """ the complete frames that were held back, drops the rest, for a pause or an idle line """
+        frames = self.cut(hold=False)
+        self.resync()
+        return frames
+
+    def cut(self, hold) -> bytes:
+        """ takes the confirmed frames out of the buffer. With hold, the burst goes on and a frame at the end
+        of the buffer waits for the next header, without it the end of the buffer counts as a frame boundary """
+        buf = np.frombuffer(bytes(self.buffer), dtype=np.uint8)
+        n = len(buf)
+        size = self.frame_size
+        chunks = []
+        pos = 0
+        while n - pos >= size:
+            end = pos + (n - pos) // size * size
+            heads = self.plausible(buf[pos:end:size], buf[pos + 1:end:size])
+            if n - end >= 2:
+                after = bool(self.plausible(buf[end], buf[end + 1]))
+            elif n == end and not hold:
+                after = True
+            else:
+                after = None  # the last frame is checked with the next header
+            ok = heads & np.append(heads[1:], after is not False)
+            bad = np.flatnonzero(~ok)
+            if len(bad) == 0:
+                if after is None:
+                    end -= size
+                chunks.append(buf[pos:end])
+                pos = end
+                break
+            k = bad[0]
+            chunks.append(buf[pos:pos + k * size])
+            pos += k * size
+            # bytes got lost: resync at the next header that is confirmed by the header one frame later
+            candidates = pos + 1 + np.flatnonzero(self.plausible(buf[pos + 1:n - 1], buf[pos + 2:n]))
+            follow = candidates + size
+            confirmed = candidates[(follow + 2 > n) | self.plausible(buf[np.minimum(follow, n - 1)],
+                                                                     buf[np.minimum(follow + 1, n - 1)])]
+            skip = confirmed[0] if len(confirmed) else max(n - 1, pos)  # the last byte may start a header
+            logging.debug(f'dropped {skip - pos} bytes of a garbled frame')
+            self.garbled += int(skip - pos)
+            self.partial += 1
+            pos = int(skip)
+        del self.buffer[:pos]
+        frames = b''.join(chunk.tobytes() for chunk in chunks)
+        self.frames += len(frames) // size
+        return frames
+
+    def resync(self):
+        if self.buffer:
+            logging.debug(f'dropped partial frame: {bytes(self.buffer)}')
+            self.garbled += len(self.buffer)
+            self.partial += 1
+            self.buffer.clear()
+
+
+def decode_frames(chunk: bytes) -> np.ndarray:
+    """ Decodes any number of complete '<8h' frames at once, returns an (N, 8) int16 array """
+    n = len(chunk) // FRAME_SIZE
+    return np.frombuffer(chunk, dtype='<i2', count=n * 8).reshape(n, 8)
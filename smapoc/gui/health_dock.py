@@ -0,0 +1,129 @@
+import PyQt5.QtCore as qtc
+import PyQt5.QtWidgets as qtw
+import PyQt5.QtGui as qtg
+import numpy as np
+import logging
+from smapoc.model.clock import session_clock
+from smapoc.model.health import ArrivalStats
+logging.getLogger(__name__)
+
+
+class HealthDock(qtc.QObject):
+    """ Dock with the state of the acquisition pipeline, refreshed a few times per second.
+
+    Per device: achieved sample rate, achieved request rate and missed deadlines of its scheduler task,
+    inter-sample jitter, backlog in the device queue and the dropped and garbled samples or frames. A heartbeat
+    timer measures the GUI frame time, i.e. how long the event loop needs for one turn, a blocked event loop
+    shows up as a high p99."""
+    columns = ['Rate [Hz]', 'Requests [Hz]', 'Missed', 'Jitter p50 [ms]', 'Jitter p99 [ms]', 'Backlog', 'Dropped',
+               'Filtered', 'Garbled']
+    tooltips = ['samples per second over the last 5 s',
+                'achieved requests per second of the scheduler task (SMAPOC: power commands)',
+                'request deadlines that were skipped because the event loop was late',
+                'median deviation of the sample interval from its median',
+                '99th percentile of the deviation of the sample interval from its median',
+                'SMAPOC: frames waiting in the serial buffer, sensors and recorder: samples waiting in the queue',
+                'SMAPOC: requests the board did not answer, sensors and recorder: samples lost because a queue '
+                'was full',
+                'force: samples removed by the spike filter',
+                'SMAPOC: places where bytes of garbled frames were dropped, force: unusable bytes, '
+                'laser: driver errors']
+    rate_columns = (0, 1)  # one decimal
+    lost_columns = (2, 6, 8)  # red if not 0
+    task_rows = {'power': 'smapoc'}  # scheduler task -> row, the other tasks are named like their device
+    refresh_interval = 500  # ms
+    heartbeat_interval = 16  # ms, one frame at 60 Hz
+
+    def __init__(self, parent, communicator):
+        super().__init__()
+        self.parent = parent
+        self.communicator = communicator
+        self.data_handler = communicator.data_handler
+        self.rows = {}
+        self.frames = ArrivalStats()
+
+        self.dock = qtw.QDockWidget('Pipeline health', self.parent)
+        self.dock.setObjectName('pipeline_health')
+        self.dock.setAllowedAreas(qtc.Qt.AllDockWidgetAreas)  # Allow moving anywhere
+        self.dock.setFeatures(qtw.QDockWidget.DockWidgetMovable | qtw.QDockWidget.DockWidgetClosable | qtw.QDockWidget.DockWidgetFloatable)
+
+        # Add to main window
+        self.parent.addDockWidget(qtc.Qt.LeftDockWidgetArea, self.dock)
+        self.dock_content = qtw.QWidget(self.dock)
+        self.layout = qtw.QVBoxLayout(self.dock_content)
+        self.dock.setWidget(self.dock_content)
+
+        self.table = qtw.QTableWidget(0, len(self.columns))
+        self.table.setHorizontalHeaderLabels(self.columns)
+        for i, tooltip in enumerate(self.tooltips):
+            self.table.horizontalHeaderItem(i).setToolTip(tooltip)
+        self.table.setEditTriggers(qtw.QAbstractItemView.NoEditTriggers)
+        self.table.horizontalHeader().setSectionResizeMode(qtw.QHeaderView.ResizeToContents)
+        self.layout.addWidget(self.table)
+        self.lbl_frame_time = qtw.QLabel('GUI frame time: -')
+        self.layout.addWidget(self.lbl_frame_time)
+
+        self.heartbeat = qtc.QTimer()
+        self.heartbeat.setTimerType(qtc.Qt.PreciseTimer)
+        self.heartbeat.timeout.connect(lambda: self.frames.add([session_clock.now_ns()]))
+        self.refresh_timer = qtc.QTimer()
+        self.refresh_timer.timeout.connect(self.refresh)
+        # both timers only run while the dock can be seen
+        self.dock.visibilityChanged.connect(self.set_active)
+
+    def set_active(self, visible):
+        if visible and not self.heartbeat.isActive():
+            self.frames = ArrivalStats()  # the time while hidden is no frame time
+            self.heartbeat.start(self.heartbeat_interval)
+            self.refresh_timer.start(self.refresh_interval)
+            self.refresh()
+        elif not visible:
+            self.heartbeat.stop()
+            self.refresh_timer.stop()
+
+    def row(self, key):
+        if key not in self.rows:
+            self.rows[key] = self.table.rowCount()
+            self.table.insertRow(self.rows[key])
+            self.table.setVerticalHeaderItem(self.rows[key], qtw.QTableWidgetItem(key))
+            for column in range(len(self.columns)):
+                item = qtw.QTableWidgetItem('-')
+                item.setTextAlignment(qtc.Qt.AlignRight | qtc.Qt.AlignVCenter)
+                self.table.setItem(self.rows[key], column, item)
+        return self.rows[key]
+
+    def set_row(self, key, values):
+        row = self.row(key)
+        for column, value in enumerate(values):
+            item = self.table.item(row, column)
+            if value is None or (isinstance(value, float) and np.isnan(value)):
+                item.setText('-')
+            elif isinstance(value, float):
+                item.setText(f'{value:.1f}' if column in self.rate_columns else f'{value:.2f}')
+            else:
+                item.setText(str(value))
+        for column in self.lost_columns:
+            lost = values[column] is not None and values[column] > 0
+            self.table.item(row, column).setForeground(qtg.QBrush(qtc.Qt.red if lost else qtc.Qt.black))
+
+    def refresh(self):
+        now = session_clock.now_ns()
+        health = self.communicator.health
+        status = self.communicator.get_device_status()
+        requests = {self.task_rows.get(name, name): task
+                    for name, task in self.communicator.get_request_stats().items()}
+        keys = list(status.keys()) + health.keys() + [key for key in requests if key in self.communicator.devices]
+        for key in dict.fromkeys(keys):
+            stats = health.stats(key, now)
+            device = status.get(key, {})
+            task = requests.get(key, {})
+            self.set_row(key, [stats['rate'], task.get('rate'), task.get('missed'),
+                               stats['jitter_p50'], stats['jitter_p99'],
+                               device.get('backlog'), device.get('dropped'), device.get('filtered'),
+                               device.get('garbled')])
+        recorder = self.data_handler.stream_recorder
+        if recorder is not None:
+            self.set_row('recorder', [None, None, None, None, None, recorder.backlog(), recorder.dropped, None, None])
+        p50, p99 = self.frames.interval()
+        if not np.isnan(p50):
+            self.lbl_frame_time.setText(f'GUI frame time: p50 {p50:.1f} ms, p99 {p99:.1f} ms')
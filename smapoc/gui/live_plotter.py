@@ -7,6 +7,9 @@ import PyQt5.QtGui as qtg
 from pyqtgraph import DateAxisItem
 import logging
 import pyqtgraph as pg
+from smapoc.model.decimation import MinMaxDecimator
+from smapoc.model.tracing import tracer
+from smapoc.gui.visibility import is_visible
 logging.getLogger(__name__)
 
 class LivePlot(qtc.QObject):
@@ -26,8 +29,6 @@ class LivePlot(qtc.QObject):
         super().__init__()
         pg.setConfigOptions(antialias=True)
         self.parent = parent
-        self.plot_timer = qtc.QTimer()
-        self.plot_timer.timeout.connect(self.update_plot)
 
         if data_handler is None:
             self.data_handler = self.sample_df
@@ -38,7 +39,6 @@ class LivePlot(qtc.QObject):
         else:
             self.data_handler = data_handler
             self.data_handler.plot_status.connect(self.plot_status_changed)
-            self.data_handler.plot_interval.connect(self.set_interval)
 
         try:
             self.names_x = kwargs['list_x']
@@ -57,6 +57,7 @@ class LivePlot(qtc.QObject):
 
         # Add to main window
         self.parent.addDockWidget(qtc.Qt.RightDockWidgetArea, self.dock)
+        self.dock.visibilityChanged.connect(self.visibility_changed)
 
         self.dock_content = qtw.QWidget(self.dock)
         self.layout = qtw.QVBoxLayout(self.dock_content)
@@ -66,6 +67,9 @@ class LivePlot(qtc.QObject):
         self.p1 = self.win.addPlot(title=self.title)
         self.p1.addLegend()
         self.p1_artists = {}
+        self.decimators = {}
+        self.symbols = {}  # name -> True if the curve shows its points
+        self.range_update = False
         # Placeholders
         self.fit_line = None
         self.formula_text = None
@@ -95,12 +99,9 @@ class LivePlot(qtc.QObject):
                 self.dict_radio_buttons[col].setChecked(True)
                 self.dict_radio_buttons[col].filter_changed.connect(self.filter_data)
                 self.h_layout.addWidget(self.dict_radio_buttons[col])
-                self.p1_artists[col] = self.p1.plot(self.data_handler.data[self.names_x[0]],
-                                                    self.data_handler.data[col],
-                                                    name=col,
-                                                    pen=self.colors[i],
-                                                    symbol='o')
-                self.p1.getViewBox().sigRangeChanged.connect(self.updateSymbols)
+                self.p1_artists[col] = self.p1.plot(name=col, pen=self.colors[i])
+            self.p1.getViewBox().sigRangeChanged.connect(self.range_changed)
+            self.update_plot()
 
             # set radio button for approx
             self.radio_button_approx = qtw.QRadioButton("Fit data")
@@ -112,17 +113,14 @@ class LivePlot(qtc.QObject):
 
             self.h_layout.addItem(qtw.QSpacerItem(0, 0, qtw.QSizePolicy.Expanding, qtw.QSizePolicy.Minimum))
 
-    def set_interval(self, interval):
-        self.plot_timer.setInterval(interval)
-
     def toggle_fit(self, checked):
         if checked:
             # Calculate and plot linear fit
-            coeffs = np.polyfit(self.data_handler.data[self.names_x[0]],
-                                self.data_handler.data[self.names_y[0]], 1)
+            coeffs = np.polyfit(self.data_handler.column(self.names_x[0]),
+                                self.data_handler.column(self.names_y[0]), 1)
             slope, intercept = coeffs
-            fit_y = slope * self.data_handler.data[self.names_x[0]] + intercept
-            self.fit_line = self.p1.plot(self.data_handler.data[self.names_x[0]], fit_y, pen=pg.mkPen('y', width=2))
+            fit_y = slope * self.data_handler.column(self.names_x[0]) + intercept
+            self.fit_line = self.p1.plot(self.data_handler.column(self.names_x[0]), fit_y, pen=pg.mkPen('y', width=2))
             formula_str = f"y = {slope:.3f}x + {intercept:.3f}"
 
             self.formula_text = pg.TextItem(text=formula_str, color='y', anchor=(0, 1))
@@ -147,11 +145,12 @@ class LivePlot(qtc.QObject):
 
 
     def plot_status_changed(self, status):
+        # the shared display clock calls render() while plotting
         if status:
-            self.plot_timer.start(80)
+            self.data_handler.display_clock.register(self)
             logging.debug('start plotting')
         else:
-            self.plot_timer.stop()
+            self.data_handler.display_clock.unregister(self)
             logging.debug('stop plotting')
 
 
@@ -166,19 +165,69 @@ class LivePlot(qtc.QObject):
             self.names_y.remove(name)
         self.redraw_plot()
 
+    def decimator(self, col):
+        if col not in self.decimators:
+            self.decimators[col] = MinMaxDecimator(self.names_x[0], col)
+        return self.decimators[col]
+
+    def visible_window(self):
+        """ x range that has to be drawn (None for everything) and the width of the plot in pixels """
+        view_box = self.p1.getViewBox()
+        bins = max(int(view_box.width()), 100)
+        if self.names_x[0] != 'time' or view_box.autoRangeEnabled()[0]:
+            # only the time is ascending, and the auto range needs the whole curve to follow new data
+            return None, bins
+        return view_box.viewRange()[0], bins
+
     def update_plot(self):
+        self.render(self.data_handler.snapshot())
+
+    def is_visible(self):
+        return is_visible(self.dock)
+
+    def visibility_changed(self, visible):
+        # a dock that was tabbed away or hidden while plotting shows the newest data at once
+        if visible and hasattr(self.data_handler, 'display_clock'):
+            self.data_handler.display_clock.catch_up(self)
+
+    @tracer.traced(category='plot')
+    def render(self, snapshot):
+        # every curve gets a min/max envelope of about 2 points per pixel instead of the whole buffer
+        x_range, bins = self.visible_window()
         for i, col in enumerate(self.names_y):
-            self.p1_artists[col].setData(self.data_handler.data[self.names_x[0]],
-                                         self.data_handler.data[col])
+            x, y, decimated = self.decimator(col).points(snapshot, x_range, bins)
+            self.p1_artists[col].setData(x, y)
+            # points are only drawn if they are at least 4 pixels apart
+            self.set_symbols(col, self.colors[i], not decimated and 4 * len(x) <= bins)
+
+    def set_symbols(self, col, color, visible):
+        if self.symbols.get(col) == visible:
+            return
+        self.symbols[col] = visible
+        if visible:
+            self.p1_artists[col].setSymbol('o')
+            self.p1_artists[col].setSymbolSize(4)
+            self.p1_artists[col].setSymbolBrush(color)
+        else:
+            self.p1_artists[col].setSymbol(None)
+
+    def range_changed(self):
+        # zooming or panning by hand needs a new envelope for the visible part, also while the timer is stopped
+        if self.range_update or self.p1.getViewBox().autoRangeEnabled()[0]:
+            return
+        self.range_update = True
+        qtc.QTimer.singleShot(0, self.range_update_done)
+
+    def range_update_done(self):
+        self.range_update = False
+        self.update_plot()
 
     def redraw_plot(self):
         self.clear_plot()
         for i, col in enumerate(self.names_y):
-            self.p1_artists[col] = self.p1.plot(self.data_handler.data[self.names_x[0]],
-                                                self.data_handler.data[col],
-                                                name=col,
-                                                pen=self.colors[i],
-                                                symbol='o')
+            self.p1_artists[col] = self.p1.plot(name=col, pen=self.colors[i])
+        self.symbols = {}
+        self.update_plot()
 
     def clear_plot(self):
         self.p1.clear()
@@ -189,19 +238,6 @@ class LivePlot(qtc.QObject):
             self.p1.removeItem(self.formula_text)
             self.formula_text = None
 
-    def updateSymbols(self):
-        view_range = self.p1.viewRange()
-        x_range = (view_range[0][1] - view_range[0][0])   # Adjust sensitivity
-        if x_range < 5:
-            for i, name in enumerate(self.p1_artists):
-                self.p1_artists[name].setSymbol('o')
-                self.p1_artists[name].setSymbolSize(4)
-                self.p1_artists[name].setSymbolBrush(self.colors[i])
-        else:
-            for i, name in enumerate(self.p1_artists):
-                self.p1_artists[name].setSymbol(None)  # Hide symbols
-
-
 
 
 class FilterRadioButton(qtw.QRadioButton):
@@ -5,10 +5,13 @@ from PyQt5.QtCore import QObject, QThread, pyqtSignal, pyqtSlot
 from ..gui.UI_main_window1 import Ui_MainWindow
 from ..gui.device_wizard import DeviceWizard, StatusTable
 from ..gui.sma_channels import SMAChannels
+from ..gui.health_dock import HealthDock
 from ..gui.dialogs import DialogPlotSelector
 from smapoc import ids as ids
 
-from ..model import calc, data, data_collecter, sma_power, data_handler, communicator
+from ..model import calc, data, data_collecter, sma_power, data_handler, communicator, session_file, replay
+from ..model.tracing import tracer
+from ..model.profiler import SamplingProfiler
 from ..gui import webcam_gui, config_selector
 
 from ..gui.live_plotter import LivePlot
@@ -76,6 +79,29 @@ class SMApocMain(qtw.QMainWindow, Ui_MainWindow):
 
         self.myplots = {}
         self.actionConfig.triggered.connect(self.open_config_selector)
+        self.actionReplay = qtw.QAction('Replay Session...', self)
+        self.menuFile.addAction(self.actionReplay)
+        self.actionReplay.triggered.connect(self.open_replay)
+        self.actionOpenSession = qtw.QAction('Open Session...', self)
+        self.menuFile.addAction(self.actionOpenSession)
+        self.actionOpenSession.triggered.connect(self.open_session)
+        self.health_dock = HealthDock(self, self.communicator)
+        self.menuSettings.addAction(self.health_dock.dock.toggleViewAction())
+        self.actionTrace = qtw.QAction('Trace Pipeline', self)
+        self.actionTrace.setCheckable(True)
+        self.actionTrace.setChecked(tracer.enabled)
+        self.menuOperations.addAction(self.actionTrace)
+        self.actionTrace.toggled.connect(self.toggle_tracing)
+        self.actionAutoRecord = qtw.QAction('Record Sessions', self)
+        self.actionAutoRecord.setCheckable(True)
+        self.actionAutoRecord.setChecked(self.data_handler.config.c_data.get('auto_record', True))
+        self.menuSettings.addAction(self.actionAutoRecord)
+        self.actionAutoRecord.toggled.connect(lambda checked: self.data_handler.config.write_value('auto_record', checked))
+        self.profiler = SamplingProfiler()
+        self.actionProfile = qtw.QAction('Sampling Profiler', self)
+        self.actionProfile.setCheckable(True)
+        self.menuOperations.addAction(self.actionProfile)
+        self.actionProfile.toggled.connect(self.toggle_profiler)
         #self.actionBSAT2_1.triggered.connect(lambda: self.open_stiffness_plotter('BSA-T-2.1'))
         #self.actionBSAT2_2.triggered.connect(lambda: self.open_stiffness_plotter('BSA-T-2.2'))
         #self.actionASA_T_2.triggered.connect(lambda: self.open_stiffness_plotter('ASA-T-2'))
@@ -106,8 +132,77 @@ class SMApocMain(qtw.QMainWindow, Ui_MainWindow):
 
 
 
+    def open_replay(self):
+        # plays a recorded session (or a legacy csv snapshot) through the normal acquisition path
+        file_path, _ = qtw.QFileDialog.getOpenFileName(self, 'Replay Session', 'TEST-DATA',
+                                                       'Sessions (*.smses *.csv)')
+        if not file_path:
+            return
+        speeds = ['1x', '2x', '5x', '10x', '100x', 'max']
+        speed, ok = qtw.QInputDialog.getItem(self, 'Replay Session', 'Speed', speeds, 0, False)
+        if not ok:
+            return
+        try:
+            source = replay.ReplaySource.from_file(file_path, None if speed == 'max' else float(speed[:-1]))
+        except (OSError, ValueError) as e:
+            qtw.QMessageBox.warning(self, 'Replay Session', f'could not open {file_path}: {e}')
+            return
+        if 'replay' in self.communicator.devices:
+            self.communicator.remove_device('replay')
+        self.communicator.add_replay(source)
+        source.finished.connect(self.pause)
+        logging.info(f'replay of {file_path} at {speed}, press play to start')
+
+    def open_session(self):
+        # shows the end of a recorded session in the plots, as much of it as the ring buffer holds
+        if self.data_handler.timer.isActive():
+            qtw.QMessageBox.information(self, 'Open Session', 'Pause the acquisition before opening a session.')
+            return
+        file_path, _ = qtw.QFileDialog.getOpenFileName(self, 'Open Session', 'TEST-DATA', 'Sessions (*.smses)')
+        if not file_path:
+            return
+        try:
+            session = session_file.SessionFile(file_path)
+            self.data_handler.load_session(session, stop=session.span()[1])
+        except (OSError, ValueError) as e:
+            qtw.QMessageBox.warning(self, 'Open Session', f'could not open {file_path}: {e}')
+            return
+        self.data_handler.display_clock.refresh(self.myplots.values())
+        logging.info(f'session {file_path} loaded, {len(self.data_handler)} rows')
+
+    def toggle_tracing(self, checked):
+        # the spans are kept in memory while tracing, unchecking writes them to TEST-DATA
+        if checked:
+            tracer.start()
+            return
+        tracer.stop()
+        folder = Path('TEST-DATA')
+        folder.mkdir(exist_ok=True)
+        path = folder / (dt.datetime.now().strftime('%y%m%d_%H_%M_%S') + '_trace.json')
+        try:
+            tracer.export_chrome(path)
+        except OSError as e:
+            logging.warning(f'trace not written: {e}')
+
+    def toggle_profiler(self, checked):
+        # samples all threads until unchecked, then writes collapsed stacks and pstats to TEST-DATA
+        if checked:
+            self.profiler.start()
+            return
+        self.profiler.stop()
+        folder = Path('TEST-DATA')
+        folder.mkdir(exist_ok=True)
+        try:
+            self.profiler.save(folder / (dt.datetime.now().strftime('%y%m%d_%H_%M_%S') + '_profile'))
+        except OSError as e:
+            logging.warning(f'profile not written: {e}')
+
     def start_play(self):
         self.change_cycle_time()
+        # a replay is a recording already
+        if self.actionAutoRecord.isChecked() and 'replay' not in self.communicator.devices \
+                and not self.data_handler.is_recording():
+            self.start_stream_recording()
         self.communicator.start_requesting()
         self.data_handler.plot_status.emit(True)
     def pause(self):
@@ -118,9 +213,24 @@ class SMApocMain(qtw.QMainWindow, Ui_MainWindow):
     def stop_play(self):
         self.communicator.stop_requesting()
         self.data_handler.plot_status.emit(False)
+        recording = self.data_handler.stop_recording()
+        if recording is not None:
+            self.data_handler.compact_recording(recording)
         self.data_handler.data.to_csv("my_snapshot.csv", decimal=',', sep=';')
         self.data_handler.data_clear()
 
+    def start_stream_recording(self):
+        # every sample of the run goes to TEST-DATA, independent of what the ring buffer still holds
+        folder = Path('TEST-DATA')
+        folder.mkdir(exist_ok=True)
+        path = folder / (dt.datetime.now().strftime('%y%m%d_%H_%M_%S') + '_session.smrec')
+        header = {'config': self.loader.selected_config,
+                  'devices': list(self.communicator.devices.keys())}
+        try:
+            self.data_handler.start_recording(path, header)
+        except OSError as e:
+            logging.warning(f'recording not started: {e}')
+
 
     def wizard_finished(self):
         logging.debug(self.communicator.devices.keys())
@@ -215,6 +325,9 @@ class SMApocMain(qtw.QMainWindow, Ui_MainWindow):
             self.groupBox_sine.setDisabled(True)
 
     def closeEvent(self, event):
+        self.data_handler.stop_recording()
+        if self.profiler.is_running():
+            self.actionProfile.setChecked(False)  # keeps the profile of the run
         try:
             self.wizard.connector_smapoc.thread.stop()
             self.wizard.connector_smapoc.thread.quit()
@@ -3,6 +3,7 @@ import PyQt5.QtWidgets as qtw
 import PyQt5.QtCore as qtc
 import PyQt5.QtGui as qtg
 import pyqtgraph as pg
+import numpy as np
 import os
 from datetime import datetime
 from pathlib import Path
@@ -13,12 +14,16 @@ from smapoc.gui.webcam_window import FloatingCameraWindow
 
 from smapoc.gui.dialogs import LineDialog
 from smapoc import ids
+from smapoc.model.tracing import tracer
+from smapoc.model.decimation import MinMaxDecimator
+from smapoc.gui.visibility import is_visible
 import json
 
 import logging
 logging.getLogger(__name__)
 
 class ScriptExecutor(qtw.QDialog, Ui_DialogSequence):
+    plot_interval = 50  # ms, the script plots redraw faster than the live plots
     labeling = {ids.CURRENT: {'title': 'Current Driving',
                               'y_label': 'Current [mA]'},
                 ids.POWER: {'title': 'Power Driving',
@@ -61,8 +66,6 @@ class ScriptExecutor(qtw.QDialog, Ui_DialogSequence):
         self.btn_start_stop.clicked.connect(self.toggle_execution)
         self.btn_reset_offsets.clicked.connect(self.reset_offsets)
 
-        self.plot_timer = qtc.QTimer()
-        self.plot_timer.timeout.connect(self.update_plots)
         self.stop_timer = qtc.QTimer()
 
         # initialize plot
@@ -96,7 +99,7 @@ class ScriptExecutor(qtw.QDialog, Ui_DialogSequence):
         self.test_name = test_name
         self.comboBox_select_sequence.addItem(self.test_name)
         self.comboBox_select_sequence.setDisabled(True)
-        self.plot_timer.start(50)
+        self.data_handler.display_clock.register(self, self.plot_interval)
         self.communicator.start_requesting(mode='direct')
         self.exec_()
 
@@ -107,7 +110,7 @@ class ScriptExecutor(qtw.QDialog, Ui_DialogSequence):
         self.camera_window = None
 
     def start_plots(self):
-        self.plot_timer.start(50)
+        self.data_handler.display_clock.register(self, self.plot_interval)
         self.communicator.start_requesting(mode='direct')
         self.data_handler.data_clear()
 
@@ -128,15 +131,16 @@ class ScriptExecutor(qtw.QDialog, Ui_DialogSequence):
     def zero_force(self):
         self.communicator.zero(what='force')
 
-    def update_plots(self):
+    def render(self, snapshot):
+        # called by the display clock
         if len(self.communicator.devices.keys()) >= 4:
-            self.plot_handler.update_res()
-            self.plot_handler.update_laser()
-            self.plot_handler.update_pow()
-            self.plot_handler.update_force()
+            self.plot_handler.update_res(snapshot)
+            self.plot_handler.update_laser(snapshot)
+            self.plot_handler.update_pow(snapshot)
+            self.plot_handler.update_force(snapshot)
 
     def stop_plots(self):
-        self.plot_timer.stop()
+        self.data_handler.display_clock.unregister(self)
         self.communicator.stop_requesting()
 
     def load_text_files(self, folder_path):
@@ -300,8 +304,8 @@ class ScriptExecutor(qtw.QDialog, Ui_DialogSequence):
         # Create a filename with datetime prefix
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         if 'laser' in self.communicator.devices.keys():
-            up_stroke = self.data_handler.data['laser'].min()
-            down_stroke = self.data_handler.data['laser'].max()
+            up_stroke = np.nanmin(self.data_handler.column('laser'))
+            down_stroke = np.nanmax(self.data_handler.column('laser'))
             filename = f"{timestamp}_{sample_name}_upstroke{up_stroke:.3f}_downstroke{down_stroke:.3f}.csv"
         else:
             filename = f"{timestamp}_{sample_name}.csv"
@@ -338,7 +342,25 @@ class ScriptExecutor(qtw.QDialog, Ui_DialogSequence):
     def reset_offsets(self):
         self.communicator.reset_offsets()
 
+    def is_visible(self):
+        return is_visible(self)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.data_handler.display_clock.catch_up(self)
+
+    def moveEvent(self, event):
+        super().moveEvent(event)
+        self.data_handler.display_clock.catch_up(self)
+
+    def changeEvent(self, event):
+        super().changeEvent(event)
+        if event.type() == qtc.QEvent.WindowStateChange:
+            self.data_handler.display_clock.catch_up(self)  # restored from minimized
+
     def closeEvent(self, event):
+        self.data_handler.display_clock.unregister(self)
+        self.data_handler.display_clock.forget(self)
         self.communicator.zero_output()
         event.accept()  # Proceed with closing
 
@@ -377,25 +399,38 @@ class PlotHandler:
                                             name='Laser')
         self.force_artist = self.force.plot(pen=self.colors[0],
                                             name='Force')
+        self.decimators = {}
 
+    # snapshot: BufferSnapshot of the display tick, the columns are shared with the other plots. pyqtgraph keeps
+    # the arrays it gets, so the curves get the min/max envelope in new arrays and never the views of the buffer
 
+    def set_curve(self, plot, artist, name, snapshot):
+        if name not in self.decimators:
+            self.decimators[name] = MinMaxDecimator('time', name)
+        x, y, _ = self.decimators[name].points(snapshot, bins=max(int(plot.width()), 100))
+        artist.setData(x, y)
 
-
-    def update_res(self):
+    @tracer.traced(category='plot')
+    def update_res(self, snapshot):
         for name, artist in self.res_artists.items():
-            if name in self.data_handler.data.keys():
-                artist.setData(self.data_handler.data['time'], self.data_handler.data[name])
+            if name in snapshot:
+                self.set_curve(self.res, artist, name, snapshot)
 
-    def update_pow(self):
+    @tracer.traced(category='plot')
+    def update_pow(self, snapshot):
         for name, artist in self.pow_artists.items():
-            if name in self.data_handler.data.keys():
-                artist.setData(self.data_handler.data['time'], self.data_handler.data[name])
-
-    def update_laser(self):
-        self.laser_artist.setData(self.data_handler.data['time'], self.data_handler.data['laser'])
-
-    def update_force(self):
-        self.force_artist.setData(self.data_handler.data['time'], self.data_handler.data['force'])
+            if name in snapshot:
+                self.set_curve(self.pow, artist, name, snapshot)
+
+    @tracer.traced(category='plot')
+    def update_laser(self, snapshot):
+        if 'laser' in snapshot:
+            self.set_curve(self.laser, self.laser_artist, 'laser', snapshot)
+
+    @tracer.traced(category='plot')
+    def update_force(self, snapshot):
+        if 'force' in snapshot:
+            self.set_curve(self.force, self.force_artist, 'force', snapshot)
 
 
 if __name__ == '__main__':
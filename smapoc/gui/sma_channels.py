@@ -2,22 +2,24 @@ import PyQt5.QtCore as qtc
 import PyQt5.QtWidgets as qtw
 import PyQt5.QtGui  as qtg
 from ..gui.UI_single_channel import Ui_SingleChannel
-import numpy as np
 import logging
-import time
 logging.getLogger(__name__)
 
 
 class SMAChannels(qtc.QObject):
+    """ Dock with one Channel widget per SMA wire. The widgets only hold the sine settings, the output is
+    computed by the Power model when a command is sent, and all labels are refreshed by one slow timer. """
     update_power = qtc.pyqtSignal()
 
     channel_names = ['CH1', 'CH2', 'CH3', 'CH4', 'CH5', 'CH6']
+    label_interval = 100  # ms, nobody reads a label faster
 
 
     def __init__(self, parent):
         super().__init__()
         self.parent = parent
         self.channels = {}
+        self.outputs = {}  # name -> last output sent to the board, see set_outputs
 
         self.dock = qtw.QDockWidget('SMAPOC channels', self.parent)
         self.dock.setAllowedAreas(qtc.Qt.AllDockWidgetAreas)  # Allow moving anywhere
@@ -35,6 +37,20 @@ class SMAChannels(qtc.QObject):
         for ch in self.channel_names:
             self.add_channel(ch)
 
+        self.label_timer = qtc.QTimer()
+        self.label_timer.timeout.connect(self.refresh_labels)
+        self.label_timer.start(self.label_interval)
+
+    def set_outputs(self, outputs):
+        """ outputs: dict channel name -> value, only stored, the labels follow with the next refresh """
+        self.outputs.update(outputs)
+
+    def refresh_labels(self):
+        if not self.dock.isVisible():
+            return
+        for name, channel in self.channels.items():
+            if name in self.outputs:
+                channel.show_output(self.outputs[name])
 
     def update(self):
         self.update_power.emit()
@@ -58,10 +74,6 @@ class Channel(qtw.QWidget, Ui_SingleChannel):
 
         self.state = True
         self.output = 0
-
-        self.timer = qtc.QTimer()
-        self.timer.timeout.connect(self.update_sine)
-        self.timer.start(10)
         self.amp = self.doubleSpinBox_amp.value()
         self.freq = self.doubleSpinBox_freq.value()
         self.off = self.doubleSpinBox_offset.value()
@@ -81,12 +93,10 @@ class Channel(qtw.QWidget, Ui_SingleChannel):
         self.off = self.doubleSpinBox_offset.value()
         self.phase = self.doubleSpinBox_phase.value()
 
-    def update_sine(self):
-        #logging.debug(f'{self.name}:{self.chs_obj.globaltime}')
-        out = (self.amp * np.sin(2 * np.pi * self.freq * time.time() + self.phase) + self.off) * self.output
-        #logging.debug(f'{self.name}:{out}')
-        self.lbl_output_value.setText(f'{out:.1f}')
-        return out
+    def show_output(self, value):
+        text = f'{value:.1f}'
+        if self.lbl_output_value.text() != text:
+            self.lbl_output_value.setText(text)
 
 
     def toggle_state(self):
@@ -16,6 +16,8 @@ import pyqtgraph as pg
 from smapoc.gui.UI_stiffness import Ui_DialogStiffness
 from smapoc.gui.dialogs import LineDialog
 from smapoc import ids
+from smapoc.model.tracing import tracer
+from smapoc.gui.visibility import is_visible
 
 
 logging.getLogger(__name__)
@@ -40,9 +42,6 @@ class StiffnessPlot(qtw.QDialog, Ui_DialogStiffness):
         pg.setConfigOptions(antialias=True)
         self.parent = parent
         self.data_handler = data_handler
-        self.interval = 100
-        self.plot_timer = qtc.QTimer()
-        self.plot_timer.timeout.connect(self.update_plot)
 
 
 
@@ -53,6 +52,8 @@ class StiffnessPlot(qtw.QDialog, Ui_DialogStiffness):
         # current data column labels
         self.x_name = None
         self.y_name = None
+        self.count = None  # RingBuffer.count up to which the rows are plotted, None to start over
+        self.clears = None
         self.state = False
         self.line = None
         self.line_state = False
@@ -72,6 +73,9 @@ class StiffnessPlot(qtw.QDialog, Ui_DialogStiffness):
         self.p1.setLabel('left', 'Force')  # 'left' refers to Y axis
         self.p1.setLabel('bottom', 'Displacement')  # 'bottom' refers to X axis
         self.p1.showGrid(x=True, y=True)
+        # the curve and the marker of the newest point live as long as the dialog, only new points are added
+        self.curve = GrowingCurve(self.p1, self.colors[0], max_points=self.data_handler.data_array_size)
+        self.marker = self.p1.plot(pen=None, symbol='o', symbolBrush=self.colors[1], symbolPen=self.colors[1])
         self.comboBox_source_x.currentIndexChanged.connect(self.update_data_source)
         self.comboBox_source_y.currentIndexChanged.connect(self.update_data_source)
 
@@ -84,7 +88,7 @@ class StiffnessPlot(qtw.QDialog, Ui_DialogStiffness):
     def toggle_line(self):
         if self.line_state:
             self.line_state = False
-            self.p1.removeItem(self.line)
+            self.line.remove()
         else:
             self.line_state = True
             self.line = DraggableLine(self.p1, self.lbl_formula)
@@ -100,7 +104,7 @@ class StiffnessPlot(qtw.QDialog, Ui_DialogStiffness):
             self.state = False
             self.btn_start_stop.setText('Start')
             self.communicator.stop_requesting()
-            self.plot_timer.stop()
+            self.data_handler.display_clock.unregister(self)
             #vb = self.p1.getViewBox()
             #vb.setMouseEnabled(x=True, y=True)
 
@@ -110,7 +114,7 @@ class StiffnessPlot(qtw.QDialog, Ui_DialogStiffness):
             self.btn_start_stop.setText('Stop')
             self.data_handler.data_clear()
             self.communicator.start_requesting()
-            self.plot_timer.start(self.interval)
+            self.data_handler.display_clock.register(self)
             # Assuming 'plot' is a PlotItem
             #vb = self.p1.getViewBox()
             # Update axis limits
@@ -139,18 +143,27 @@ class StiffnessPlot(qtw.QDialog, Ui_DialogStiffness):
     def update_data_source(self):
         self.x_name = self.comboBox_source_x.currentText()
         self.y_name = self.comboBox_source_y.currentText()
+        self.count = None
 
 
-    def update_plot(self):
-        self.p1.clear()
-        if all(col in self.data_handler.data.columns for col in [self.x_name, self.y_name]):
-            self.p1.plot(self.data_handler.data[self.x_name],
-                         self.data_handler.data[self.y_name],
-                         pen=self.colors[0])
-            self.p1.plot(self.data_handler.data[self.x_name][-2:-1],
-                         self.data_handler.data[self.y_name][-2:-1],
-                         pen=self.colors[1],
-                         symbol='o')
+    @tracer.traced(category='plot')
+    def render(self, snapshot):
+        # called by the display clock
+        if not all(col in snapshot for col in [self.x_name, self.y_name]):
+            return
+        if self.count is None or snapshot.clears != self.clears:
+            # new data source or cleared buffer, the curve starts again with what the snapshot holds
+            self.curve.clear()
+            self.count = snapshot.count - len(snapshot)
+            self.clears = snapshot.clears
+        new = min(snapshot.count - self.count, len(snapshot))
+        if new <= 0:
+            return
+        x = snapshot.view(self.x_name, new)
+        y = snapshot.view(self.y_name, new)
+        self.curve.append(x, y)
+        self.marker.setData(x[-1:].copy(), y[-1:].copy())  # pyqtgraph keeps the arrays, the views change
+        self.count = snapshot.count
 
     def save_csv(self):
         sample_dialog = LineDialog(title="Sample name", text="Enter sample name")
@@ -210,13 +223,84 @@ class StiffnessPlot(qtw.QDialog, Ui_DialogStiffness):
 
         self.exec_()
 
+    def is_visible(self):
+        return is_visible(self)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.data_handler.display_clock.catch_up(self)
+
+    def moveEvent(self, event):
+        super().moveEvent(event)
+        self.data_handler.display_clock.catch_up(self)
+
+    def changeEvent(self, event):
+        super().changeEvent(event)
+        if event.type() == qtc.QEvent.WindowStateChange:
+            self.data_handler.display_clock.catch_up(self)  # restored from minimized
+
     def closeEvent(self, event):
+        self.data_handler.display_clock.unregister(self)
+        self.data_handler.display_clock.forget(self)
         self.communicator.zero_output()
         event.accept()  # Proceed with closing
 
 
 
 
+class GrowingCurve:
+    """ Curve that grows at its end, for plots of a test (e.g. force over displacement).
+
+    The points are kept in chunks of chunk_size points, every chunk is one PlotDataItem. append() only
+    touches the newest chunk, the complete chunks are never sent to pyqtgraph again. Like the ring buffer
+    the curve keeps only the newest max_points points (up to one chunk more), the oldest complete chunk is
+    removed as soon as the newer ones hold max_points, so memory and paint cost stay bounded."""
+    chunk_size = 4096
+
+    def __init__(self, plot_item, pen, max_points=None):
+        self.plot_item = plot_item
+        self.pen = pen
+        self.max_points = max_points  # None keeps every point since the last clear()
+        self.items = []
+        self.x = None
+        self.y = None
+        self.n = 0  # points in the newest chunk
+        self.new_chunk()
+
+    def new_chunk(self):
+        # the complete chunks without the oldest one already cover max_points
+        while self.max_points is not None and (len(self.items) - 1) * self.chunk_size >= self.max_points:
+            self.plot_item.removeItem(self.items.pop(0))
+        item = pg.PlotDataItem(pen=self.pen, connect='finite')
+        self.plot_item.addItem(item)
+        self.items.append(item)
+        # new arrays, the complete chunk keeps showing views of its own
+        x, y = np.empty(self.chunk_size + 1), np.empty(self.chunk_size + 1)
+        if self.n:
+            # the new chunk starts with the last point of the previous one, so the curve has no gap
+            x[0], y[0] = self.x[self.n - 1], self.y[self.n - 1]
+            self.n = 1
+        self.x, self.y = x, y
+
+    def append(self, x, y):
+        while len(x):
+            take = min(len(x), len(self.x) - self.n)
+            self.x[self.n:self.n + take] = x[:take]
+            self.y[self.n:self.n + take] = y[:take]
+            self.n += take
+            x, y = x[take:], y[take:]
+            self.items[-1].setData(self.x[:self.n], self.y[:self.n])
+            if self.n == len(self.x):
+                self.new_chunk()
+
+    def clear(self):
+        for item in self.items:
+            self.plot_item.removeItem(item)
+        self.items = []
+        self.n = 0
+        self.new_chunk()
+
+
 class DraggableLine(qtw.QWidget):
     return_slope = qtc.pyqtSignal(list)
     def __init__(self, plot_widget, label_formula):
@@ -277,6 +361,11 @@ class DraggableLine(qtw.QWidget):
     def get_slope(self):
         return self.m, self.b
 
+    def remove(self):
+        self.plot_widget.removeItem(self.line)
+        for pt in self.points:
+            self.plot_widget.removeItem(pt)
+
 
 
 class DraggablePoint(pg.ScatterPlotItem):
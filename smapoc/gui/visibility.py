@@ -0,0 +1,15 @@
+import PyQt5.QtCore as qtc
+import PyQt5.QtGui as qtg
+import logging
+logging.getLogger(__name__)
+
+
+def is_visible(widget):
+    """ True if a part of widget can be seen: shown, not tabbed away or minimized, not empty and on a screen """
+    if not widget.isVisible() or widget.window().isMinimized():
+        return False
+    if widget.visibleRegion().isEmpty():
+        return False
+    # a floating window can be moved off all screens
+    rect = qtc.QRect(widget.mapToGlobal(qtc.QPoint(0, 0)), widget.size())
+    return any(screen.geometry().intersects(rect) for screen in qtg.QGuiApplication.screens())
@@ -11,6 +11,9 @@ FROM_LASER = 11
 FROM_FORCE = 12
 FROM_SMAPOC = 13
 FROM_WEBCAM = 14
+FROM_REPLAY = 15
+REPLAY_FORCE = 16  # recorded samples, filtered and zeroed already
+REPLAY_LASER = 17
 
 
 
@@ -29,6 +32,11 @@ CHANNEL_MAPPING = {'CH1': 0,
                    'CH5': 4,
                    'CH6': 5}
 
+# data channel names of the SMAPOC frame (columns 2..7) and of the power vector
+RES_CHANNELS = ['r1', 'r2', 'r3', 'r4', 'r5', 'r6']
+POW_CHANNELS = ['pow1', 'pow2', 'pow3', 'pow4', 'pow5', 'pow6']
+CURR_CHANNELS = ['curr1', 'curr2', 'curr3', 'curr4', 'curr5', 'curr6']
+
 # SMAPOC in openloop = current or closed loop == POWER
 CURRENT = 3
 POWER = 2
\ No newline at end of file
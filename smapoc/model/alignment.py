@@ -0,0 +1,142 @@
+import logging
+import numpy as np
+
+logging.getLogger(__name__)
+
+NEAREST = 'nearest'
+LINEAR = 'linear'
+HOLD = 'hold'  # zero-order hold, the last value before the grid point
+METHODS = [NEAREST, LINEAR, HOLD]
+
+
+def resample(t, v, grid, method=LINEAR):
+    """ Values of one stream (sorted sample times t, values v) at the times of grid.
+    Grid points before the first sample are NaN, after the last sample the last value is held. """
+    t = np.asarray(t, dtype=np.float64)
+    v = np.asarray(v, dtype=np.float64)
+    grid = np.asarray(grid, dtype=np.float64)
+    if len(t) == 0:
+        return np.full(len(grid), np.nan)
+    if method == LINEAR:
+        return np.interp(grid, t, v, left=np.nan)
+    idx = np.searchsorted(t, grid, side='right') - 1  # last sample <= grid point
+    left = np.clip(idx, 0, len(t) - 1)
+    if method == HOLD:
+        out = v[left]
+    elif method == NEAREST:
+        right = np.clip(idx + 1, 0, len(t) - 1)
+        use_right = np.abs(t[right] - grid) < np.abs(grid - t[left])
+        out = np.where(use_right, v[right], v[left])
+    else:
+        raise ValueError(f'unknown interpolation {method}, use one of {METHODS}')
+    out = out.astype(np.float64)
+    out[grid < t[0]] = np.nan
+    return out
+
+
+def make_grid(start, stop, period):
+    """ grid points k * period within [start, stop], aligned to multiples of period """
+    first = np.ceil(start / period - 1e-9)
+    last = np.floor(stop / period + 1e-9)
+    if last < first:
+        return np.empty(0)
+    return np.arange(first, last + 1) * period
+
+
+def align_streams(streams, period, method=LINEAR, methods=None, start=None, stop=None):
+    """ Merges streams of different rates into one table on a common time grid (offline use).
+
+    :param streams: dict name -> (times in s, values)
+    :param period: grid period in s
+    :param method: interpolation for all streams, methods overrides it per stream
+    :return: dict with 'time' and one array per stream
+    """
+    methods = methods or {}
+    streams = {name: (np.asarray(t, dtype=np.float64), np.asarray(v, dtype=np.float64))
+               for name, (t, v) in streams.items() if len(t)}
+    if not streams:
+        return {'time': np.empty(0)}
+    if start is None:
+        start = min(t[0] for t, _ in streams.values())
+    if stop is None:
+        stop = max(t[-1] for t, _ in streams.values())
+    grid = make_grid(start, stop, period)
+    table = {'time': grid}
+    for name, (t, v) in streams.items():
+        table[name] = resample(t, v, grid, methods.get(name, method))
+    return table
+
+
+class StreamAligner:
+    """ Live version of align_streams.
+
+    Samples are added per stream as they arrive, pop_aligned() returns the rows of all grid points that are
+    older than now - latency. The latency gives slower streams the time to deliver their samples, a stream
+    that is late by more than that is held at its last value. Only the samples that are still needed for
+    the next grid points are kept."""
+
+    def __init__(self, period, method=LINEAR, methods=None, latency=0.05):
+        self.period = period  # s
+        self.method = method
+        self.methods = methods or {}
+        self.latency = latency  # s
+        self.pending = {}  # name -> list of (times, values) blocks
+        self.streams = {}  # name -> (times, values) still needed for interpolation
+        self.next_k = None  # index of the next grid point, integer to avoid rounding on the grid
+
+    @property
+    def names(self):
+        return list(self.streams.keys() | self.pending.keys())
+
+    def add(self, name, times, values):
+        """ times in s of the session clock, sorted """
+        times = np.atleast_1d(np.asarray(times, dtype=np.float64))
+        if len(times) == 0:
+            return
+        self.pending.setdefault(name, []).append((times, np.atleast_1d(np.asarray(values, dtype=np.float64))))
+
+    def restart(self):
+        """ drops everything that is not aligned yet, the next grid starts at the next sample """
+        self.pending = {}
+        self.streams = {}
+        self.next_k = None
+
+    def merge_pending(self):
+        for name, blocks in self.pending.items():
+            t_old, v_old = self.streams.get(name, (np.empty(0), np.empty(0)))
+            t = np.concatenate([t_old] + [b[0] for b in blocks])
+            v = np.concatenate([v_old] + [b[1] for b in blocks])
+            if np.any(np.diff(t) < 0):
+                order = np.argsort(t, kind='stable')
+                t, v = t[order], v[order]
+            self.streams[name] = (t, v)
+        self.pending = {}
+
+    def flush(self):
+        """ all remaining grid points up to the newest sample, without waiting for the latency """
+        self.merge_pending()
+        stops = [t[-1] for t, _ in self.streams.values() if len(t)]
+        if not stops:
+            return {'time': np.empty(0)}
+        return self.pop_aligned(max(stops) + self.latency)
+
+    def pop_aligned(self, now):
+        """ :return: dict 'time' + one array per stream for all grid points up to now - latency """
+        self.merge_pending()
+        if self.next_k is None:
+            starts = [t[0] for t, _ in self.streams.values() if len(t)]
+            if not starts:
+                return {'time': np.empty(0)}
+            self.next_k = int(np.ceil(min(starts) / self.period))
+        last_k = int(np.floor((now - self.latency) / self.period))
+        if last_k < self.next_k:
+            return {'time': np.empty(0)}
+        grid = np.arange(self.next_k, last_k + 1) * self.period
+        table = {'time': grid}
+        for name, (t, v) in self.streams.items():
+            table[name] = resample(t, v, grid, self.methods.get(name, self.method))
+            # keep the last sample before the newest grid point, it is needed for the next points
+            keep = max(np.searchsorted(t, grid[-1], side='right') - 1, 0)
+            self.streams[name] = (t[keep:], v[keep:])
+        self.next_k = last_k + 1
+        return table
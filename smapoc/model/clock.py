@@ -0,0 +1,55 @@
+import datetime as dt
+import logging
+import time
+import numpy as np
+
+logging.getLogger(__name__)
+
+
+class SessionClock:
+    """ One monotonic clock for all devices.
+
+    Samples are stamped with time.perf_counter_ns() in the thread that acquires them. seconds() turns these
+    stamps into seconds since the start of the session. Devices with their own clock (the laser driver) are
+    mapped onto the session clock with an offset that is learned from the first block of samples."""
+    max_device_error = 0.5  # s, re-anchor a device clock that drifted further than this
+
+    def __init__(self):
+        self.t0 = time.perf_counter_ns()
+        self.t0_wall = dt.datetime.now()
+        self.device_offsets = {}
+
+    @staticmethod
+    def now_ns():
+        return time.perf_counter_ns()
+
+    def now(self):
+        return (time.perf_counter_ns() - self.t0) / 1e9
+
+    def seconds(self, t_ns):
+        """ session seconds of a timestamp (or an array of timestamps) in ns """
+        return (np.asarray(t_ns, dtype=np.int64) - self.t0) / 1e9
+
+    def to_datetime(self, seconds):
+        return self.t0_wall + dt.timedelta(seconds=float(seconds))
+
+    def from_device(self, name, device_ns, received_ns=None):
+        """ maps device timestamps (ns, any epoch) onto the session clock, the newest one is taken as received now """
+        device_ns = np.asarray(device_ns, dtype=np.int64)
+        if len(device_ns) == 0:
+            return device_ns
+        received_ns = self.now_ns() if received_ns is None else received_ns
+        offset = self.device_offsets.get(name)
+        if offset is None or abs(device_ns[-1] + offset - received_ns) > self.max_device_error * 1e9:
+            if offset is not None:
+                logging.warning(f'{name} clock re-anchored')
+            offset = received_ns - int(device_ns[-1])
+            self.device_offsets[name] = offset
+        return device_ns + offset
+
+    def reset_device(self, name):
+        self.device_offsets.pop(name, None)
+
+
+# shared by all workers and the data handler
+session_clock = SessionClock()
@@ -4,11 +4,15 @@ from PyQt5.QtCore import QThread, QObject, pyqtSignal, pyqtSlot
 import PyQt5.QtCore as qtc
 from drivers.micro_epsilon.ild1900 import ILD_1900
 from drivers.me_messsysteme.gsv3_usb import GSV3USB
+from drivers.smapoc.smapoc_driver import FrameAssembler, decode_frames, FRAME_SIZE
+from smapoc.model.clock import session_clock
+from smapoc.model.tracing import tracer
 from smapoc.gui import webcam_gui
 import logging
 import smapoc.ids as ids
 import struct
 import numpy as np
+import queue
 import sys
 import cv2
 
@@ -18,7 +22,9 @@ logging.getLogger(__name__)
 
 class SMAPOCWorker(QThread):
     name = 'SMAPOC'
-    data_received = pyqtSignal(int, list)  # id + Signal to send received binary data
+    read_timeout = 0.1  # s, upper bound for a blocking read, keeps stop() responsive
+    data_received = pyqtSignal(int, list)  # id + last received frame as list, used by the selftest
+    frames_received = pyqtSignal(int, np.ndarray, np.ndarray)  # id + timestamps [ns] + frames of one read (N, 8)
     error_signal = pyqtSignal(str)  # Signal for error messages
     send_data_signal = pyqtSignal(int, bytes)  # id + Signal to receive binary data from GUI
     send_status = pyqtSignal(list)
@@ -31,25 +37,34 @@ class SMAPOCWorker(QThread):
         self.serial = None
         self.id = 999
         self.timer = qtc.QTimer()
+        self.assembler = FrameAssembler()
+        self.requests = 0  # writes that the board answers with one frame each
         self.send_data_signal.connect(self.write_data)
 
     def run(self):
         logging.debug('SMAPOC run is called')
+        tracer.name_thread(self.name)
         try:
-            self.serial = serial.Serial(self.port, self.baudrate, timeout=0.5)
+            self.serial = serial.Serial(self.port, self.baudrate, timeout=self.read_timeout)
             self.error_signal.emit(f"Connected to {self.port}")
             self.send_data_signal.connect(self.write_data)  # Connect signal to slot
 
             while self.running:
-                if self.serial.in_waiting == 16:
-                    data = self.serial.read(self.serial.in_waiting)# Read raw bytes
-                    data_parsed = list(struct.unpack('<8h', data))
-                    self.data_received.emit(self.id, data_parsed)  # Send raw bytes to GUI
-                    logging.debug(f'received 16bytes: {data_parsed}')
-
-                elif (self.serial.in_waiting > 0) and (self.serial.in_waiting < 16):
-                    data = self.serial.read(self.serial.in_waiting)
-                    logging.debug(f'received:{data}')
+                # blocks until at least one byte arrived, then takes everything that is waiting
+                with tracer.span('smapoc.read', 'serial'):
+                    data = self.serial.read(max(1, self.serial.in_waiting))
+                t_rx = session_clock.now_ns()
+                with tracer.span('smapoc.decode', 'decode'):
+                    if data:
+                        frames = decode_frames(self.assembler.feed(data))
+                    else:
+                        # line is idle: the held back frame is complete, a partial frame will never complete
+                        frames = decode_frames(self.assembler.flush())
+                if len(frames):
+                    timestamps = np.full(len(frames), t_rx, dtype=np.int64)
+                    self.frames_received.emit(self.id, timestamps, frames)  # one signal per read, not per frame
+                    self.data_received.emit(self.id, frames[-1].tolist())
+                    logging.debug(f'received {len(frames)} frames')
 
         except serial.SerialException as e:
             self.error_signal.emit(f"Serial Error: {str(e)}")
@@ -64,6 +79,7 @@ class SMAPOCWorker(QThread):
         self.id = my_id
         if self.serial and self.serial.is_open:
             self.serial.write(data)  # Send raw bytes
+            self.requests += 1
             logging.debug(f'write to smapoc: {data}')
 
     def self_test(self, myid=ids.SELFTEST_SMAPOC):
@@ -75,16 +91,96 @@ class SMAPOCWorker(QThread):
         self.write_data(myid, b'uz' + bytes([0, 0, 0, 0, 0, 0]))
 
 
+    def status(self):
+        """ backlog: complete frames waiting in the serial buffer, dropped: requests without an answer,
+        garbled: places where bytes of garbled frames were dropped """
+        try:
+            waiting = self.serial.in_waiting if self.serial and self.serial.is_open else 0
+        except (serial.SerialException, OSError):
+            waiting = 0
+        # every request is answered with one frame, the last request may still be on its way
+        answered = self.assembler.frames + self.assembler.partial + waiting // FRAME_SIZE
+        return {'backlog': waiting // FRAME_SIZE,
+                'dropped': max(self.requests - answered - 1, 0),
+                'garbled': self.assembler.partial}
+
     def stop(self):
         self.running = False
         self.wait()  # Ensure proper thread exit
 
 
-class ForceWorker(QThread):
+class SensorWorker(QThread):
+    """ Base for devices that are sampled in their own thread. The thread owns the device and pushes
+    timestamped samples into a thread-safe queue, the GUI side only drains that queue in read(). """
+    data_received = pyqtSignal(int, list)  # id + last value(s), used by the selftest
+    samples_received = pyqtSignal(int, np.ndarray, np.ndarray)  # id + timestamps [ns, session clock] + values
+    error_signal = pyqtSignal(str)  # Signal for error messages
+    queue_size = 100000
+
+    def __init__(self):
+        super().__init__()
+        self.running = True
+        self.my_id = 999
+        self.samples = queue.Queue(maxsize=self.queue_size)
+        self.commands = queue.Queue()  # device calls from the GUI, run by the worker thread between two reads
+        self.dropped = 0
+
+    def push_samples(self, timestamps, values):
+        """ queues one sample or a block of samples (timestamps in ns) """
+        timestamps = np.atleast_1d(timestamps)
+        if len(timestamps) == 0:
+            return
+        try:
+            self.samples.put_nowait((timestamps, np.atleast_1d(values)))
+        except queue.Full:
+            self.dropped += len(timestamps)
+
+    def send_command(self, function):
+        """ queues a call that talks to the device, only the worker thread may use the port """
+        self.commands.put(function)
+
+    def run_commands(self):
+        while True:
+            try:
+                function = self.commands.get_nowait()
+            except queue.Empty:
+                return
+            function()
+
+    def drain(self):
+        items = []
+        while True:
+            try:
+                items.append(self.samples.get_nowait())
+            except queue.Empty:
+                return items
+
+    def emit_samples(self, my_id):
+        """ drains the queue and emits all samples, returns the emitted values """
+        items = self.drain()
+        if not items:
+            return None
+        times = np.concatenate([item[0] for item in items]).astype(np.int64)
+        values = np.concatenate([item[1] for item in items]).astype(np.float64)
+        self.samples_received.emit(my_id, times, values)
+        return values
+
+    def status(self):
+        """ backlog: queued samples not yet read, dropped: samples lost because the queue was full """
+        with self.samples.mutex:
+            backlog = sum(len(item[0]) for item in self.samples.queue)
+        return {'backlog': backlog,
+                'dropped': self.dropped,
+                'garbled': 0}
+
+    def stop(self):
+        self.running = False
+        self.wait()  # Ensure proper thread exit
+
+
+class ForceWorker(SensorWorker):
     name = 'FORCE'
 
-    data_received = pyqtSignal(int, list)  # id + Signal to send received binary data
-    error_signal = pyqtSignal(str)  # Signal for error messages
     send_data_signal = pyqtSignal(int, bytes)  # Signal to receive binary data from GUI
 
     def __init__(self, port, config, profile):
@@ -92,84 +188,113 @@ class ForceWorker(QThread):
         self.port = port
         self.config = config
         self.profile = profile
-        self.running = True
         self.my_force = None
-        self.my_id = 999
+        self.last_value = -1
         self.timer = qtc.QTimer()
 
     def run(self):
-        self.my_force = GSV3USB(self.port)
-        self.my_force.set_200hz()
-        self.my_force.set_calib(self.profile)
-        self.timer.singleShot(1000, self.my_force.start_transmission)
-        logging.debug('Force sensor start transmission')
-
+        tracer.name_thread(self.name)
+        try:
+            self.my_force = GSV3USB(self.port)
+            self.my_force.set_200hz()
+            self.my_force.set_calib(self.profile)
+            self.msleep(1000)
+            self.my_force.start_transmission()
+            logging.debug('Force sensor start transmission')
+            while self.running:
+                self.run_commands()
+                # blocking read, but only this thread waits for the amplifier, every sample of the stream is kept
+                with tracer.span('force.read_stream', 'serial'):  # serial read and decoding
+                    timestamps, forces = self.my_force.read_stream(now=session_clock.now_ns)
+                self.push_samples(timestamps, forces)
+        except serial.SerialException as e:
+            self.error_signal.emit(f"Serial Error: {str(e)}")
+            logging.warning(f'Error force sensor {e}')
+        finally:
+            if self.my_force is not None and self.my_force.sensor.is_open:
+                self.my_force.sensor.close()
 
     def start_trans(self):
-        self.my_force.start_transmission()
+        self.send_command(lambda: self.my_force.start_transmission())
 
     def end_trans(self):
-        self.my_force.end_transmission()
+        self.send_command(lambda: self.my_force.stop_transmission())
 
     def read(self, my_id=ids.FROM_FORCE):
         self.my_id = my_id
         #logging.debug(f'Read value {my_id}')
         if self.my_force is not None:
-            #logging.debug('status OK')
-            value = self.my_force.read_value()
-            #logging.debug(f'read value {value}')
-            self.data_received.emit(self.my_id, [value])
+            # never blocks, only hands over what the acquisition thread collected
+            values = self.emit_samples(self.my_id)
+            if values is not None:
+                self.last_value = values[-1]
+            self.data_received.emit(self.my_id, [self.last_value])
         else:
             self.error_signal.emit('No Force Sensor available')
 
     def calib(self):
-        self.my_force.set_calib(self.profile)
+        self.send_command(lambda: self.my_force.set_calib(self.profile))
 
-
-    def stop(self):
-        self.running = False
-        self.wait()  # Ensure proper thread exit
+    def status(self):
+        status = super().status()
+        if self.my_force is not None:
+            status['garbled'] = self.my_force.dropped  # bytes the stream parser could not use
+        return status
 
     def self_test(self, myid=ids.SELFTEST_FORCE):
         self.timer.singleShot(3000, lambda: self.read(myid))
 
 
 
-class LaserWorker(QThread):
+class LaserWorker(SensorWorker):
     name = 'LASER'
-    data_received = pyqtSignal(int, list)  # Signal to send received binary data
-    error_signal = pyqtSignal(str)  # Signal for error messages
+    poll_interval = 5  # ms between two transfers, the sensor buffers in between
 
     def __init__(self, port, config, sn):
         super().__init__()
         self.port = port
         self.config = config
         self.sn = sn
-        self.running = True
         self.myild = None
+        self.last_data = None
         self.timer = qtc.QTimer()
 
 
     def run(self):
-        self.myild = ILD_1900(self.port, self.config.c_data['laser'], self.sn)
-        # while self.running:
-        #     if self.mode == ids.MODE_CONTI:
-        #         data = self.myild.get_last_values(2)
-        #         self.data_received.emit(ids.LASER_DATA, data)  # Send raw bytes to GUI
-        #         logging.debug(data)
+        tracer.name_thread(self.name)
+        try:
+            self.myild = ILD_1900(self.port, self.config.c_data['laser'], self.sn)
+            self.myild.start_continuous()
+            while self.running:
+                self.run_commands()
+                with tracer.span('laser.read_available', 'serial'):
+                    timestamps, values = self.myild.read_available()
+                if len(values):
+                    self.last_data = values[-2:].tolist()
+                    # the driver stamps the values with its own clock
+                    self.push_samples(session_clock.from_device('laser', timestamps), values)
+                self.msleep(self.poll_interval)
+        except OSError as e:
+            # MEDAQLib could not be loaded or the sensor could not be opened
+            self.error_signal.emit(f"Laser Error: {str(e)}")
+            logging.warning(f'Error laser {e}')
+        finally:
+            if self.myild is not None:
+                self.myild.shut_down()
 
     def read(self, my_id=ids.FROM_LASER):
         self.my_id = my_id
-        data = self.myild.get_last_values(2)
-        if data:
-            self.data_received.emit(self.my_id, data)  # Send raw bytes to GUI
+        self.emit_samples(self.my_id)
+        if self.last_data:
+            self.data_received.emit(self.my_id, self.last_data)  # Send raw bytes to GUI
         else:
             logging.warning('No Laser connected or configuration is wrong')
 
-
-    def stop(self):
-        self.running = False
-        self.wait()  # Ensure proper thread exit
+    def status(self):
+        status = super().status()
+        if self.myild is not None:
+            status['garbled'] = self.myild.errors
+        return status
 
     def self_test(self, myid=ids.SELFTEST_LASER):
         self.timer.singleShot(3000, lambda: self.read(myid))
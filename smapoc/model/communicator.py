@@ -1,13 +1,21 @@
 import PyQt5.QtCore as qtc
 
 import logging
+import numpy as np
 import smapoc.model.com_peripherals as peripherals
+from smapoc.model.scheduler import AcquisitionScheduler
+from smapoc.model.clock import session_clock
+from smapoc.model.health import PipelineHealth
+from smapoc.model.tracing import tracer
 import smapoc.ids as ids
 
 logging.getLogger(__name__)
 
 class Communicator(qtc.QObject):
     smapoc_mode_changed = qtc.pyqtSignal()
+    # request intervals in ms, 'power' is the SMAPOC command rate (the board answers every command with a frame),
+    # the sensors sample in their own threads at their native rate and are only drained with these intervals
+    default_rates = {'power': 15, 'force': 20, 'laser': 10, 'replay': 10}
 
     def __init__(self, data_handler):
         super().__init__()
@@ -15,31 +23,50 @@ class Communicator(qtc.QObject):
         self.state = {}
         self.devices = {}
 
-        self.request_timer = qtc.QTimer()
-        self.request_timer.timeout.connect(self.choose_request)
+        self.rates = dict(self.default_rates)
+        self.rates.update(self.data_handler.config.c_data.get('rates', {}))
+        self.scheduler = AcquisitionScheduler()
+        self.scheduler.add_task('power', self.rates['power'], self.request_power)
         self.zero_timer = qtc.QTimer()
 
         self.power = None
-        self.interval = 15
+        self.interval = self.rates['power']
         self.offsets = {ids.FROM_FORCE: 0, ids.FROM_LASER: self.data_handler.config.c_data['laser_offset']}
+        self.spike_limit = 0.4  # N, force samples jumping further than this from the last kept one are dropped
+        self.spike_run = 5  # samples, a jump that lasts this long is a real step and is kept
+        self.last_force = None  # raw value of the last kept force sample
+        self.rejected = 0  # force samples dropped in a row
+        self.spikes = 0  # force samples dropped by the spike filter
+        self.health = PipelineHealth()  # arrival rate and jitter per device
         self.mode = 'sine'
         self.smapoc_mode = ids.CURRENT
 
-    def choose_request(self):
+    def request_power(self):
+        if 'smapoc' not in self.devices or not self.power:
+            return
         if self.mode == 'sine':
-            if self.power:
-                self.devices['smapoc'].write_data(ids.FROM_SMAPOC, self.power.get_power_sine_msg())
-            for key, value in self.devices.items():
-                #logging.debug(f'request {key}')
-                if key not in ['smapoc', 'webcam']:
-                    value.read()
+            self.devices['smapoc'].write_data(ids.FROM_SMAPOC, self.power.get_power_sine_msg())
         elif self.mode == 'direct':
-            if self.power:
-                self.devices['smapoc'].write_data(ids.FROM_SMAPOC, self.power.get_power_direct_msg())
-            for key, value in self.devices.items():
-                # logging.debug(f'request {key}')
-                if key not in ['smapoc', 'webcam']:
-                    value.read()
+            self.devices['smapoc'].write_data(ids.FROM_SMAPOC, self.power.get_power_direct_msg())
+
+    def request_device(self, key):
+        if key in self.devices:
+            self.devices[key].read()
+
+    def add_request(self, key):
+        self.scheduler.add_task(key, self.rates.get(key, self.rates['power']), lambda: self.request_device(key))
+
+    def get_request_stats(self):
+        # achieved rate and missed deadlines per request task
+        return self.scheduler.stats()
+
+    def get_device_status(self):
+        # backlog, dropped and garbled counters of every device that reports them
+        status = {key: device.status() for key, device in self.devices.items() if hasattr(device, 'status')}
+        if 'force' in status:
+            status['force']['filtered'] = self.spikes  # removed on purpose, not lost
+        return status
+
     def set_smapoc_mode(self,mode):
         self.smapoc_mode = mode
         self.smapoc_mode_changed.emit()
@@ -54,43 +81,56 @@ class Communicator(qtc.QObject):
 
 
     def set_interval(self, interval):
-        self.request_timer.setInterval(interval)
+        # power command interval, the sensor read intervals are set with set_device_interval
+        self.scheduler.set_interval('power', interval)
+        self.rates['power'] = interval
         self.interval = interval
 
+    def set_device_interval(self, key, interval):
+        self.scheduler.set_interval(key, interval)
+        self.rates[key] = interval
+
     def start_requesting(self, mode='sine'):
-        if mode == 'sine':
+        if mode in ['sine', 'direct']:
             self.mode = mode
-            self.request_timer.start(self.interval)
-            self.data_handler.start_collecting()
-        if mode == 'direct':
-            self.mode = mode
-            self.request_timer.start(self.interval)
+            self.scheduler.start()
             self.data_handler.start_collecting()
 
 
 
     def stop_requesting(self):
-        self.request_timer.stop()
+        self.scheduler.stop()
         self.data_handler.stop_collecting()
 
     def add_smapoc(self, port, baudrate=250000):
         self.devices['smapoc'] = peripherals.SMAPOCWorker(port, baudrate)
         self.devices['smapoc'].start()
-        self.devices['smapoc'].data_received.connect(self.callback)
+        self.devices['smapoc'].frames_received.connect(self.callback_frames)
 
     def add_force(self, port, force_profile):
         self.devices['force'] = peripherals.ForceWorker(port,
                                                         self.data_handler.config,
                                                         force_profile)
         self.devices['force'].start()
-        self.devices['force'].data_received.connect(self.callback)
+        self.devices['force'].samples_received.connect(self.callback_samples)
+        self.add_request('force')
 
     def add_laser(self, port, sn):
         self.devices['laser'] = peripherals.LaserWorker(port,
                                                         self.data_handler.config,
                                                         sn)
         self.devices['laser'].start()
-        self.devices['laser'].data_received.connect(self.callback)
+        self.devices['laser'].samples_received.connect(self.callback_samples)
+        self.add_request('laser')
+
+    def add_replay(self, source):
+        """ plays a ReplaySource through the same callbacks as the hardware """
+        self.devices['replay'] = source
+        source.samples_received.connect(self.callback_samples)
+        source.frames_received.connect(self.callback_frames)
+        source.channel_received.connect(self.data_handler.collect_samples)
+        self.data_handler.replay = source
+        self.add_request('replay')
 
     def add_webcam(self, name):
         self.devices['webcam'] = peripherals.Video(name)
@@ -98,8 +138,11 @@ class Communicator(qtc.QObject):
 
 
     def remove_device(self, key):
+        self.scheduler.remove_task(key)
         self.devices[key].stop()
         self.devices.pop(key)
+        if key == 'replay':
+            self.data_handler.replay = None
 
     def add_power_obj(self, power_obj):
         self.power = power_obj
@@ -117,11 +160,11 @@ class Communicator(qtc.QObject):
 
 
     def zero_force(self):
-        self.offsets[ids.FROM_FORCE] = self.data_handler.data['force'].iloc[-1]
+        self.offsets[ids.FROM_FORCE] = self.data_handler.last_value('force')
 
 
     def zero_laser(self):
-        self.offsets[ids.FROM_LASER] = self.data_handler.data['laser'].iloc[-1]
+        self.offsets[ids.FROM_LASER] = self.data_handler.last_value('laser')
         self.data_handler.config.write_value('laser_offset', self.offsets[ids.FROM_LASER])
 
 
@@ -129,9 +172,9 @@ class Communicator(qtc.QObject):
 
     def do_zeroing(self):
         # legacy code not used anymore
-        if len(self.data_handler.data) >= 1:
-            last_laser_val = self.data_handler.data['laser'].iloc[-1]
-            last_force_val = self.data_handler.data['force'].iloc[-1]
+        if len(self.data_handler) >= 1:
+            last_laser_val = self.data_handler.last_value('laser')
+            last_force_val = self.data_handler.last_value('force')
             self.offsets[ids.FROM_LASER] = last_laser_val
             self.offsets[ids.FROM_FORCE] = last_force_val
             self.data_handler.config.write_value('laser_offset', self.offsets[ids.FROM_LASER])
@@ -142,74 +185,81 @@ class Communicator(qtc.QObject):
 
 
 
-    def callback(self, myid, data_list):
-        logging.debug('Enter Callback Communicator')
+    @tracer.traced(category='callback')
+    def callback_samples(self, myid, times, values):
+        # all samples the sensor thread collected since the last request, times in ns of the session clock
+        times = np.asarray(times, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float64)
+        if len(values) == 0:
+            return
         if myid in [ids.FROM_LASER, ids.SELFTEST_LASER]:
             logging.debug('callback laser')
-            # row_df = self.data.iloc[-1::, :].copy()  # copy last row
-            # row_df['time'] = [dt.datetime.now()]
-            self.data_handler.collect('laser', data_list[-1] - self.offsets[ids.FROM_LASER])
-            #logging.info(f'new_data{data_list[-1]},offset:{self.offsets[ids.FROM_LASER]}')
-            # row_df['id'] = [my_id]
-            # self.data = pd.concat([self.data, row_df])
+            self.health.add('laser', times)
+            self.data_handler.collect_samples('laser', times, values - self.offsets[ids.FROM_LASER])
+
+        if myid == ids.REPLAY_LASER:
+            self.health.add('laser', self.arrived(times))
+            self.data_handler.collect_samples('laser', times, values)  # the recorded values are zeroed already
+
+        if myid == ids.REPLAY_FORCE:
+            self.health.add('force', self.arrived(times))
+            self.data_handler.collect_samples('force', times, values)  # and passed the spike filter
 
         if myid in [ids.SELFTEST_FORCE, ids.FROM_FORCE]:
             logging.debug('callback force')
-            # row_df = self.data.iloc[-1::, :].copy()  # copy last row
-            # row_df['time'] = [dt.datetime.now()]
-            if 'force' in self.data_handler.data.keys():
-                old_val = self.data_handler.data['force'].iloc[-1]
-                new_val = data_list[0] - self.offsets[ids.FROM_FORCE]
-                if abs(old_val-new_val) < 0.4:
-                    self.data_handler.collect('force', new_val)
-                else:
-                    self.data_handler.collect('force', old_val)
+            self.health.add('force', times)
+            keep = self.filter_spikes(values)
+            self.spikes += len(keep) - np.count_nonzero(keep)
+            self.data_handler.collect_samples('force', times[keep], values[keep] - self.offsets[ids.FROM_FORCE])
+
+    @staticmethod
+    def arrived(times):
+        # replayed samples carry their recorded times, the health shows when they arrived (the replay throughput)
+        return np.full(len(times), session_clock.now_ns(), dtype=np.int64)
+
+    def filter_spikes(self, values):
+        """ mask of the force samples to keep, every sample is compared with the last kept one """
+        keep = np.ones(len(values), dtype=bool)
+        for i, value in enumerate(values):
+            if self.last_force is None or abs(value - self.last_force) < self.spike_limit \
+                    or self.rejected + 1 >= self.spike_run:
+                self.last_force = value
+                self.rejected = 0
             else:
-                self.data_handler.collect('force', data_list[0] - self.offsets[ids.FROM_FORCE])
-
-            #logging.info(f'new_data{data_list[-1]},offset:{self.offsets[ids.FROM_FORCE]}')
-            # row_df['id'] = [my_id]
-            # self.data = pd.concat([self.data, row_df])
-
+                keep[i] = False
+                self.rejected += 1
+        return keep
+
+    @tracer.traced(category='callback')
+    def callback(self, myid, data_list, timestamp=None):
+        # timestamp in ns of the session clock, taken when the value was acquired
+        if timestamp is None:
+            timestamp = session_clock.now_ns()
+        logging.debug('Enter Callback Communicator')
+        if myid in [ids.FROM_LASER, ids.SELFTEST_LASER, ids.SELFTEST_FORCE, ids.FROM_FORCE]:
+            self.callback_samples(myid, [timestamp], data_list[-1:])
 
         if myid in [ids.SELFTEST_SMAPOC, ids.FROM_SMAPOC]:
-            logging.debug('start transfer smapoc data')
-            # self.row_df = self.data.iloc[-1::, :].copy()  # copy last row
-            # row_df['time'] = [dt.datetime.now()]
-            res_dict = {}
-            # self.temp_data_lists['id'] = [my_id]
-
-            self.data_handler.collect('r1', data_list[2])
-            self.data_handler.collect('r2', data_list[3])
-            self.data_handler.collect('r3', data_list[4])
-            self.data_handler.collect('r4', data_list[5])
-            self.data_handler.collect('r5', data_list[6])
-            self.data_handler.collect('r6', data_list[7])
-
-            try:
-                power = self.power.power_vec
-                if self.smapoc_mode == ids.POWER:
-                    self.data_handler.collect('pow1', power[0])
-                    self.data_handler.collect('pow2', power[1])
-                    self.data_handler.collect('pow3', power[2])
-                    self.data_handler.collect('pow4', power[3])
-                    self.data_handler.collect('pow5', power[4])
-                    self.data_handler.collect('pow6', power[5])
-                else:
-                    self.data_handler.collect('curr1', power[0])
-                    self.data_handler.collect('curr2', power[1])
-                    self.data_handler.collect('curr3', power[2])
-                    self.data_handler.collect('curr4', power[3])
-                    self.data_handler.collect('curr5', power[4])
-                    self.data_handler.collect('curr6', power[5])
-            except AttributeError as e:
-                logging.warning(e)
-            logging.debug('finish transfer smapoc data')
-
-
-
-
-
-
-
-
+            self.callback_frames(myid, np.array([timestamp], dtype=np.int64), np.array([data_list], dtype=np.int16))
+
+    @tracer.traced(category='callback')
+    def callback_frames(self, myid, timestamps, frames):
+        # frames is an (N, 8) array with all frames of one serial read, timestamps in ns of the session clock
+        logging.debug('start transfer smapoc data')
+        if myid == ids.FROM_REPLAY:
+            self.health.add('replay', self.arrived(timestamps))
+        else:
+            self.health.add('smapoc', timestamps)
+        for i, channel in enumerate(ids.RES_CHANNELS):
+            self.data_handler.collect_samples(channel, timestamps, frames[:, 2 + i])
+        if myid == ids.FROM_REPLAY or self.power is None:
+            return  # the recorded power comes with the other channels of the replay, without power object no power
+        try:
+            power = self.power.power_vec
+            if self.smapoc_mode == ids.POWER:
+                self.data_handler.collect_many(ids.POW_CHANNELS, power, timestamps[-1])
+            else:
+                self.data_handler.collect_many(ids.CURR_CHANNELS, power, timestamps[-1])
+        except AttributeError as e:
+            logging.warning(e)
+        logging.debug('finish transfer smapoc data')
@@ -1,4 +1,5 @@
 import os
+import threading
 
 import PyQt5.QtCore as qtc
 
@@ -7,7 +8,13 @@ import pandas as pd
 import datetime as dt
 from pathlib import Path
 import json
-from smapoc.model import session
+from smapoc.model import session, session_file
+from smapoc.model.ring_buffer import RingBuffer
+from smapoc.model.clock import session_clock
+from smapoc.model.alignment import StreamAligner, HOLD
+from smapoc.model.stream_recorder import StreamRecorder
+from smapoc.model.tracing import tracer
+from smapoc.model.display_clock import DisplayClock
 from smapoc import ids
 import logging
 from datetime import datetime
@@ -21,59 +28,176 @@ class DataHandler(qtc.QObject):
     data_available = qtc.pyqtSignal()
     plot_status = qtc.pyqtSignal(bool)
     plot_interval = qtc.pyqtSignal(int)
+    # all channels that can be collected, each one gets its own preallocated column
+    channels = ['time',
+                'r1', 'r2', 'r3', 'r4', 'r5', 'r6',
+                'pow1', 'pow2', 'pow3', 'pow4', 'pow5', 'pow6',
+                'curr1', 'curr2', 'curr3', 'curr4', 'curr5', 'curr6',
+                'force', 'laser']
+    # power and current are set values, they are held instead of interpolated
+    hold_channels = ids.POW_CHANNELS + ids.CURR_CHANNELS
+
     def __init__(self):
         super().__init__()
-        self.data = pd.DataFrame()
-        self.temp_row = {}
+        self.clock = session_clock
         self.timer = qtc.QTimer()
         self.timer.timeout.connect(self.transfer_collected)
         self.interval = 20
-        self.timestamp = dt.datetime.utcnow()
         self.config = Config()
         self.session = session.Session()
-        self.data_array_size = 20000
+        self.aligner = self.create_aligner()
+        # rows of the aligned grid that cover the wanted in-memory history
+        history = self.config.c_data.get('alignment', {}).get('history', 400)  # s
+        self.data_array_size = int(round(history / self.aligner.period))
+        self.buffer = RingBuffer(self.channels, capacity=self.data_array_size)
+        self.stream_recorder = None
+        self.replay = None  # ReplaySource while a session is replayed
+        # one timer and one snapshot per frame for all plots
+        self.display_clock = DisplayClock(self)
+        self.plot_interval.connect(self.display_clock.set_interval)
         # self.offsets = {}
 
+    @property
+    def data(self):
+        # builds a pandas copy of the buffer, use column() for anything called periodically
+        frame = pd.DataFrame({name: self.buffer.view(name) for name in self.buffer.columns})
+        if 'time' in frame.columns:
+            frame['datetime'] = self.clock.t0_wall + pd.to_timedelta(frame['time'], unit='s')
+        return frame
+
+    def create_aligner(self):
+        # all streams are resampled onto one grid, period and latency in ms
+        settings = self.config.c_data.get('alignment', {})
+        return StreamAligner(period=settings.get('period', 5) / 1000,
+                             method=settings.get('method', 'linear'),
+                             methods={name: HOLD for name in self.hold_channels},
+                             latency=settings.get('latency', 50) / 1000)
+
     def get_col_names(self):
-        return list(self.data.columns)
+        names = self.buffer.columns
+        return names + [name for name in self.aligner.names if name not in names]
+
+    def has_column(self, name):
+        return name in self.buffer
+
+    def column(self, name, n=None):
+        """ zero-copy view of the newest n values of a channel """
+        return self.buffer.view(name, n)
+
+    def snapshot(self):
+        """ state of the buffer for one display tick, see BufferSnapshot """
+        return self.buffer.snapshot()
+
+    def last_value(self, name, default=None):
+        return self.buffer.last(name, default)
+
+    def __len__(self):
+        return len(self.buffer)
 
     def data_clear(self):
-        self.data = pd.DataFrame()
+        self.buffer.clear()
 
     def set_interval(self, interval):
         self.interval = interval
         self.timer.setInterval(interval)
 
-    def collect(self, key, value):
-        self.temp_row[key] = value
+    def collect(self, key, value, timestamp=None):
+        # timestamp: ns of the session clock when the value was acquired, now if not known
+        if timestamp is None:
+            timestamp = self.clock.now_ns()
+        self.collect_samples(key, timestamp, value)
+
+    def collect_many(self, keys, values, timestamp=None):
+        if timestamp is None:
+            timestamp = self.clock.now_ns()
+        for key, value in zip(keys, values):
+            self.collect_samples(key, timestamp, value)
+
+    def collect_samples(self, key, timestamps, values):
+        """ a block of samples of one channel, timestamps in ns of the session clock """
+        self.aligner.add(key, self.clock.seconds(timestamps), values)
+        if self.stream_recorder is not None:
+            self.stream_recorder.add(key, timestamps, values)
+
+    def start_recording(self, path, header=None):
+        """ streams every collected sample to path until stop_recording() """
+        self.stop_recording()
+        header = dict(header or {})
+        header.update({'t0_ns': self.clock.t0,
+                       't0_wall': self.clock.t0_wall.isoformat(),
+                       'global_config': self.config.c_data})
+        self.stream_recorder = StreamRecorder(path, header)
+        self.stream_recorder.start()
+
+    def stop_recording(self):
+        """ :return: path of the finished recording, None if nothing was recorded """
+        if self.stream_recorder is None:
+            return None
+        self.stream_recorder.stop()
+        path = self.stream_recorder.path
+        self.stream_recorder = None
+        return path
+
+    def compact_recording(self, path):
+        """ turns a finished recording into a session file in a background thread, so the GUI does not wait for
+        the copy. The recording is removed once the session file is complete and kept if anything fails. The
+        thread is not a daemon, closing the program waits for it. """
+        thread = threading.Thread(target=self.run_compaction, args=(path,), name='SessionCompactor')
+        thread.start()
+        return thread
+
+    def run_compaction(self, path):
+        session_path = session_file.session_path_for(path)
+        try:
+            session_file.compact_recording(path, session_path)
+            done, remove = True, path
+        except (OSError, ValueError) as e:
+            logging.warning(f'session file not written, {path} is kept: {e}')
+            done, remove = False, session_path if os.path.exists(path) else None  # the incomplete session file
+        try:
+            if remove is not None and os.path.exists(remove):
+                os.remove(remove)
+        except OSError as e:
+            logging.warning(f'{remove} not removed: {e}')
+            return
+        if done:
+            logging.info(f'recording {path} replaced by {session_path}')
+
+    def load_session(self, session, start=None, stop=None):
+        """ fills the buffer with a time window of a SessionFile, so the plots show a recorded session """
+        period = self.aligner.period
+        if start is None and stop is not None:
+            start = max(stop - period * (self.data_array_size - 1), session.span()[0])
+        rows = session.aligned(start, stop, period=period, method=self.aligner.method, methods=self.aligner.methods,
+                               channels=[name for name in session.channels if name in self.channels])
+        self.data_clear()
+        self.buffer.extend(rows)
+        self.data_available.emit()
 
+    def is_recording(self):
+        return self.stream_recorder is not None
 
     def start_collecting(self):
+        self.aligner.restart()
         self.timer.start(self.interval)
 
     def stop_collecting(self):
         self.timer.stop()
+        rows = self.aligner.flush()
+        if len(rows['time']):
+            self.buffer.extend(rows)
+            self.data_available.emit()
 
 
+    @tracer.traced(category='transfer')
     def transfer_collected(self):
-        # Get current UTC time
-        utc = dt.datetime.utcnow()
-
-        # Calculate the difference in milliseconds
-        time = (utc - self.timestamp).total_seconds()
-        # get last row of existing df
-        if self.data.empty:
-            row_df = pd.DataFrame(self.temp_row, index=[0])
-        else:
-            row_df = self.data.iloc[-1::, :].copy()  # copy last row
-
-        for key, value in self.temp_row.items():
-            row_df[key] = value
-        row_df['time'] = time
-        row_df['datetime'] = dt.datetime.now()
-        self.data = pd.concat([self.data, row_df])
-        if len(self.data) > self.data_array_size:
-            self.data = self.data.iloc[-3000:]  # Keep only the last 3000 rows
+        # all grid points that every stream had the time to deliver (see StreamAligner.latency). Replayed samples
+        # carry their recorded times, the replay position takes the place of the clock
+        now = self.clock.now() if self.replay is None else self.replay.now()
+        rows = self.aligner.pop_aligned(now)
+        if len(rows['time']) == 0:
+            return
+        self.buffer.extend(rows)
         self.data_available.emit()
 
 
@@ -0,0 +1,125 @@
+import logging
+import numpy as np
+
+logging.getLogger(__name__)
+
+
+def block_extrema(y):
+    """ indices of the minimum and the maximum of every row of y (blocks, block size), NaN is ignored """
+    finite = np.isfinite(y)
+    lows = np.argmin(np.where(finite, y, np.inf), axis=1)
+    highs = np.argmax(np.where(finite, y, -np.inf), axis=1)
+    return lows, highs
+
+
+def minmax_indices(y, bins):
+    """ indices of the min and max of y in bins equal parts, in order of occurrence, at most 2 x bins """
+    n = len(y)
+    if n <= 2 * bins:
+        return np.arange(n)
+    size = -(-n // bins)
+    m = n // size * size
+    lows, highs = block_extrema(y[:m].reshape(-1, size))
+    starts = np.arange(0, m, size)
+    indices = [starts + lows, starts + highs]
+    if m < n:
+        tail_low, tail_high = block_extrema(y[m:].reshape(1, -1))
+        indices += [m + tail_low, m + tail_high]
+    return np.unique(np.concatenate(indices))
+
+
+class MinMaxDecimator:
+    """ Min/max envelope of one channel of a RingBuffer for plotting, kept up to date incrementally.
+
+    The buffer is cut into blocks of block_size rows (counted from the last clear, see RingBuffer.count).
+    The index of the minimum and of the maximum of every complete block is computed once, when the block is
+    complete, and forgotten when the block leaves the buffer. points() merges these blocks into at most
+    bins bins, so a curve never gets more than about 2 x bins points, independent of the history length.
+    Only the incomplete newest block and the partial blocks at the ends of a window are scanned per call.
+    buffer is the RingBuffer or a BufferSnapshot of it."""
+    block_size = 32
+
+    def __init__(self, x_name, y_name):
+        self.x_name = x_name
+        self.y_name = y_name
+        self.reset()
+
+    def reset(self, clears=None):
+        self.first_block = 0  # number of the first cached block since the last clear
+        self.lows = np.empty(0, dtype=np.int64)  # absolute row of the block minimum
+        self.highs = np.empty(0, dtype=np.int64)
+        self.count = 0
+        self.clears = clears
+
+    def update(self, buffer):
+        """ adds the blocks completed since the last call, drops the blocks that were overwritten """
+        if buffer.clears != self.clears or buffer.count < self.count:
+            self.reset(buffer.clears)
+        self.count = buffer.count
+        oldest = buffer.count - len(buffer)  # absolute row of the oldest row in the buffer
+        first_valid = -(-oldest // self.block_size)
+        if first_valid > self.first_block:
+            drop = min(first_valid - self.first_block, len(self.lows))
+            self.lows = self.lows[drop:]
+            self.highs = self.highs[drop:]
+            self.first_block = first_valid
+        next_block = self.first_block + len(self.lows)
+        complete = buffer.count // self.block_size
+        if complete <= next_block or self.y_name not in buffer:
+            return
+        start = next_block * self.block_size
+        y = buffer.view(self.y_name)[start - oldest:complete * self.block_size - oldest]
+        lows, highs = block_extrema(y.reshape(-1, self.block_size))
+        starts = start + np.arange(0, len(y), self.block_size)
+        self.lows = np.concatenate([self.lows, starts + lows])
+        self.highs = np.concatenate([self.highs, starts + highs])
+
+    def rows(self, buffer, start, stop, bins):
+        """ absolute rows of the envelope of the rows start..stop (stop excluded) in at most bins bins """
+        oldest = buffer.count - len(buffer)
+        y = buffer.view(self.y_name)
+        if stop - start <= 2 * bins:
+            return np.arange(start, stop)
+        first = max(-(-start // self.block_size), self.first_block)
+        last = min(stop // self.block_size, self.first_block + len(self.lows))
+        if last <= first:
+            # no complete block in the window, the rows are scanned directly
+            return start + minmax_indices(y[start - oldest:stop - oldest], bins)
+        # groups of complete blocks form the bins, the extremum of a group is the extremum of its block extrema
+        group = -(-(last - first) // bins)
+        lows = self.lows[first - self.first_block:last - self.first_block]
+        highs = self.highs[first - self.first_block:last - self.first_block]
+        m = len(lows) // group * group
+        parts = [lows[m:], highs[m:]]
+        if m:
+            low_values = y[lows[:m] - oldest].reshape(-1, group)
+            high_values = y[highs[:m] - oldest].reshape(-1, group)
+            low_pick, _ = block_extrema(low_values)
+            _, high_pick = block_extrema(high_values)
+            rows = np.arange(0, m, group)
+            parts += [lows[rows + low_pick], highs[rows + high_pick]]
+        # partial blocks at both ends of the window
+        head = np.arange(start, min(first * self.block_size, stop))
+        tail = np.arange(max(last * self.block_size, start), stop)
+        for edge in (head, tail):
+            if len(edge):
+                low, high = block_extrema(y[edge - oldest].reshape(1, -1))
+                parts += [edge[low], edge[high]]
+        return np.unique(np.concatenate(parts))
+
+    def points(self, buffer, x_range=None, bins=1000):
+        """ (x, y, decimated) for plotting in new arrays, x_range (min, max) limits the rows to a window if x is
+        ascending """
+        self.update(buffer)
+        if self.y_name not in buffer or self.x_name not in buffer:
+            return np.empty(0), np.empty(0), False
+        x = buffer.view(self.x_name)
+        y = buffer.view(self.y_name)
+        oldest = buffer.count - len(buffer)
+        start, stop = 0, len(x)
+        if x_range is not None:
+            # one row more on both sides, so the curve leaves the view instead of ending in it
+            start, stop = np.searchsorted(x, x_range)
+            start, stop = max(start - 1, 0), min(stop + 1, len(x))
+        rows = self.rows(buffer, oldest + start, oldest + stop, bins) - oldest
+        return x[rows], y[rows], len(rows) < stop - start
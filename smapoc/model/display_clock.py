@@ -0,0 +1,129 @@
+import PyQt5.QtCore as qtc
+import logging
+import time
+
+from smapoc.model.tracing import tracer
+
+logging.getLogger(__name__)
+
+
+class DisplayClock(qtc.QObject):
+    """ One timer for all plots instead of one per window.
+
+    Every tick takes one BufferSnapshot of the DataHandler and hands it to render(snapshot) of every
+    registered view (LivePlot, StiffnessPlot, ScriptExecutor). The columns are taken from the buffer once
+    per tick, however many views draw them. The timer only runs while views are registered.
+
+    A view whose is_visible() returns False (hidden, tabbed away, minimized or off-screen) is skipped and
+    marked stale. It renders again on the first tick it is visible, or right away when it calls catch_up()
+    on becoming visible, one update with the newest data instead of the missed ones.
+
+    A view registered with its own interval (the ScriptExecutor keeps its 50 ms) renders at that interval,
+    the others follow set_interval(). The timer ticks at the shortest interval of the registered views and a
+    view is skipped on the ticks that come before its own interval has elapsed, so its interval is rounded to
+    a multiple of the tick (80 ms become 100 ms while a 50 ms view is registered)."""
+    default_interval = 80  # ms
+
+    def __init__(self, data_handler):
+        super().__init__()
+        self.data_handler = data_handler
+        self.views = []
+        self.stale = []  # views that skipped ticks while they were not visible
+        self.intervals = {}  # view -> own interval in ms
+        self.rendered = {}  # view -> time.monotonic() of the last render in ms
+        self.interval = self.default_interval
+        self.timer = qtc.QTimer()
+        self.timer.timeout.connect(self.tick)
+
+    def register(self, view, interval=None):
+        """ interval: ms between two renders of this view, None follows the interval of the clock """
+        if view not in self.views:
+            self.views.append(view)
+        if interval is not None:
+            self.intervals[view] = interval
+        self.timer.setInterval(self.tick_interval())
+        if not self.timer.isActive():
+            self.timer.start()
+
+    def unregister(self, view):
+        if view in self.views:
+            self.views.remove(view)
+        self.intervals.pop(view, None)
+        self.rendered.pop(view, None)
+        if not self.views:
+            self.timer.stop()
+        else:
+            self.timer.setInterval(self.tick_interval())
+
+    def set_interval(self, interval):
+        self.interval = interval
+        self.timer.setInterval(self.tick_interval())
+
+    def view_interval(self, view):
+        return self.intervals.get(view, self.interval)
+
+    def tick_interval(self):
+        return min([self.view_interval(view) for view in self.views] or [self.interval])
+
+    def due(self, view, now):
+        # half a tick of tolerance, the timer does not fire exactly on time
+        last = self.rendered.get(view)
+        return last is None or now - last >= self.view_interval(view) - self.timer.interval() / 2
+
+    @staticmethod
+    def visible(view):
+        return view.is_visible() if hasattr(view, 'is_visible') else True
+
+    @tracer.traced(category='plot')
+    def tick(self):
+        snapshot = None
+        now = time.monotonic() * 1000
+        for view in list(self.views):
+            try:
+                if not self.due(view, now):
+                    continue
+                if not self.visible(view):
+                    if view not in self.stale:
+                        self.stale.append(view)
+                    continue
+                if snapshot is None:
+                    snapshot = self.data_handler.snapshot()
+                if view in self.stale:
+                    self.stale.remove(view)
+                self.rendered[view] = now
+                view.render(snapshot)
+            except RuntimeError as e:
+                # the Qt side of a closed window is gone
+                logging.warning(f'display view removed: {e}')
+                self.unregister(view)
+                self.forget(view)
+
+    def refresh(self, views):
+        """ renders views once outside the ticks, e.g. after a session was loaded while the clock is stopped """
+        snapshot = self.data_handler.snapshot()
+        for view in views:
+            try:
+                if not self.visible(view):
+                    if view not in self.stale:
+                        self.stale.append(view)
+                    continue
+                view.render(snapshot)
+            except RuntimeError as e:
+                logging.warning(f'display view removed: {e}')
+                self.forget(view)
+
+    def catch_up(self, view):
+        """ renders a stale view once as soon as it is visible again, also while the clock is stopped """
+        if view in self.stale:
+            # the geometry is only final after the show or move event was handled
+            qtc.QTimer.singleShot(0, lambda: self.render_stale(view))
+
+    def render_stale(self, view):
+        if view in self.stale and self.visible(view):
+            self.stale.remove(view)
+            view.render(self.data_handler.snapshot())
+
+    def forget(self, view):
+        """ for views that are closed for good """
+        if view in self.stale:
+            self.stale.remove(view)
@@ -0,0 +1,94 @@
+import collections
+import logging
+import numpy as np
+
+logging.getLogger(__name__)
+
+
+class ArrivalStats:
+    """ Rate and timing of one sample stream over the last window seconds.
+
+    Samples with the same timestamp (e.g. all SMAPOC frames of one serial read) count for the rate, but only
+    the intervals between distinct timestamps are used for the jitter. The jitter is the deviation of an
+    interval from the median interval."""
+    window = 5.0  # s
+    size = 4096  # intervals kept for the percentiles
+
+    def __init__(self):
+        self.intervals = np.zeros(self.size)  # ms, ring
+        self.count = 0  # intervals written to the ring
+        self.blocks = collections.deque()  # (last timestamp [ns], number of samples) per add()
+        self.first_time = None
+        self.last_time = None
+        self.samples = 0
+
+    def add(self, times):
+        """ times: ns of the session clock, ascending """
+        times = np.asarray(times, dtype=np.int64)
+        if len(times) == 0:
+            return
+        self.samples += len(times)
+        if self.first_time is None:
+            self.first_time = int(times[0])
+        self.blocks.append((int(times[-1]), len(times)))
+        if self.last_time is not None:
+            times = np.concatenate([[self.last_time], times])
+        self.last_time = int(times[-1])
+        intervals = np.diff(times)
+        intervals = intervals[intervals > 0][-self.size:] / 1e6
+        index = (self.count + np.arange(len(intervals))) % self.size
+        self.intervals[index] = intervals
+        self.count += len(intervals)
+
+    def rate(self, now):
+        """ samples per second within the window before now (ns) """
+        start = now - int(self.window * 1e9)
+        while self.blocks and self.blocks[0][0] < start:
+            self.blocks.popleft()
+        if self.first_time is None:
+            return 0.0
+        span = min(self.window, (now - self.first_time) / 1e9)  # shorter while the stream starts
+        return sum(n for _, n in self.blocks) / span if span > 0 else 0.0
+
+    def recent(self):
+        return self.intervals[:min(self.count, self.size)]
+
+    def interval(self, percentiles=(50, 99)):
+        """ percentiles of the intervals in ms, nan without intervals """
+        recent = self.recent()
+        if len(recent) == 0:
+            return [np.nan] * len(percentiles)
+        return np.percentile(recent, percentiles).tolist()
+
+    def jitter(self, percentiles=(50, 99)):
+        """ percentiles of the deviation from the median interval in ms, nan without intervals """
+        recent = self.recent()
+        if len(recent) == 0:
+            return [np.nan] * len(percentiles)
+        return np.percentile(np.abs(recent - np.median(recent)), percentiles).tolist()
+
+
+class PipelineHealth:
+    """ Arrival statistics of every device, fed by the Communicator callbacks, and of the GUI frames """
+
+    def __init__(self):
+        self.streams = {}
+
+    def add(self, key, times):
+        if key not in self.streams:
+            self.streams[key] = ArrivalStats()
+        self.streams[key].add(times)
+
+    def keys(self):
+        return list(self.streams.keys())
+
+    def stats(self, key, now):
+        """ dict with rate [1/s] and jitter p50/p99 [ms] of one stream """
+        stream = self.streams.get(key)
+        if stream is None:
+            return {'rate': 0.0, 'jitter_p50': np.nan, 'jitter_p99': np.nan}
+        p50, p99 = stream.jitter()
+        return {'rate': stream.rate(now), 'jitter_p50': p50, 'jitter_p99': p99}
+
+    def reset(self):
+        self.streams = {}
@@ -0,0 +1,118 @@
+import collections
+import logging
+import marshal
+import os
+import sys
+import threading
+import time
+
+logging.getLogger(__name__)
+
+
+class SamplingProfiler:
+    """ Statistical profiler over all threads of the running program, including the QThreads.
+
+    A background thread takes the stack of every other thread from sys._current_frames() every interval
+    seconds and counts the identical stacks. Nothing is instrumented, so the program runs at nearly full
+    speed while profiling. save() writes the counts as collapsed stacks (one 'thread;outer;...;inner count'
+    line per stack, for flamegraph.pl or speedscope) and as a pstats file (python -m pstats, snakeviz)."""
+    interval = 0.005  # s between two samples
+
+    def __init__(self, interval=None):
+        self.interval = interval or self.interval
+        self.stacks = collections.Counter()  # (thread, frame, ...) -> samples, outermost frame first
+        self.samples = 0
+        self.started = None
+        self.duration = 0.0
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.stacks.clear()
+        self.samples = 0
+        self.running = True
+        self.started = time.perf_counter()
+        self.thread = threading.Thread(target=self.run, name='SamplingProfiler', daemon=True)
+        self.thread.start()
+        logging.info('profiler started')
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.duration = time.perf_counter() - self.started
+        logging.info(f'profiler stopped, {self.samples} samples in {self.duration:.1f} s')
+
+    def is_running(self):
+        return self.running
+
+    def run(self):
+        own = threading.get_ident()
+        next_sample = time.perf_counter()
+        while self.running:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident != own:
+                    self.stacks[self.stack(frame, names.get(ident))] += 1
+            self.samples += 1
+            next_sample += self.interval
+            time.sleep(max(0.0, next_sample - time.perf_counter()))
+
+    @staticmethod
+    def label(code):
+        name = getattr(code, 'co_qualname', code.co_name)
+        return (code.co_filename, code.co_firstlineno, name)
+
+    def stack(self, frame, thread_name):
+        frames = []
+        while frame is not None:
+            frames.append(self.label(frame.f_code))
+            frame = frame.f_back
+        frames.reverse()
+        if not thread_name or thread_name.startswith('Dummy'):
+            # QThreads are not known to the threading module, their run method names them
+            thread_name = frames[0][2] if frames else 'thread'
+        return (thread_name,) + tuple(frames)
+
+    def collapsed(self):
+        """ lines 'thread;outer;...;inner count' """
+        lines = []
+        for stack, count in self.stacks.most_common():
+            names = [stack[0]] + [f'{name} ({os.path.basename(file)}:{line})' for file, line, name in stack[1:]]
+            lines.append(';'.join(names) + f' {count}')
+        return lines
+
+    def stats(self):
+        """ the samples in the format of pstats: (file, line, name) -> (calls, calls, own time, total time, callers)
+
+        The calls are the numbers of samples, the times are samples x interval."""
+        own = collections.Counter()
+        total = collections.Counter()
+        callers = collections.defaultdict(collections.Counter)
+        for stack, count in self.stacks.items():
+            frames = stack[1:]
+            if not frames:
+                continue
+            own[frames[-1]] += count
+            # recursive functions are counted once per stack
+            for function in set(frames):
+                total[function] += count
+            for caller, callee in set(zip(frames[:-1], frames[1:])):
+                callers[callee][caller] += count
+        stats = {}
+        for function, count in total.items():
+            function_callers = {caller: (n, n, 0.0, n * self.interval) for caller, n in callers[function].items()}
+            stats[function] = (count, count, own[function] * self.interval, count * self.interval, function_callers)
+        return stats
+
+    def save(self, path):
+        """ writes path.folded (collapsed stacks) and path.pstats, returns both paths """
+        folded = f'{path}.folded'
+        with open(folded, 'w') as file:
+            file.write('\n'.join(self.collapsed()) + '\n')
+        pstats_path = f'{path}.pstats'
+        with open(pstats_path, 'wb') as file:
+            marshal.dump(self.stats(), file)
+        logging.info(f'profile written to {folded} and {pstats_path}')
+        return folded, pstats_path
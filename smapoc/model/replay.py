@@ -0,0 +1,143 @@
+import logging
+from pathlib import Path
+
+import PyQt5.QtCore as qtc
+import numpy as np
+import pandas as pd
+
+from smapoc import ids
+from smapoc.model.clock import session_clock
+from smapoc.model.session_file import SessionFile
+
+logging.getLogger(__name__)
+
+
+def streams_from_session(path):
+    """ dict name -> (times in s, values) of all channels of a session file """
+    session = SessionFile(path)
+    return {name: session.window(name) for name in session.channels}
+
+
+def streams_from_csv(path):
+    """ dict name -> (times in s, values) of a legacy snapshot csv (my_snapshot.csv or a saved test) """
+    frame = pd.read_csv(path, sep=';', decimal=',')
+    if len(frame.columns) == 1:
+        frame = pd.read_csv(path)  # save_csv writes the pandas default format
+    if 'time' not in frame.columns:
+        raise ValueError(f'{path} has no time column')
+    times = frame['time'].to_numpy(dtype=np.float64)
+    streams = {}
+    for name in frame.columns:
+        if name == 'time' or name == 'datetime' or name.startswith('Unnamed'):
+            continue
+        values = pd.to_numeric(frame[name], errors='coerce').to_numpy(dtype=np.float64)
+        valid = ~np.isnan(values)
+        if valid.any():
+            streams[name] = (times[valid], values[valid])
+    return streams
+
+
+def load_streams(path):
+    if Path(path).suffix == '.csv':
+        return streams_from_csv(path)
+    return streams_from_session(path)
+
+
+class ReplaySource(qtc.QObject):
+    """ Virtual device that plays a recorded session back through the Communicator like live hardware.
+
+    It is read by the scheduler like the sensor workers. Every read() advances the replay position by the
+    wall time since the last read times speed (or by burst seconds if speed is None, as fast as possible)
+    and emits the recorded samples of that span. The samples keep their recorded times (ns on the session
+    clock, so DataHandler.clock.seconds() gives the recorded time). The DataHandler aligns them up to now()
+    instead of the wall clock, so every recorded grid row reaches the buffer at any speed. A loop goes on
+    after the end of the recording instead of going back in time."""
+    samples_received = qtc.pyqtSignal(int, np.ndarray, np.ndarray)  # force and laser, like SensorWorker
+    frames_received = qtc.pyqtSignal(int, np.ndarray, np.ndarray)  # resistances as SMAPOC frames
+    channel_received = qtc.pyqtSignal(str, np.ndarray, np.ndarray)  # everything else by channel name
+    finished = qtc.pyqtSignal()
+    sensor_ids = {'force': ids.REPLAY_FORCE, 'laser': ids.REPLAY_LASER}
+    burst = 1.0  # s of recording per read if speed is None
+
+    def __init__(self, streams, speed=1.0, loop=False):
+        super().__init__()
+        self.streams = {name: (np.asarray(t, dtype=np.float64), np.asarray(v, dtype=np.float64))
+                        for name, (t, v) in streams.items() if len(t)}
+        self.speed = speed
+        self.loop = loop
+        starts = [t[0] for t, _ in self.streams.values()]
+        stops = [t[-1] for t, _ in self.streams.values()]
+        self.start_time = min(starts, default=0.0)
+        self.stop_time = max(stops, default=0.0)
+        self.position = self.start_time  # s of the recording, everything before it was emitted
+        self.time_offset = 0.0  # s added to the recorded times, grows with every loop
+        self.last_read = None  # ns of the session clock
+        self.emitted = 0
+
+    @classmethod
+    def from_file(cls, path, speed=1.0, loop=False):
+        return cls(load_streams(path), speed, loop)
+
+    def set_speed(self, speed):
+        """ replay speed as a factor of real time, None for as fast as possible """
+        self.speed = speed
+
+    def rewind(self):
+        self.position = self.start_time
+        self.time_offset = 0.0
+        self.last_read = None
+
+    def is_finished(self):
+        return self.position > self.stop_time
+
+    def now(self):
+        """ s of the replayed time base up to which every sample was emitted, takes the place of the clock """
+        return self.position + self.time_offset
+
+    def read(self):
+        now = session_clock.now_ns()
+        if self.last_read is None or self.is_finished():
+            # the first read only starts the clock
+            self.last_read = now
+            return
+        span = self.burst if self.speed is None else (now - self.last_read) / 1e9 * self.speed
+        if span <= 0:
+            return
+        start, stop = self.position, self.position + span
+        for name, (t, v) in self.streams.items():
+            first, last = np.searchsorted(t, [start, stop], side='left')
+            if last > first:
+                times = session_clock.t0 + np.round((t[first:last] + self.time_offset) * 1e9).astype(np.int64)
+                self.emit_channel(name, t[first:last], times, v[first:last])
+        self.position = stop
+        self.last_read = now
+        if self.is_finished():
+            logging.info(f'replay finished, {self.emitted} samples')
+            if self.loop:
+                self.time_offset += self.position - self.start_time
+                self.position = self.start_time
+            else:
+                self.finished.emit()
+
+    def emit_channel(self, name, recorded, times, values):
+        """ recorded: times of the samples in the recording in s, times: the same in ns on the session clock """
+        self.emitted += len(times)
+        if name in self.sensor_ids:
+            self.samples_received.emit(self.sensor_ids[name], times, values)
+        elif name in ids.RES_CHANNELS and self.has_frames():
+            if name != ids.RES_CHANNELS[0]:
+                return  # sent with the frames of r1
+            # the resistances are recorded per frame, so all six channels are sent at the times of r1
+            frames = np.zeros((len(times), 8), dtype=np.int16)
+            for i, channel in enumerate(ids.RES_CHANNELS):
+                t, v = self.streams[channel]
+                frames[:, 2 + i] = np.round(np.interp(recorded, t, v))
+            self.frames_received.emit(ids.FROM_REPLAY, times, frames)
+        else:
+            self.channel_received.emit(name, times, values)
+
+    def has_frames(self):
+        return all(channel in self.streams for channel in ids.RES_CHANNELS)
+
+    def stop(self):
+        self.last_read = None
@@ -0,0 +1,142 @@
+import numpy as np
+
+
+class RingBuffer:
+    """ Preallocated columnar ring buffer with one numpy array per channel.
+
+    Every column is stored twice (mirrored at index i and i + capacity), so the
+    newest n rows are always one contiguous slice. Appending a row is O(1) and
+    readers get zero-copy, read-only views instead of pandas copies.
+    """
+
+    def __init__(self, columns, capacity=20000, dtype=np.float64):
+        self.capacity = int(capacity)
+        self.dtype = dtype
+        self.arrays = {}
+        self.seen = []  # columns that already got a value, in order of appearance
+        self.pos = 0  # next write position in [0, capacity)
+        self.size = 0  # number of valid rows
+        self.count = 0  # rows appended since the last clear (monotonic)
+        self.clears = 0  # number of clear() calls, tells readers that cached rows are gone
+        for name in columns:
+            self.add_column(name)
+
+    def add_column(self, name):
+        if name not in self.arrays:
+            self.arrays[name] = np.full(2 * self.capacity, np.nan, dtype=self.dtype)
+
+    @property
+    def columns(self):
+        return list(self.seen)
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, name):
+        return name in self.seen
+
+    def clear(self):
+        for array in self.arrays.values():
+            array.fill(np.nan)
+        self.seen = []
+        self.pos = 0
+        self.size = 0
+        self.count = 0
+        self.clears += 1
+
+    def append(self, row):
+        """ Writes one row (dict channel -> value). Channels missing in row are stored as NaN. """
+        pos = self.pos
+        mirror = pos + self.capacity
+        for name, array in self.arrays.items():
+            value = row.get(name, np.nan)
+            array[pos] = value
+            array[mirror] = value
+        for name in row:
+            if name not in self.seen:
+                if name not in self.arrays:
+                    continue
+                self.seen.append(name)
+        self.pos = (pos + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+        self.count += 1
+
+    def extend(self, block):
+        """ Writes a block of rows at once (dict channel -> array, all of the same length). """
+        lengths = {len(values) for values in block.values()}
+        if len(lengths) != 1:
+            raise ValueError(f'all columns of a block need the same length, got {lengths}')
+        n = lengths.pop()
+        if n == 0:
+            return
+        skip = max(n - self.capacity, 0)  # rows that would be overwritten within this block anyway
+        idx = (self.pos + np.arange(skip, n)) % self.capacity
+        for name, array in self.arrays.items():
+            values = block.get(name)
+            values = np.nan if values is None else np.asarray(values)[skip:]
+            array[idx] = values
+            array[idx + self.capacity] = values
+        for name in block:
+            if name not in self.seen and name in self.arrays:
+                self.seen.append(name)
+        self.pos = (self.pos + n) % self.capacity
+        self.size = min(self.size + n, self.capacity)
+        self.count += n
+
+    def view(self, name, n=None):
+        """ Zero-copy, read-only view of the newest n rows (all valid rows if n is None).
+        The view is only stable until the next append."""
+        if n is None or n > self.size:
+            n = self.size
+        end = self.pos + self.capacity
+        view = self.arrays[name][end - n:end]
+        view.flags.writeable = False
+        return view
+
+    def last(self, name, default=None):
+        if name not in self.seen or self.size == 0:
+            return default
+        return self.arrays[name][self.pos + self.capacity - 1]
+
+    def snapshot(self):
+        return BufferSnapshot(self)
+
+
+class BufferSnapshot:
+    """ State of a RingBuffer at one moment with the read interface of the buffer (view, last, len, in).
+
+    The views are zero-copy like RingBuffer.view and are created once per column, however many readers
+    ask for them. Like the views, a snapshot is only valid until the next append: it is shared by the plots
+    of one display tick, which must not keep its views. Whatever is handed to pyqtgraph is copied first,
+    e.g. by MinMaxDecimator.points.
+    """
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+        self.count = buffer.count
+        self.clears = buffer.clears
+        self.size = buffer.size
+        self.end = buffer.pos + buffer.capacity
+        self.columns = buffer.columns
+        self.views = {}
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    def view(self, name, n=None):
+        if name not in self.views:
+            view = self.buffer.arrays[name][self.end - self.size:self.end]
+            view.flags.writeable = False
+            self.views[name] = view
+        view = self.views[name]
+        if n is None or n >= self.size:
+            return view
+        return view[self.size - n:]
+
+    def last(self, name, default=None):
+        if name not in self.columns or self.size == 0:
+            return default
+        return self.view(name)[-1]
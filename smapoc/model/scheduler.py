@@ -0,0 +1,121 @@
+import PyQt5.QtCore as qtc
+import logging
+import time
+
+logging.getLogger(__name__)
+
+
+class ScheduledTask(qtc.QObject):
+    """ Calls a function periodically with its own interval and deadline.
+
+    The next deadline is always computed from the previous one, not from the time the call finished, so
+    the rate does not drift. If the event loop was blocked for longer than one interval, the missed calls
+    are counted and skipped instead of being executed in a burst."""
+
+    def __init__(self, name, interval, callback):
+        super().__init__()
+        self.name = name
+        self.interval = interval  # ms
+        self.callback = callback
+        self.timer = qtc.QTimer()
+        self.timer.setSingleShot(True)
+        self.timer.setTimerType(qtc.Qt.PreciseTimer)
+        self.timer.timeout.connect(self.fire)
+        self.deadline = None
+        self.last_run = None
+        self.runs = 0
+        self.missed = 0
+        self.period = 0.0  # s, smoothed
+        self.rate = 0.0  # achieved calls per second
+
+    def set_interval(self, interval):
+        self.interval = interval
+
+    def start(self):
+        self.deadline = time.perf_counter() + self.interval / 1000
+        self.last_run = None
+        self.schedule()
+
+    def stop(self):
+        self.timer.stop()
+        self.deadline = None
+
+    def is_active(self):
+        return self.deadline is not None
+
+    def schedule(self):
+        delay = max(0, int((self.deadline - time.perf_counter()) * 1000))
+        self.timer.start(delay)
+
+    def fire(self):
+        if self.deadline is None:
+            return
+        now = time.perf_counter()
+        interval = self.interval / 1000
+        late = now - self.deadline
+        if late > interval:
+            skipped = int(late // interval)
+            self.missed += skipped
+            self.deadline += skipped * interval
+            logging.debug(f'{self.name} missed {skipped} deadlines')
+        try:
+            self.callback()
+        except Exception as e:
+            logging.warning(f'{self.name} request failed: {e}')
+        if self.last_run is not None:
+            # smooth the period, not the rate, short catch-up periods would dominate a rate average
+            period = now - self.last_run
+            self.period = 0.9 * self.period + 0.1 * period if self.period else period
+            self.rate = 1 / self.period if self.period > 0 else 0.0
+        self.last_run = now
+        self.runs += 1
+        if self.deadline is not None:
+            self.deadline += interval
+            self.schedule()
+
+    def stats(self):
+        return {'interval': self.interval,
+                'rate': self.rate,
+                'runs': self.runs,
+                'missed': self.missed}
+
+
+class AcquisitionScheduler(qtc.QObject):
+    """ Runs one ScheduledTask per device, so slow devices do not throttle the fast ones """
+
+    def __init__(self):
+        super().__init__()
+        self.tasks = {}
+        self.running = False
+
+    def add_task(self, name, interval, callback):
+        self.remove_task(name)
+        self.tasks[name] = ScheduledTask(name, interval, callback)
+        if self.running:
+            self.tasks[name].start()
+
+    def remove_task(self, name):
+        task = self.tasks.pop(name, None)
+        if task is not None:
+            task.stop()
+
+    def set_interval(self, name, interval):
+        if name in self.tasks:
+            self.tasks[name].set_interval(interval)
+
+    def get_interval(self, name):
+        return self.tasks[name].interval
+
+    def start(self):
+        self.running = True
+        for task in self.tasks.values():
+            if not task.is_active():
+                task.start()
+
+    def stop(self):
+        self.running = False
+        for task in self.tasks.values():
+            task.stop()
+
+    def stats(self):
+        return {name: task.stats() for name, task in self.tasks.items()}
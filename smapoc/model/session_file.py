@@ -0,0 +1,272 @@
+import json
+import logging
+import os
+import struct
+import numpy as np
+
+from smapoc.model import stream_recorder
+from smapoc.model.alignment import align_streams, LINEAR
+
+logging.getLogger(__name__)
+
+# file layout: MAGIC, uint64 data offset, JSON header (padded), then per channel three contiguous arrays:
+# the int64 timestamps (ns of the session clock, sorted), the float64 values and the time index.
+# The index holds every index_step-th timestamp, so a time can be found without touching the whole
+# timestamp array. All byte offsets are in the header, the arrays are opened with np.memmap.
+MAGIC = b'SMAPSES1'
+DATA_OFFSET = struct.Struct('<Q')
+ALIGNMENT = 64  # bytes, every array starts at a multiple of this
+INDEX_STEP = 4096  # samples per index entry
+MERGE_BLOCK = 65536  # samples per run in memory while out-of-order samples are merged
+
+
+def _aligned(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def _layout(header, counts):
+    """ adds the byte offsets of all arrays to header, :return: the header bytes and the file size """
+    channels = {}
+    header['channels'] = channels
+    header['index_step'] = INDEX_STEP
+    # the header length depends on the offsets and the offsets on the header length, two rounds settle it
+    data_offset = 0
+    for _ in range(3):
+        offset = data_offset
+        for name, n in counts.items():
+            n_index = -(-n // INDEX_STEP)
+            channels[name] = {'count': n,
+                              'times': offset,
+                              'values': _aligned(offset + 8 * n),
+                              'index': _aligned(_aligned(offset + 8 * n) + 8 * n),
+                              'index_count': n_index}
+            offset = _aligned(channels[name]['index'] + 8 * n_index)
+        encoded = json.dumps(header, default=str).encode('utf-8')
+        needed = _aligned(len(MAGIC) + DATA_OFFSET.size + len(encoded))
+        if needed <= data_offset:
+            header['data_offset'] = data_offset
+            return encoded, offset
+        data_offset = needed + ALIGNMENT  # leave room for the offsets getting longer
+    raise RuntimeError('session header did not settle')
+
+
+def _write_header(path, header, counts):
+    encoded, size = _layout(header, counts)
+    with open(path, 'wb') as file:
+        file.write(MAGIC)
+        file.write(DATA_OFFSET.pack(header['data_offset']))
+        file.write(encoded)
+        file.truncate(size)
+    return header
+
+
+def _fill_index(mm_times, mm_index):
+    mm_index[:] = mm_times[::INDEX_STEP]
+
+
+def _runs(times):
+    """ start offsets of the ascending runs of a (memory-mapped) timestamp array, read block by block """
+    starts = [0]
+    for lo in range(1, len(times), MERGE_BLOCK):
+        block = np.asarray(times[lo - 1:lo + MERGE_BLOCK])
+        starts.extend(int(i) for i in lo + np.flatnonzero(np.diff(block) < 0))
+    return starts
+
+
+def _merge_runs(src_times, src_values, dst_times, dst_values, starts):
+    """ merges the ascending runs of src into dst with at most MERGE_BLOCK samples of every run in memory.
+    Equal timestamps keep the order of src, like a stable sort. """
+    ends = starts[1:] + [len(src_times)]
+    pos = list(starts)
+    times = [np.empty(0, dtype=np.int64)] * len(starts)
+    values = [np.empty(0)] * len(starts)
+    out = 0
+    while True:
+        for i in range(len(starts)):
+            if len(times[i]) == 0 and pos[i] < ends[i]:
+                stop = min(pos[i] + MERGE_BLOCK, ends[i])
+                times[i] = np.array(src_times[pos[i]:stop])
+                values[i] = np.array(src_values[pos[i]:stop])
+                pos[i] = stop
+        active = [i for i in range(len(starts)) if len(times[i])]
+        if not active:
+            return
+        # the samples up to the smallest newest time of the runs that have more on disk are final
+        limits = [times[i][-1] for i in active if pos[i] < ends[i]]
+        t_parts = []
+        v_parts = []
+        for i in active:
+            n = np.searchsorted(times[i], min(limits), side='right') if limits else len(times[i])
+            t_parts.append(times[i][:n])
+            v_parts.append(values[i][:n])
+            times[i] = times[i][n:]
+            values[i] = values[i][n:]
+        t = np.concatenate(t_parts)
+        order = np.argsort(t, kind='stable')
+        dst_times[out:out + len(t)] = t[order]
+        dst_values[out:out + len(t)] = np.concatenate(v_parts)[order]
+        out += len(t)
+
+
+def _sort_channel(session_path, name, mm_times, mm_values, starts):
+    """ sorts one channel of a session file in place, through a temporary copy of its runs """
+    n = len(mm_times)
+    tmp_path = f'{session_path}.{name}.tmp'
+    try:
+        tmp = np.memmap(tmp_path, dtype='<i8', mode='w+', shape=(2 * n,))
+        tmp_times = tmp[:n]
+        tmp_values = tmp[n:].view('<f8')
+        for lo in range(0, n, MERGE_BLOCK):
+            tmp_times[lo:lo + MERGE_BLOCK] = mm_times[lo:lo + MERGE_BLOCK]
+        for lo in range(0, n, MERGE_BLOCK):
+            tmp_values[lo:lo + MERGE_BLOCK] = mm_values[lo:lo + MERGE_BLOCK]
+        _merge_runs(tmp_times, tmp_values, mm_times, mm_values, starts)
+        del tmp, tmp_times, tmp_values
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def write_session(path, streams, header=None):
+    """ writes dict name -> (times in ns, values) as a session file """
+    header = dict(header or {})
+    streams = {name: (np.asarray(t, dtype=np.int64), np.asarray(v, dtype=np.float64)) for name, (t, v) in streams.items()}
+    header = _write_header(path, header, {name: len(t) for name, (t, _) in streams.items()})
+    for name, (t, v) in streams.items():
+        if len(t) == 0:
+            continue
+        order = np.argsort(t, kind='stable')
+        info = header['channels'][name]
+        mm_times = np.memmap(path, dtype='<i8', mode='r+', offset=info['times'], shape=(info['count'],))
+        mm_times[:] = t[order]
+        np.memmap(path, dtype='<f8', mode='r+', offset=info['values'], shape=(info['count'],))[:] = v[order]
+        _fill_index(mm_times, np.memmap(path, dtype='<i8', mode='r+', offset=info['index'],
+                                        shape=(info['index_count'],)))
+
+
+def session_path_for(recording_path):
+    """ path of the session file next to a recording """
+    return str(recording_path).rsplit('.', 1)[0] + '.smses'
+
+
+def compact_recording(recording_path, session_path=None):
+    """ turns a StreamRecorder file into a session file with two passes over the chunks, so only one chunk
+    is in memory at a time. A channel with out-of-order samples is merged run by run, not sorted in memory.
+    :return: the path of the session file """
+    if session_path is None:
+        session_path = session_path_for(recording_path)
+    with open(recording_path, 'rb') as file:
+        header = stream_recorder.read_header(file)
+    counts = {}
+    for name, times, _ in stream_recorder.iter_chunks(recording_path):
+        counts[name] = counts.get(name, 0) + len(times)
+    header = _write_header(session_path, header, counts)
+    maps = {name: (np.memmap(session_path, dtype='<i8', mode='r+', offset=info['times'], shape=(info['count'],)),
+                   np.memmap(session_path, dtype='<f8', mode='r+', offset=info['values'], shape=(info['count'],)))
+            for name, info in header['channels'].items() if info['count']}
+    written = dict.fromkeys(maps, 0)
+    for name, times, values in stream_recorder.iter_chunks(recording_path):
+        mm_times, mm_values = maps[name]
+        start = written[name]
+        mm_times[start:start + len(times)] = times
+        mm_values[start:start + len(values)] = values
+        written[name] += len(times)
+    for name, (mm_times, mm_values) in maps.items():
+        starts = _runs(mm_times)
+        if len(starts) > 1:
+            # samples of one channel only arrive out of order around a device clock re-anchoring
+            _sort_channel(session_path, name, mm_times, mm_values, starts)
+        info = header['channels'][name]
+        _fill_index(mm_times, np.memmap(session_path, dtype='<i8', mode='r+', offset=info['index'],
+                                        shape=(info['index_count'],)))
+        mm_times.flush()
+        mm_values.flush()
+    logging.info(f'compacted {recording_path} to {session_path}')
+    return session_path
+
+
+class SessionFile:
+    """ Read-only, memory-mapped access to a session file.
+
+    Opening only reads the header, the arrays are mapped and loaded page by page when they are accessed.
+    window() finds the samples of a time range with the small index and a search on a short piece of the
+    timestamps, so slicing an hour out of a multi-GB session does not read the rest of it."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as file:
+            if file.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f'{path} is not a session file')
+            data_offset, = DATA_OFFSET.unpack(file.read(DATA_OFFSET.size))
+            self.header = json.loads(file.read(data_offset - len(MAGIC) - DATA_OFFSET.size).rstrip(b'\0'))
+        self.t0 = self.header.get('t0_ns', 0)
+        self.index_step = self.header['index_step']
+        self.maps = {}
+
+    @property
+    def channels(self):
+        return [name for name, info in self.header['channels'].items() if info['count']]
+
+    def __contains__(self, name):
+        return name in self.channels
+
+    def __len__(self):
+        return max((info['count'] for info in self.header['channels'].values()), default=0)
+
+    def _map(self, name, key, dtype):
+        if (name, key) not in self.maps:
+            info = self.header['channels'][name]
+            shape = info['index_count'] if key == 'index' else info['count']
+            self.maps[(name, key)] = np.memmap(self.path, dtype=dtype, mode='r', offset=info[key], shape=(shape,))
+        return self.maps[(name, key)]
+
+    def times(self, name):
+        """ timestamps in ns of the session clock """
+        return self._map(name, 'times', '<i8')
+
+    def values(self, name):
+        return self._map(name, 'values', '<f8')
+
+    def seconds(self, name):
+        return (self.times(name) - self.t0) / 1e9
+
+    def span(self):
+        """ first and last time in s over all channels """
+        starts = [self.times(name)[0] for name in self.channels]
+        stops = [self.times(name)[-1] for name in self.channels]
+        if not starts:
+            return 0.0, 0.0
+        return (min(starts) - self.t0) / 1e9, (max(stops) - self.t0) / 1e9
+
+    def search(self, name, t_ns, side='left'):
+        """ sample offset of a time in ns, like np.searchsorted on the timestamps """
+        index = self._map(name, 'index', '<i8')
+        block = max(int(np.searchsorted(index, t_ns, side=side)) - 1, 0)
+        lo = block * self.index_step
+        hi = min(lo + 2 * self.index_step, len(self.times(name)))
+        return lo + int(np.searchsorted(self.times(name)[lo:hi], t_ns, side=side))
+
+    def offsets(self, name, start=None, stop=None):
+        """ sample range [first, last) of the times start <= t <= stop in s """
+        first = 0 if start is None else self.search(name, self.t0 + int(round(start * 1e9)), 'left')
+        last = len(self.times(name)) if stop is None else self.search(name, self.t0 + int(round(stop * 1e9)), 'right')
+        return first, last
+
+    def window(self, name, start=None, stop=None):
+        """ :return: (times in s, values) of one channel between start and stop in s, values are a memmap view """
+        first, last = self.offsets(name, start, stop)
+        return (self.times(name)[first:last] - self.t0) / 1e9, self.values(name)[first:last]
+
+    def aligned(self, start=None, stop=None, period=0.005, method=LINEAR, methods=None, channels=None):
+        """ all (or the given) channels of a time window on one time grid, see align_streams """
+        channels = channels or self.channels
+        streams = {}
+        for name in channels:
+            # one sample before the window, so interpolation and hold have a value at the window start
+            first, last = self.offsets(name, start, stop)
+            first = max(first - 1, 0)
+            streams[name] = ((self.times(name)[first:last] - self.t0) / 1e9, self.values(name)[first:last])
+        return align_streams(streams, period, method, methods, start, stop)
+
+    def close(self):
+        self.maps = {}
@@ -1,6 +1,8 @@
 import smapoc.ids as ids
 import PyQt5.QtCore as qtc
+import numpy as np
 import struct
+import time
 
 class Power(qtc.QObject):
     def __init__(self, parent, communicator, sma_channels):
@@ -27,11 +29,23 @@ class Power(qtc.QObject):
 
     def update_power_vec_direct(self, pow_vec):
         self.power_vec = pow_vec
+        self.sma_channels.set_outputs({name: pow_vec[ids.CHANNEL_MAPPING[name]]
+                                       for name in self.sma_channels.channels})
 
+    def sine_outputs(self, t):
+        """ output of every channel at time t (s) with the sine settings of its widget, 0 if deactivated """
+        outputs = {}
+        for name, channel in self.sma_channels.channels.items():
+            outputs[name] = (channel.amp * np.sin(2 * np.pi * channel.freq * t + channel.phase) + channel.off) * channel.output
+        return outputs
 
     def update_power_vec_sine(self):
-        for name, channel in self.sma_channels.channels.items():
-            self.power_vec[ids.CHANNEL_MAPPING[name]] = int(abs(channel.update_sine()))
+        # computed when a command is sent, the widgets only show the result (SMAChannels.refresh_labels)
+        outputs = self.sine_outputs(time.time())
+        for name, out in outputs.items():
+            self.power_vec[ids.CHANNEL_MAPPING[name]] = int(abs(out))
+        # the labels show what the board gets, not the signed sine value
+        self.sma_channels.set_outputs({name: self.power_vec[ids.CHANNEL_MAPPING[name]] for name in outputs})
         return self.power_vec
 
     def make_msg(self):
@@ -0,0 +1,158 @@
+import json
+import logging
+import queue
+import struct
+import threading
+import time
+import numpy as np
+
+logging.getLogger(__name__)
+
+# file layout: MAGIC, uint32 header length, JSON header, then chunks until the end of the file.
+# A chunk holds the samples of one channel: CHUNK_HEAD (magic, name length, sample count), the name,
+# the int64 timestamps (ns of the session clock) and the float64 values.
+MAGIC = b'SMAPREC1'
+HEADER_LENGTH = struct.Struct('<I')
+CHUNK_MAGIC = b'CHNK'
+CHUNK_HEAD = struct.Struct('<4sHI')
+
+
+class StreamRecorder:
+    """ Writes every collected sample to an append-only binary file while the test runs.
+
+    add() only puts the block into a bounded queue, a background thread collects the blocks per channel and
+    writes them in chunks. The file is usable up to the last complete chunk, even if the program crashes.
+    If the disk can not keep up and the queue is full, blocks are dropped and counted instead of using more RAM."""
+    queue_size = 2000  # blocks
+    chunk_size = 8192  # samples per channel before a chunk is written
+    flush_interval = 1.0  # s, pending samples are written at least this often
+
+    def __init__(self, path, header=None):
+        self.path = path
+        self.header = dict(header or {})
+        self.blocks = queue.Queue(maxsize=self.queue_size)
+        self.pending = {}  # name -> list of (times, values), only used by the writer thread
+        self.pending_count = {}
+        self.samples = 0  # samples written
+        self.chunks = 0
+        self.dropped = 0  # samples lost because the queue was full
+        self.file = None
+        self.thread = None
+
+    def start(self):
+        self.file = open(self.path, 'wb')
+        header = json.dumps(self.header, default=str).encode('utf-8')
+        self.file.write(MAGIC)
+        self.file.write(HEADER_LENGTH.pack(len(header)))
+        self.file.write(header)
+        self.file.flush()
+        self.thread = threading.Thread(target=self.run, name='StreamRecorder', daemon=True)
+        self.thread.start()
+        logging.info(f'recording to {self.path}')
+
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def add(self, name, times, values):
+        """ times: ns of the session clock """
+        times = np.atleast_1d(np.asarray(times, dtype=np.int64))
+        values = np.atleast_1d(np.asarray(values, dtype=np.float64))
+        if len(times) == 0:
+            return
+        try:
+            self.blocks.put_nowait((name, times, values))
+        except queue.Full:
+            if not self.dropped:
+                logging.warning('recorder queue full, samples are dropped')
+            self.dropped += len(times)
+
+    def backlog(self):
+        """ samples waiting in the queue for the writer thread """
+        with self.blocks.mutex:
+            return sum(len(block[1]) for block in self.blocks.queue if block)
+
+    def stop(self):
+        if self.thread is None:
+            return
+        self.blocks.put(None)
+        self.thread.join()
+        self.thread = None
+        self.file.close()
+        logging.info(f'recording finished: {self.samples} samples in {self.chunks} chunks, {self.dropped} dropped')
+
+    def run(self):
+        last_flush = time.perf_counter()
+        while True:
+            try:
+                block = self.blocks.get(timeout=self.flush_interval)
+            except queue.Empty:
+                block = ()
+            if block is None:
+                break
+            if block:
+                name, times, values = block
+                self.pending.setdefault(name, []).append((times, values))
+                self.pending_count[name] = self.pending_count.get(name, 0) + len(times)
+                if self.pending_count[name] >= self.chunk_size:
+                    self.write_chunk(name)
+            if time.perf_counter() - last_flush >= self.flush_interval:
+                self.write_all()
+                last_flush = time.perf_counter()
+        self.write_all()
+
+    def write_all(self):
+        for name in list(self.pending):
+            self.write_chunk(name)
+        self.file.flush()
+
+    def write_chunk(self, name):
+        blocks = self.pending.pop(name, None)
+        self.pending_count.pop(name, None)
+        if not blocks:
+            return
+        times = np.concatenate([b[0] for b in blocks])
+        values = np.concatenate([b[1] for b in blocks])
+        encoded = name.encode('utf-8')
+        self.file.write(CHUNK_HEAD.pack(CHUNK_MAGIC, len(encoded), len(times)))
+        self.file.write(encoded)
+        self.file.write(times.astype('<i8').tobytes())
+        self.file.write(values.astype('<f8').tobytes())
+        self.samples += len(times)
+        self.chunks += 1
+
+
+def read_header(file):
+    if file.read(len(MAGIC)) != MAGIC:
+        raise ValueError(f'{file.name} is not a stream recording')
+    length, = HEADER_LENGTH.unpack(file.read(HEADER_LENGTH.size))
+    return json.loads(file.read(length).decode('utf-8'))
+
+
+def iter_chunks(path):
+    """ yields (name, times, values) of every complete chunk, a truncated last chunk is ignored """
+    with open(path, 'rb') as file:
+        read_header(file)
+        while True:
+            head = file.read(CHUNK_HEAD.size)
+            if len(head) < CHUNK_HEAD.size:
+                return
+            magic, name_length, n = CHUNK_HEAD.unpack(head)
+            if magic != CHUNK_MAGIC:
+                raise ValueError(f'corrupt chunk at byte {file.tell() - CHUNK_HEAD.size} of {path}')
+            name = file.read(name_length).decode('utf-8', errors='replace')
+            data = file.read(16 * n)
+            if len(data) < 16 * n:
+                logging.warning(f'{path} ends with a truncated chunk')
+                return
+            yield name, np.frombuffer(data, dtype='<i8', count=n), np.frombuffer(data, dtype='<f8', offset=8 * n)
+
+
+def load_recording(path):
+    """ :return: (header, dict name -> (times in ns, values)) with all samples of a recording """
+    with open(path, 'rb') as file:
+        header = read_header(file)
+    streams = {}
+    for name, times, values in iter_chunks(path):
+        streams.setdefault(name, []).append((times, values))
+    return header, {name: (np.concatenate([b[0] for b in blocks]), np.concatenate([b[1] for b in blocks]))
+                    for name, blocks in streams.items()}
@@ -0,0 +1,119 @@
+import collections
+import functools
+import json
+import logging
+import os
+import threading
+import time
+
+from smapoc.model.clock import session_clock
+
+logging.getLogger(__name__)
+
+
+class Span:
+    """ Context manager that records one span, created by Tracer.span() """
+    __slots__ = ('tracer', 'name', 'category', 'start')
+
+    def __init__(self, tracer, name, category):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.tracer.add(self.name, self.category, self.start, time.perf_counter_ns())
+        return False
+
+
+class NoSpan:
+    """ What Tracer.span() returns while tracing is off, does nothing """
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+NO_SPAN = NoSpan()
+
+
+class Tracer:
+    """ Opt-in recorder of timed spans of the acquisition and plotting pipeline.
+
+    The spans go into a bounded in-memory deque (appending is thread safe and cheap, the oldest spans are
+    dropped when it is full), nothing is written before export_chrome(). While tracing is off, span() and
+    the traced() wrappers only check a flag. Tracing is switched on with start() or with the environment
+    variable SMAPOC_TRACE=1 at start-up. The export can be opened in chrome://tracing or ui.perfetto.dev."""
+    capacity = 1000000  # spans
+
+    def __init__(self):
+        self.enabled = os.environ.get('SMAPOC_TRACE', '') not in ('', '0')
+        self.spans = collections.deque(maxlen=self.capacity)
+        self.thread_names = {}
+
+    def start(self):
+        self.spans.clear()
+        self.enabled = True
+        logging.info('tracing started')
+
+    def stop(self):
+        self.enabled = False
+        logging.info(f'tracing stopped, {len(self.spans)} spans')
+
+    def name_thread(self, name):
+        """ names the calling thread in the trace, QThreads are only 'Dummy-n' for the threading module """
+        self.thread_names[threading.get_native_id()] = name
+
+    def add(self, name, category, start_ns, end_ns):
+        self.spans.append((name, category, threading.get_native_id(), start_ns, end_ns - start_ns))
+
+    def span(self, name, category='pipeline'):
+        if not self.enabled:
+            return NO_SPAN
+        return Span(self, name, category)
+
+    def traced(self, name=None, category='pipeline'):
+        """ decorator, records every call of the function as a span (name defaults to its qualified name) """
+        def decorator(function):
+            span_name = name or function.__qualname__
+
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                start = time.perf_counter_ns()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    self.add(span_name, category, start, time.perf_counter_ns())
+            return wrapper
+        return decorator
+
+    def export_chrome(self, path):
+        """ writes the spans as Chrome trace event JSON, times in µs since the start of the session """
+        pid = os.getpid()
+        main_thread = threading.main_thread().native_id
+        events = [{'name': 'process_name', 'ph': 'M', 'pid': pid, 'args': {'name': 'SMApoc'}}]
+        spans = list(self.spans)  # the workers may still append
+        threads = {tid for _, _, tid, _, _ in spans}
+        for tid in threads:
+            name = self.thread_names.get(tid, 'GUI' if tid == main_thread else f'thread {tid}')
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}})
+        for name, category, tid, start, duration in spans:
+            events.append({'name': name, 'cat': category, 'ph': 'X', 'pid': pid, 'tid': tid,
+                           'ts': (start - session_clock.t0) / 1000, 'dur': duration / 1000})
+        with open(path, 'w') as file:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, file)
+        logging.info(f'trace with {len(events) - len(threads) - 1} spans written to {path}')
+        return path
+
+
+# shared by the workers, the data handler and the plots
+tracer = Tracer()
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from smapoc.model.alignment import StreamAligner, align_streams, make_grid, resample, HOLD, LINEAR, NEAREST
+
+
+def test_make_grid_is_aligned_to_the_period():
+    assert np.allclose(make_grid(0.012, 0.05, 0.01), [0.02, 0.03, 0.04, 0.05])
+    assert len(make_grid(0.5, 0.4, 0.1)) == 0
+
+
+@pytest.mark.parametrize('method, expected', [(LINEAR, [np.nan, 0.75, 1.0, 1.0]),
+                                              (HOLD, [np.nan, 0.0, 1.0, 1.0]),
+                                              (NEAREST, [np.nan, 1.0, 1.0, 1.0])])
+def test_resample(method, expected):
+    out = resample([1.0, 2.0], [0.0, 1.0], [0.5, 1.75, 2.0, 3.0], method)
+    assert np.allclose(out, expected, equal_nan=True)
+
+
+def test_align_streams_merges_two_rates():
+    table = align_streams({'fast': (np.arange(0, 1.001, 0.001), np.arange(1001)),
+                           'slow': (np.arange(0, 1.001, 0.1), np.arange(11))}, period=0.25)
+    assert np.allclose(table['time'], [0, 0.25, 0.5, 0.75, 1.0])
+    assert np.allclose(table['fast'], [0, 250, 500, 750, 1000])
+    assert np.allclose(table['slow'], [0, 2.5, 5, 7.5, 10])
+
+
+def test_pop_aligned_waits_for_the_latency():
+    aligner = StreamAligner(period=0.01, latency=0.05)
+    aligner.add('a', np.arange(0, 0.1, 0.001), np.arange(100))
+    table = aligner.pop_aligned(now=0.1)
+    assert np.allclose(table['time'], np.arange(0, 0.051, 0.01))
+    assert np.allclose(table['a'], np.arange(0, 51, 10))
+    # the next call continues with the next grid point
+    aligner.add('a', np.arange(0.1, 0.2, 0.001), np.arange(100, 200))
+    table = aligner.pop_aligned(now=0.2)
+    assert np.allclose(table['time'], np.arange(0.06, 0.151, 0.01))
+    assert np.allclose(table['a'], np.arange(60, 151, 10))
+
+
+def test_a_late_stream_is_interpolated_when_it_arrives_within_the_latency():
+    aligner = StreamAligner(period=0.01, latency=0.05)
+    aligner.add('fast', np.arange(0, 0.1, 0.001), np.arange(100))
+    aligner.add('slow', [0.0], [0.0])
+    aligner.add('slow', [0.04], [4.0])  # arrives later, but before the grid points pass the latency
+    table = aligner.pop_aligned(now=0.095)
+    assert np.allclose(table['slow'], [0, 1, 2, 3, 4])
+
+
+def test_flush_returns_the_rest_without_latency():
+    aligner = StreamAligner(period=0.01, latency=0.05)
+    aligner.add('a', np.arange(0, 0.1, 0.001), np.arange(100))
+    aligner.pop_aligned(now=0.1)
+    table = aligner.flush()
+    assert np.allclose(table['time'], np.arange(0.06, 0.091, 0.01))
+    assert len(aligner.flush()['time']) == 0
+
+
+def test_restart_drops_pending_samples():
+    aligner = StreamAligner(period=0.01, latency=0.0)
+    aligner.add('a', [0.0, 0.1], [0, 1])
+    aligner.restart()
+    assert aligner.names == []
+    assert len(aligner.pop_aligned(now=1.0)['time']) == 0
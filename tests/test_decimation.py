@@ -0,0 +1,51 @@
+import numpy as np
+
+from smapoc.model.decimation import MinMaxDecimator, minmax_indices
+from smapoc.model.ring_buffer import RingBuffer
+
+
+def test_minmax_indices_keep_the_extrema():
+    y = np.zeros(1000)
+    y[123] = 5
+    y[777] = -5
+    indices = minmax_indices(y, 10)
+    assert len(indices) <= 20
+    assert 123 in indices and 777 in indices
+
+
+def test_short_series_are_not_decimated():
+    assert minmax_indices(np.arange(10.0), 10).tolist() == list(range(10))
+
+
+def test_points_keep_the_extrema_across_wrap_around():
+    buffer = RingBuffer(['t', 'y'], capacity=10000)
+    decimator = MinMaxDecimator('t', 'y')
+    rng = np.random.default_rng(1)
+    for _ in range(30):  # incremental updates while the buffer wraps
+        t0 = buffer.count
+        buffer.extend({'t': np.arange(t0, t0 + 1000, dtype=np.float64), 'y': rng.normal(size=1000)})
+        x, y, decimated = decimator.points(buffer, bins=100)
+    assert decimated
+    assert len(x) <= 2 * 100 + 4
+    assert np.all(np.diff(x) > 0)
+    values = buffer.view('y')
+    assert y.max() == values.max() and y.min() == values.min()
+
+
+def test_points_of_a_window():
+    buffer = RingBuffer(['t', 'y'], capacity=100000)
+    buffer.extend({'t': np.arange(50000, dtype=np.float64), 'y': np.sin(np.arange(50000) / 100)})
+    x, y, decimated = MinMaxDecimator('t', 'y').points(buffer, x_range=(1000, 1100), bins=1000)
+    assert not decimated
+    assert x[0] == 999 and x[-1] == 1100
+
+
+def test_clear_resets_the_cache():
+    buffer = RingBuffer(['t', 'y'], capacity=1000)
+    decimator = MinMaxDecimator('t', 'y')
+    buffer.extend({'t': np.arange(500.0), 'y': np.full(500, 9.0)})
+    decimator.points(buffer, bins=10)
+    buffer.clear()
+    buffer.extend({'t': np.arange(500.0), 'y': np.ones(500)})
+    _, y, _ = decimator.points(buffer, bins=10)
+    assert y.max() == 1.0
@@ -0,0 +1,46 @@
+import numpy as np
+
+from drivers.me_messsysteme.gsv3_usb import FRAME_SIZE, FRAME_START, find_frames
+
+
+def make_stream(values):
+    values = np.asarray(values, dtype=np.uint16)
+    frames = np.empty((len(values), FRAME_SIZE), dtype=np.uint8)
+    frames[:, 0] = FRAME_START
+    frames[:, 1] = values >> 8
+    frames[:, 2] = values & 0xFF
+    return frames.tobytes()
+
+
+VALUES = (np.arange(200) * 313 + 0xA5A5) % 0x10000  # some values contain 0xA5 bytes
+
+
+def test_all_frames_but_the_last_are_taken():
+    raw, consumed, dropped = find_frames(make_stream(VALUES))
+    assert np.array_equal(raw, VALUES[:-1])
+    assert consumed == (len(VALUES) - 1) * FRAME_SIZE
+    assert dropped == 0
+
+
+def test_one_lost_byte():
+    data = make_stream(VALUES)
+    data = data[:301] + data[302:]  # the high byte of frame 100
+    raw, consumed, dropped = find_frames(data)
+    assert np.array_equal(raw, np.delete(VALUES, 100)[:-1])
+    assert dropped == FRAME_SIZE - 1
+    assert consumed == len(data) - FRAME_SIZE
+
+
+def test_start_in_the_middle_of_a_frame():
+    values = np.array([0x12A5, 0x3456, 0x789A, 0x1234])
+    data = make_stream(values)[2:]  # starts with the low byte 0xA5 of the first frame
+    raw, consumed, dropped = find_frames(data)
+    assert raw.tolist() == [0x3456, 0x789A]
+    assert dropped == 1
+
+
+def test_unconfirmed_start_waits_for_more_data():
+    raw, consumed, dropped = find_frames(make_stream([0x1234])[:2])
+    assert len(raw) == 0 and consumed == 0 and dropped == 0
+    raw, consumed, dropped = find_frames(b'\x00\x01' + make_stream([0x1234]))
+    assert len(raw) == 0 and consumed == 2 and dropped == 2
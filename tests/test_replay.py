@@ -0,0 +1,29 @@
+import numpy as np
+
+from smapoc.model.clock import session_clock
+from smapoc.model.replay import ReplaySource
+
+
+def replay(streams, **kwargs):
+    source = ReplaySource(streams, speed=None, **kwargs)
+    received = []
+    source.channel_received.connect(lambda name, times, values: received.extend(session_clock.seconds(times)))
+    return source, received
+
+
+def test_samples_keep_their_recorded_times():
+    times = np.arange(0, 3, 0.01)
+    source, received = replay({'a': (times, times)})
+    source.read()  # starts the clock
+    while not source.is_finished():
+        source.read()
+    assert np.allclose(received, times)
+    assert source.now() >= times[-1]
+
+
+def test_a_loop_goes_on_after_the_end_of_the_recording():
+    source, received = replay({'a': (np.arange(0, 1, 0.1), np.arange(10.0))}, loop=True)
+    for _ in range(4):
+        source.read()
+    assert np.allclose(received, np.arange(0, 3, 0.1))
+    assert np.all(np.diff(received) > 0)
@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+
+from smapoc.model.decimation import MinMaxDecimator
+from smapoc.model.ring_buffer import RingBuffer
+
+
+def test_extend_and_view_keep_the_newest_rows_in_order():
+    buffer = RingBuffer(['a', 'b'], capacity=5)
+    buffer.extend({'a': np.arange(3), 'b': np.arange(3) * 10})
+    assert len(buffer) == 3
+    assert buffer.view('a').tolist() == [0, 1, 2]
+    assert buffer.view('b', 2).tolist() == [10, 20]
+
+
+def test_wrap_around_is_one_contiguous_view():
+    buffer = RingBuffer(['a'], capacity=5)
+    for i in range(8):
+        buffer.append({'a': i})
+    assert len(buffer) == 5
+    assert buffer.count == 8
+    assert buffer.view('a').tolist() == [3, 4, 5, 6, 7]
+    assert buffer.last('a') == 7
+
+
+def test_extend_longer_than_capacity_keeps_the_tail():
+    buffer = RingBuffer(['a'], capacity=4)
+    buffer.append({'a': -1})
+    buffer.extend({'a': np.arange(10)})
+    assert buffer.view('a').tolist() == [6, 7, 8, 9]
+    assert buffer.count == 11
+
+
+def test_missing_channels_are_nan_and_not_seen():
+    buffer = RingBuffer(['a', 'b'], capacity=4)
+    buffer.append({'a': 1.0})
+    assert buffer.columns == ['a']
+    assert 'b' not in buffer
+    assert np.isnan(buffer.view('b')[0])
+    assert buffer.last('b', default=0) == 0
+
+
+def test_blocks_need_equal_lengths():
+    buffer = RingBuffer(['a', 'b'], capacity=4)
+    with pytest.raises(ValueError):
+        buffer.extend({'a': [1, 2], 'b': [1]})
+
+
+def test_views_are_read_only():
+    buffer = RingBuffer(['a'], capacity=4)
+    buffer.append({'a': 1.0})
+    with pytest.raises(ValueError):
+        buffer.view('a')[0] = 2.0
+
+
+def test_clear_resets_the_count_and_counts_the_clears():
+    buffer = RingBuffer(['a'], capacity=4)
+    buffer.extend({'a': np.arange(6)})
+    buffer.clear()
+    assert len(buffer) == 0
+    assert buffer.count == 0
+    assert buffer.clears == 1
+    assert buffer.columns == []
+
+
+def test_snapshot_keeps_the_state_of_its_tick():
+    buffer = RingBuffer(['a', 'b'], capacity=5)
+    buffer.extend({'a': np.arange(7), 'b': np.arange(7) * 2})
+    snapshot = buffer.snapshot()
+    assert (snapshot.count, snapshot.clears, len(snapshot)) == (7, 0, 5)
+    assert snapshot.view('a').tolist() == [2, 3, 4, 5, 6]
+    assert snapshot.view('a') is snapshot.view('a')  # one view per column and tick
+    assert snapshot.view('b', 2).tolist() == [10, 12]
+    assert snapshot.last('a') == 6
+    assert 'a' in snapshot and 'c' not in snapshot
+
+
+def test_plotted_points_do_not_follow_the_buffer():
+    # pyqtgraph keeps the arrays of setData, the snapshot views change with the next append
+    buffer = RingBuffer(['t', 'y'], capacity=5)
+    buffer.extend({'t': np.arange(5.0), 'y': np.arange(5.0)})
+    snapshot = buffer.snapshot()
+    x, y, _ = MinMaxDecimator('t', 'y').points(snapshot)
+    buffer.extend({'t': [99.0], 'y': [99.0]})
+    assert snapshot.view('t')[0] == 99.0
+    assert x.tolist() == [0, 1, 2, 3, 4]
+
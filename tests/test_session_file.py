@@ -0,0 +1,131 @@
+import numpy as np
+import pytest
+
+from smapoc.model import session_file
+from smapoc.model.data_handler import DataHandler
+from smapoc.model.session_file import SessionFile, compact_recording, write_session
+from smapoc.model.stream_recorder import StreamRecorder, load_recording
+
+
+T0 = 10 ** 12  # ns
+
+
+def make_streams():
+    force_t = T0 + np.arange(0, 10 ** 10, 5 * 10 ** 6)  # 2000 samples at 200 Hz
+    laser_t = T0 + np.arange(0, 10 ** 10, 10 ** 6)  # 10000 samples at 1 kHz
+    return {'force': (force_t, np.sin(np.arange(len(force_t)))),
+            'laser': (laser_t, np.arange(len(laser_t), dtype=np.float64))}
+
+
+def test_write_and_read_round_trip(tmp_path):
+    path = tmp_path / 'test.smses'
+    streams = make_streams()
+    write_session(path, streams, {'t0_ns': T0, 'name': 'test'})
+    session = SessionFile(path)
+    assert session.header['name'] == 'test'
+    assert sorted(session.channels) == ['force', 'laser']
+    assert len(session) == 10000
+    for name, (t, v) in streams.items():
+        assert np.array_equal(session.times(name), t)
+        assert np.array_equal(session.values(name), v)
+    assert session.span() == pytest.approx((0.0, 9.999))
+
+
+def test_window_uses_the_index(tmp_path, monkeypatch):
+    monkeypatch.setattr(session_file, 'INDEX_STEP', 64)
+    path = tmp_path / 'test.smses'
+    write_session(path, make_streams(), {'t0_ns': T0})
+    session = SessionFile(path)
+    assert session.index_step == 64
+    times, values = session.window('laser', 2.5, 2.504)
+    assert np.allclose(times, [2.5, 2.501, 2.502, 2.503, 2.504])
+    assert values.tolist() == [2500, 2501, 2502, 2503, 2504]
+
+
+def test_aligned_window(tmp_path):
+    path = tmp_path / 'test.smses'
+    write_session(path, make_streams(), {'t0_ns': T0})
+    table = SessionFile(path).aligned(1.0, 1.02, period=0.01)
+    assert np.allclose(table['time'], [1.0, 1.01, 1.02])
+    assert np.allclose(table['laser'], [1000, 1010, 1020])
+
+
+def test_unsorted_input_is_sorted(tmp_path):
+    path = tmp_path / 'test.smses'
+    write_session(path, {'a': ([3, 1, 2], [30.0, 10.0, 20.0])})
+    session = SessionFile(path)
+    assert session.times('a').tolist() == [1, 2, 3]
+    assert session.values('a').tolist() == [10.0, 20.0, 30.0]
+
+
+def test_not_a_session_file(tmp_path):
+    path = tmp_path / 'other.smses'
+    path.write_bytes(b'nothing to see here')
+    with pytest.raises(ValueError):
+        SessionFile(path)
+
+
+def test_recording_compacts_to_the_same_samples(tmp_path, monkeypatch):
+    monkeypatch.setattr(StreamRecorder, 'chunk_size', 500)
+    path = tmp_path / 'test.smrec'
+    recorder = StreamRecorder(path, {'t0_ns': T0})
+    recorder.start()
+    streams = make_streams()
+    for name, (t, v) in streams.items():
+        for start in range(0, len(t), 100):
+            recorder.add(name, t[start:start + 100], v[start:start + 100])
+    recorder.stop()
+    assert recorder.dropped == 0
+    header, loaded = load_recording(path)
+    assert header['t0_ns'] == T0
+    for name, (t, v) in streams.items():
+        assert np.array_equal(loaded[name][0], t)
+        assert np.array_equal(loaded[name][1], v)
+    session = SessionFile(compact_recording(path))
+    for name, (t, v) in streams.items():
+        assert np.array_equal(session.times(name), t)
+        assert np.array_equal(session.values(name), v)
+
+
+def test_out_of_order_recording_is_merged_in_blocks(tmp_path, monkeypatch):
+    monkeypatch.setattr(session_file, 'MERGE_BLOCK', 7)
+    path = tmp_path / 'test.smrec'
+    recorder = StreamRecorder(path)
+    recorder.start()
+    rng = np.random.default_rng(2)
+    blocks = [np.sort(rng.integers(0, 1000, int(rng.integers(1, 40)))) for _ in range(20)]  # ascending runs
+    for i, times in enumerate(blocks):
+        recorder.add('a', times, np.full(len(times), float(i)))
+    recorder.stop()
+    times = np.concatenate(blocks)
+    values = np.concatenate([np.full(len(b), float(i)) for i, b in enumerate(blocks)])
+    order = np.argsort(times, kind='stable')
+    session = SessionFile(compact_recording(path))
+    assert np.array_equal(session.times('a'), times[order])
+    assert np.array_equal(session.values('a'), values[order])
+    assert not list(tmp_path.glob('*.tmp'))
+
+
+def test_compaction_replaces_the_recording(tmp_path):
+    path = tmp_path / 'test.smrec'
+    recorder = StreamRecorder(path)
+    recorder.start()
+    recorder.add('a', np.arange(100), np.arange(100.0))
+    recorder.stop()
+    DataHandler().compact_recording(path).join()
+    assert [p.name for p in tmp_path.iterdir()] == ['test.smses']
+    assert SessionFile(tmp_path / 'test.smses').values('a').tolist() == list(range(100))
+
+
+def test_failed_compaction_keeps_the_recording(tmp_path, monkeypatch):
+    path = tmp_path / 'test.smrec'
+    recorder = StreamRecorder(path)
+    recorder.start()
+    recorder.add('a', np.arange(100), np.arange(100.0))
+    recorder.stop()
+
+    def fail(*args):
+        raise OSError('disk full')
+    monkeypatch.setattr(session_file, '_fill_index', fail)
+    DataHandler().compact_recording(path).join()
+    assert [p.name for p in tmp_path.iterdir()] == ['test.smrec']
@@ -0,0 +1,85 @@
+import numpy as np
+
+from drivers.smapoc.smapoc_driver import FRAME_SIZE, MODE_CURRENT, FrameAssembler, decode_frames
+
+
+def make_frames(n, mode=MODE_CURRENT):
+    frames = np.zeros((n, 8), dtype='<i2')
+    frames[:, 0] = mode
+    frames[:, 2:] = 12000 + np.arange(n * 6).reshape(n, 6)
+    return frames
+
+
+def feed_in_steps(assembler, data, step=7, dt=0.001):
+    """ feeds data in pieces of step bytes, dt s apart, then the line goes idle, returns the decoded frames """
+    out = [assembler.feed(data[i:i + step], now=1.0 + i // step * dt) for i in range(0, len(data), step)]
+    return decode_frames(b''.join(out) + assembler.flush())
+
+
+def test_frames_in_pieces():
+    frames = make_frames(20)
+    decoded = feed_in_steps(FrameAssembler(), frames.tobytes())
+    assert np.array_equal(decoded, frames)
+
+
+def test_truncated_frame_in_a_continuous_stream():
+    frames = make_frames(50)
+    data = frames.tobytes()
+    cut = 11 * FRAME_SIZE
+    data = data[:cut + FRAME_SIZE // 2] + data[cut + FRAME_SIZE:]  # frame 11 loses its second half
+    assembler = FrameAssembler()
+    decoded = feed_in_steps(assembler, data)
+    assert np.array_equal(decoded, np.delete(frames, 11, axis=0))
+    assert assembler.garbled == FRAME_SIZE // 2
+    assert assembler.partial == 1
+
+
+def test_stream_starting_mid_frame():
+    frames = make_frames(10)
+    assembler = FrameAssembler()
+    decoded = feed_in_steps(assembler, frames.tobytes()[5:])
+    assert np.array_equal(decoded, frames[1:])
+    assert assembler.garbled == FRAME_SIZE - 5
+
+
+def test_frame_split_by_a_pause_is_kept():
+    frames = make_frames(2)
+    data = frames.tobytes()
+    assembler = FrameAssembler()
+    first = assembler.feed(data[:10], now=1.0)
+    rest = assembler.feed(data[10:], now=1.02)  # USB latency, longer than frame_gap
+    assert np.array_equal(decode_frames(first + rest), frames)
+    assert assembler.garbled == 0
+
+
+def test_partial_frame_before_a_pause_is_dropped():
+    frames = make_frames(2)
+    data = frames.tobytes()
+    assembler = FrameAssembler()
+    assembler.feed(data[:10], now=1.0)
+    decoded = decode_frames(assembler.feed(data[FRAME_SIZE:], now=1.02))
+    assert np.array_equal(decoded, frames[1:])
+    assert assembler.garbled == 10
+
+
+def test_answer_split_over_two_reads_is_emitted_with_its_last_byte():
+    # one frame per request: the first read returns 1 byte, the other 15 bytes follow within 5 ms
+    frames = make_frames(4)
+    assembler = FrameAssembler()
+    for i, frame in enumerate(frames):
+        t = 1.0 + 0.015 * i
+        assert assembler.feed(frame.tobytes()[:1], now=t) == b''
+        assert np.array_equal(decode_frames(assembler.feed(frame.tobytes()[1:], now=t + 0.002)), frame[None])
+    assert assembler.garbled == 0
+
+
+def test_last_frame_of_a_read_waits_for_the_next_header():
+    frames = make_frames(3)
+    data = frames.tobytes()
+    assembler = FrameAssembler()
+    assert len(assembler.feed(data[:FRAME_SIZE], now=1.0)) == FRAME_SIZE  # after a pause, taken right away
+    truncated = data[FRAME_SIZE:FRAME_SIZE + 8] + data[2 * FRAME_SIZE:2 * FRAME_SIZE + 8]
+    # looks like a frame, but the burst goes on and is not a whole number of frames
+    assert assembler.feed(truncated + data[2 * FRAME_SIZE + 8:2 * FRAME_SIZE + 9], now=1.001) == b''
+    decoded = decode_frames(assembler.feed(data[2 * FRAME_SIZE + 9:] + data, now=1.002) + assembler.flush())
+    assert np.array_equal(decoded, np.concatenate([frames[2:], frames]))  # the truncated frame 1 is dropped
@@ -0,0 +1,34 @@
+import numpy as np
+
+from smapoc.model import stream_recorder
+from smapoc.model.stream_recorder import StreamRecorder, load_recording
+
+
+def test_recording_round_trip(tmp_path, monkeypatch):
+    monkeypatch.setattr(StreamRecorder, 'chunk_size', 50)
+    path = tmp_path / 'test.smrec'
+    recorder = StreamRecorder(path, {'t0_ns': 1000})
+    recorder.start()
+    for start in range(0, 300, 30):
+        recorder.add('a', np.arange(start, start + 30), np.arange(start, start + 30) * 0.5)
+    recorder.add('b', [5, 6], [1.0, 2.0])
+    recorder.stop()
+    assert recorder.dropped == 0
+    header, loaded = load_recording(path)
+    assert header['t0_ns'] == 1000
+    assert loaded['a'][0].tolist() == list(range(300))
+    assert np.array_equal(loaded['a'][1], np.arange(300) * 0.5)
+    assert loaded['b'][1].tolist() == [1.0, 2.0]
+
+
+def test_truncated_recording_keeps_the_complete_chunks(tmp_path):
+    path = tmp_path / 'test.smrec'
+    recorder = StreamRecorder(path)
+    recorder.start()
+    recorder.add('a', np.arange(10), np.arange(10.0))
+    recorder.stop()
+    with open(path, 'ab') as file:
+        file.write(stream_recorder.CHUNK_HEAD.pack(stream_recorder.CHUNK_MAGIC, 1, 100) + b'a' + b'\0' * 50)
+    chunks = list(stream_recorder.iter_chunks(path))
+    assert len(chunks) == 1
+    assert chunks[0][1].tolist() == list(range(10))
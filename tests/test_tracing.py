@@ -0,0 +1,33 @@
+import json
+
+from smapoc.model.tracing import Tracer
+
+
+def test_disabled_tracer_records_nothing():
+    tracer = Tracer()
+    tracer.enabled = False
+    with tracer.span('read'):
+        pass
+    assert len(tracer.spans) == 0
+
+
+def test_spans_and_decorator_export_as_chrome_trace(tmp_path):
+    tracer = Tracer()
+    tracer.start()
+
+    @tracer.traced(category='decode')
+    def decode(x):
+        return 2 * x
+
+    with tracer.span('read', 'serial'):
+        assert decode(2) == 4
+    tracer.stop()
+    assert [span[0] for span in tracer.spans] == ['test_spans_and_decorator_export_as_chrome_trace.<locals>.decode',
+                                                  'read']
+    with tracer.span('after stop'):
+        pass
+    assert len(tracer.spans) == 2
+    trace = json.loads(open(tracer.export_chrome(tmp_path / 'trace.json')).read())
+    spans = [event for event in trace['traceEvents'] if event['ph'] == 'X']
+    assert {event['cat'] for event in spans} == {'decode', 'serial'}
+    assert all(event['dur'] >= 0 for event in spans)